@@ -7,38 +7,97 @@ for the Property Report Generator, optimized for deployment on Azure.
 """
 
 import os
+import gc
 import sys
+import time
 import threading
 import logging
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash, jsonify, send_from_directory
+from flask import Flask, Request, g, render_template, request, redirect, url_for, send_file, flash, jsonify, send_from_directory
 from werkzeug.utils import secure_filename
 import pandas as pd
+from utils.uploads import UploadRejected, create_upload_stream, save_upload, get_upload_digest, find_upload
+from utils.memory_stats import start_stage, get_dataframe_bytes, get_peak_rss_bytes, get_memory_stats, bind_stage_collection, reset_stage_collection
+from utils.profiling import start_profile, finish_profile, list_profiles, is_admin_request, PROFILE_DIR
+from utils.report_store import store_report, find_report, touch_report, remember_render, find_render, REPORT_RETENTION_SECONDS
+from utils.cache_backends import make_key, get_cache_stats
+from utils.cancellation import JobCancelled, start_job, end_job, cancel_job, check_cancelled, get_cancel_token
+from utils.memory_watchdog import watchdog
+
+class StreamingUploadRequest(Request):
+    """Request that streams uploaded files to disk, hashing and checking them as they arrive."""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename:
+            # Empty file input; let the view report that no file was selected
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return create_upload_stream(app.config['UPLOAD_FOLDER'], filename)
 
 # Initialize Flask app early for faster startup
 app = Flask(__name__, static_folder='static', template_folder='templates')
+app.request_class = StreamingUploadRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'property_report_generator_secret_key')
 
+# Fingerprint and precompress the web UI's CSS and JavaScript
+from utils.static_assets import StaticAssets, ASSET_MAX_AGE
+static_assets = StaticAssets(app.static_folder)
+try:
+    static_assets.build()
+except Exception as e:
+    # Pages fall back to the plain static URLs
+    logging.getLogger('webapp').error(f"Static asset build failed: {str(e)}", exc_info=True)
+
 # Global initialization flag
 initialization_complete = False
 
-# Set up logging - simpler setup during initial startup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Warm up synchronously at import time (gunicorn preload_app) instead of in a background thread
+PRELOAD_WARMUP = os.environ.get('PRELOAD_WARMUP', 'False').lower() == 'true'
+
+# Warm-up progress, reported by /ready
+warm_state = {
+    'ready': False,
+    'mode': 'preload' if PRELOAD_WARMUP else 'background',
+    'modules_imported': False,
+    'brands_loaded': False,
+    'templates_compiled': False,
+    'stylesheet_parsed': False,
+    'warmup_render': False,
+    'completed_at': None,
+    'error': None
+}
+
+# Set up logging - records are queued and written to stdout by a background thread
+from utils.logging_setup import configure_logging, bind_job_id, reset_job_id, get_job_id, log_stage
+configure_logging()
 logger = logging.getLogger('webapp')
 logger.info("✅ Flask app loaded")
 
 # Configure upload settings
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}  # Also enforced while streaming by utils.uploads
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limit file size to 16MB
 
+# Configure render admission control (per process)
+from utils.admission import AdmissionController, AdmissionRejected, estimate_job_cost
+render_admission = AdmissionController(
+    budget_mb=float(os.environ.get('RENDER_MEMORY_BUDGET_MB', 1024)),
+    max_concurrent=int(os.environ.get('RENDER_MAX_CONCURRENT', 2)),
+    max_queue=int(os.environ.get('RENDER_MAX_QUEUE', 8)),
+    queue_timeout=float(os.environ.get('RENDER_QUEUE_TIMEOUT', 60))
+)
+
+# Keep uploads, leftover outputs and caches within their disk quotas
+from utils.janitor import create_janitor
+janitor = create_janitor(UPLOAD_FOLDER, os.path.join(app.root_path, 'output'))
+janitor.start()
+# Threads don't survive fork, so each gunicorn worker restarts its own
+os.register_at_fork(after_in_child=janitor.start)
+
+# Identical report requests in flight at the same time share one render (per process)
+from utils.single_flight import SingleFlight
+report_flights = SingleFlight()
+
 # Create a fast health check endpoint for Azure
 @app.route('/health')
 def health_check():
@@ -50,6 +109,12 @@ def health_check():
         # Never fail the health check
         return "OK", 200
 
+@app.route('/ready')
+def ready():
+    """Readiness endpoint that only succeeds once the renderer is warm."""
+    status_code = 200 if warm_state['ready'] else 503
+    return jsonify(warm_state), status_code
+
 # Faster status endpoint with minimal checks
 @app.route('/status', methods=['GET'])
 def status():
@@ -62,70 +127,179 @@ def status():
         'timestamp': datetime.now().isoformat(),
         'python_version': sys.version,
         'platform': platform.platform(),
-        'initialization_complete': initialization_complete
+        'initialization_complete': initialization_complete,
+        'warm_state': warm_state,
+        'render_admission': render_admission.stats(),
+        'report_flights': report_flights.stats(),
+        'disk': janitor.stats(),
+        'cache_backend': get_cache_stats(),
+        'memory_watchdog': watchdog.stats(),
+        'memory': get_memory_stats()
     }
     
     return jsonify(status_info)
 
-def verify_weasyprint():
-    """Verify WeasyPrint installation by checking version and HTML rendering."""
-    try:
-        import weasyprint
-        logger.info(f"WeasyPrint version: {weasyprint.__version__}")
-        
-        # Try a very simple PDF generation in memory
-        weasyprint.HTML(string="<h1>Test</h1>").write_pdf()
-        
-        logger.info("WeasyPrint basic rendering test passed")
-        return True
-    except Exception as e:
-        logger.error(f"WeasyPrint verification failed: {str(e)}")
-        return False
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """List captured request profiles (requires the X-Admin-Token header)."""
+    if not is_admin_request(request.headers):
+        return "Not found", 404
+    return jsonify({'profiles': list_profiles()})
 
-def initialize_app_background():
-    """Perform initialization tasks in background after app has started."""
+@app.route('/admin/profiles/<profile_id>/<filename>', methods=['GET'])
+def admin_profile_file(profile_id, filename):
+    """Download one file of a captured profile (requires the X-Admin-Token header)."""
+    if not is_admin_request(request.headers):
+        return "Not found", 404
+    return send_from_directory(os.path.join(PROFILE_DIR, secure_filename(profile_id)), filename, as_attachment=True)
+
+def warm_up_app():
+    """
+    Import heavy dependencies and warm the report renderer.
+    
+    Imports pandas, openpyxl and WeasyPrint, loads brand assets, compiles
+    templates, parses the stylesheet and renders a throwaway report. Progress
+    is recorded in warm_state so /ready can report what is actually warm.
+    """
     global initialization_complete
     
     try:
-        logger.info("Starting background initialization...")
+        logger.info("Starting warm-up...")
         
         # Create directories
         for directory in ['uploads', 'output', 'static/images', 'static/css', 'static/js', 'templates']:
             os.makedirs(directory, exist_ok=True)
-            logger.info(f"Ensured directory exists: {directory}")
+            logger.debug(f"Ensured directory exists: {directory}")
         
-        # Verify WeasyPrint
-        weasyprint_status = verify_weasyprint()
-        logger.info(f"WeasyPrint verification: {'Successful' if weasyprint_status else 'Failed but continuing'}")
+        # Import heavy dependencies
+        import openpyxl
+        import weasyprint
+        from utils.data_processor import process_excel_data
+        from utils.pdf_generator import generate_pdf, warm_up
+        logger.info(f"Imported pandas {pd.__version__}, openpyxl {openpyxl.__version__}, WeasyPrint {weasyprint.__version__}")
+        warm_state['modules_imported'] = True
         
-        # Import modules only after initialization
-        try:
-            from utils.data_processor import process_excel_data
-            from utils.pdf_generator import generate_pdf
-            logger.info("Successfully imported utility modules")
-        except Exception as e:
-            logger.error(f"Error importing utility modules: {str(e)}")
+        # Load brands, compile templates, parse CSS and render a warm-up report
+        warm_state.update(warm_up())
         
-        # Mark initialization as complete
-        initialization_complete = True
-        logger.info("Background initialization completed successfully")
+        warm_state['ready'] = True
+        warm_state['completed_at'] = datetime.now().isoformat()
+        logger.info("Warm-up completed successfully")
         
     except Exception as e:
-        logger.error(f"Background initialization failed: {str(e)}", exc_info=True)
-        # Even if initialization fails, we'll set it to True so the app can attempt to function
-        initialization_complete = True
+        warm_state['error'] = str(e)
+        logger.error(f"Warm-up failed: {str(e)}", exc_info=True)
+    
+    # Even if warm-up fails, mark initialization complete so the app can attempt to function
+    initialization_complete = True
+
+def initialize_app_background():
+    """Perform initialization tasks in background after app has started."""
+    logger.info("Starting background initialization...")
+    warm_up_app()
+
+if PRELOAD_WARMUP:
+    # Preload mode: warm up in the gunicorn master before workers are forked so
+    # they share the imported modules and warm caches copy-on-write
+    warm_up_app()
+    
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the workers don't touch (and copy) the shared pages
+    gc.freeze()
+else:
+    # Start the background initialization thread
+    background_init_thread = threading.Thread(target=initialize_app_background)
+    background_init_thread.daemon = True
+    background_init_thread.start()
+
+# Tag every log record written while handling a request with a job ID
+@app.before_request
+def start_job_logging():
+    """Bind a job ID for the request (the client's X-Request-ID if it sent one)."""
+    g.job_log_token = bind_job_id(request.headers.get('X-Request-ID', '')[:32] or None)
+    # Keep the request's stage meters so get_stage_meters() can report on them
+    g.stage_collection_token = bind_stage_collection()
+
+def hold_file(path):
+    """
+    Protect a file from the janitor until the current request ends.
+    
+    Args:
+        path (str): File the request uses
+        
+    Returns:
+        str: The path
+    """
+    g.setdefault('held_files', []).append(janitor.hold(path))
+    return path
 
-# Start the background initialization thread
-background_init_thread = threading.Thread(target=initialize_app_background)
-background_init_thread.daemon = True
-background_init_thread.start()
+@app.teardown_request
+def release_held_files(exc):
+    """Let the janitor clean up files the request used."""
+    for path in g.pop('held_files', []):
+        janitor.release(path)
+
+@app.teardown_request
+def end_job_logging(exc):
+    """Release the request's job ID and stage meters."""
+    token = g.pop('job_log_token', None)
+    if token is not None:
+        reset_job_id(token)
+    token = g.pop('stage_collection_token', None)
+    if token is not None:
+        reset_stage_collection(token)
+
+# Profile report requests on demand (X-Profile header from an admin) or by sampling
+@app.before_request
+def start_request_profile():
+    """Start profiling a report submission if it was asked for or sampled."""
+    if request.method == 'POST' and request.path == '/':
+        g.profile = start_profile(get_job_id(), request.headers)
+
+@app.after_request
+def finish_request_profile(response):
+    """Save the request's profile, if one is running."""
+    session = g.pop('profile', None)
+    if session is not None:
+        finish_profile(session, response.status_code)
+    return response
+
+@app.teardown_request
+def abandon_request_profile(exc):
+    """Save the profile of a request that failed before after_request ran."""
+    session = g.pop('profile', None)
+    if session is not None:
+        finish_profile(session)
+
+# Report jobs can be cancelled by a client disconnect or /cancel
+@app.before_request
+def start_cancellable_job():
+    """Give a report submission a cancel token tied to its client connection."""
+    if request.method == 'POST' and request.path == '/':
+        g.cancel_job = start_job(
+            get_job_id(),
+            disconnected=request.environ.get('asgi_bridge.disconnected'),
+            client_socket=request.environ.get('gunicorn.socket')
+        )
+
+@app.teardown_request
+def end_cancellable_job(exc):
+    """Release the request's cancel token."""
+    job = g.pop('cancel_job', None)
+    if job is not None:
+        end_job(*job)
+
+@app.teardown_request
+def retire_oversized_worker(exc):
+    """Gracefully retire the worker once a request has finished, if a render left it over its memory limit."""
+    watchdog.retire_if_requested()
 
 # Middleware to check initialization status
 @app.before_request
 def check_initialization():
     """Check if app is initialized before processing complex requests."""
     # Skip middleware for health/status endpoints and favicon
-    if request.path in ['/health', '/status', '/favicon.ico']:
+    if request.path in ['/health', '/ready', '/status', '/favicon.ico'] or request.path.startswith('/assets/'):
         return None
         
     # For all other requests, return a friendly message if not initialized
@@ -135,6 +309,14 @@ def check_initialization():
             return render_template('index.html')
         return "Application is initializing, please try again shortly", 503
 
+@app.errorhandler(UploadRejected)
+def upload_rejected(e):
+    """Return upload errors raised while the request body is still streaming in."""
+    if request.path == '/get_sheet_names' or is_ajax_request():
+        return jsonify({'error': e.description}), 400
+    flash(e.description, 'error')
+    return redirect(request.url)
+
 def allowed_file(filename):
     """Check if the uploaded file has an allowed extension."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -157,6 +339,126 @@ def is_ajax_request():
     
     return False
 
+def get_request_file():
+    """
+    Get the workbook a form submission refers to.
+    
+    The browser uploads a workbook once, to /validate, and later requests
+    for it send the digest /validate returned (upload_digest, upload_name)
+    instead of the file.
+    
+    Returns:
+        tuple: (FileStorage or StoredUpload, None, None), or (None, error message, status code)
+    """
+    digest = request.form.get('upload_digest')
+    if digest:
+        upload = find_upload(app.config['UPLOAD_FOLDER'], digest, request.form.get('upload_name', ''))
+        if upload is None:
+            # Cleaned up by the janitor; the browser sends the file itself instead
+            return None, 'The uploaded file has expired. Please upload it again.', 410
+        return upload, None, None
+    
+    file = request.files.get('file')
+    if file is None:
+        return None, 'No file part', 400
+    return file, None, None
+
+def read_property_table(filepath, filename, sheet_name):
+    """
+    Load the normalized property table for an uploaded workbook sheet.
+    
+    The table is read from the table cache when this sheet was processed
+    before; otherwise the headers are validated, the sheet is parsed and
+    normalized, and the result is cached.
+    
+    Args:
+        filepath (str): Path of the stored upload
+        filename (str): Client filename, used to tell CSV from Excel
+        sheet_name (str): Sheet to read (None for CSV files)
+        
+    Returns:
+        tuple: (DataFrame, None) on success, or (None, error message)
+    """
+    from utils.data_processor import validate_headers, normalize_property_table
+    from utils.table_cache import load_table, store_table
+    
+    # Reuse the normalized table if this workbook sheet was processed before
+    meter = start_stage('table')
+    df = load_table(filepath, sheet_name)
+    cache_status = 'hit' if df is not None else 'miss'
+    if df is None:
+        # Validate headers first
+        logger.debug("Validating headers...")
+        header_validation = validate_headers(filepath, sheet_name)
+        if not header_validation['valid']:
+            logger.error(f"Header validation failed: {header_validation['error']}")
+            return None, f"Header validation error: {header_validation['error']}"
+        
+        # Determine file type and read accordingly
+        if filename.endswith('.csv'):
+            logger.debug("Reading CSV file")
+            df = pd.read_csv(filepath)
+        else:  # Excel file
+            logger.debug(f"Reading Excel file, sheet: {sheet_name}")
+            df = pd.read_excel(filepath, sheet_name=sheet_name)
+        
+        if df is None or df.empty:
+            logger.error("Empty dataframe after reading file")
+            return None, 'Unable to read data from the uploaded file'
+        
+        # Normalize types and image references, and cache the table for next time
+        df = normalize_property_table(df, filepath)
+        store_table(filepath, sheet_name, df)
+    meter.finish(logger, cache=cache_status, rows=len(df), table_bytes=get_dataframe_bytes(df))
+    return df, None
+
+def index_properties(df, filepath, report_date):
+    """
+    Record a workbook's properties in the property index.
+    
+    The index only feeds history queries, so a failure is logged and the
+    request carries on.
+    
+    Args:
+        df (pandas.DataFrame): Normalized property table
+        filepath (str): Path of the stored upload
+        report_date (str): Report date from the form
+    """
+    from utils.property_index import get_property_index
+    
+    try:
+        meter = start_stage('property_index')
+        indexed = get_property_index().index_table(df, get_upload_digest(filepath), report_date)
+        meter.finish(logger, properties=indexed)
+    except Exception as e:
+        logger.warning(f"Could not index properties: {str(e)}", exc_info=True)
+
+def get_property_history(df, filepath, report_date):
+    """
+    Summarize what the property index already knows about a workbook's properties.
+    
+    Args:
+        df (pandas.DataFrame): Normalized property table
+        filepath (str): Path of the stored upload
+        report_date (str): Report date from the form
+    
+    Returns:
+        dict: {'repeat_listings': [...], 'period_days', 'deltas': {...}}, or None if the index is unavailable
+    """
+    from utils.property_index import get_property_index, PERIOD_DAYS
+    
+    try:
+        index = get_property_index()
+        suburbs = df['Suburb'].dropna().unique() if 'Suburb' in df.columns else []
+        return {
+            'repeat_listings': index.find_repeat_listings(df, get_upload_digest(filepath)),
+            'period_days': PERIOD_DAYS,
+            'deltas': index.get_period_deltas(suburbs, report_date)
+        }
+    except Exception as e:
+        logger.warning(f"Could not query property history: {str(e)}", exc_info=True)
+        return None
+
 @app.route('/get_sheet_names', methods=['POST'])
 def get_sheet_names():
     """Extract sheet names from uploaded Excel file."""
@@ -171,10 +473,9 @@ def get_sheet_names():
         return jsonify({'error': 'Invalid file type'}), 400
     
     try:
-        # Save file temporarily
+        # Store the streamed upload
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        filepath = hold_file(save_upload(file, app.config['UPLOAD_FOLDER']))
         
         # Get sheet names
         if filename.endswith('.csv'):
@@ -186,9 +487,11 @@ def get_sheet_names():
             sheet_names = excel_file.sheet_names
             excel_file.close()
             
-            logger.info(f"Found sheets in {filename}: {sheet_names}")
+            logger.debug(f"Found sheets in {filename}: {sheet_names}")
             return jsonify({'sheet_names': sheet_names})
             
+    except UploadRejected:
+        raise
     except Exception as e:
         logger.error(f"Error reading file: {str(e)}")
         return jsonify({'error': f'Error reading file: {str(e)}'}), 500
@@ -200,12 +503,12 @@ def index():
         logger.info("Received form submission")
         
         # Import modules lazily to ensure they're imported after initialization
-        from utils.data_processor import process_excel_data, validate_headers
-        from utils.pdf_generator import generate_pdf
+        from utils.data_processor import process_excel_data, get_workbook_image_bytes
+        from utils.pdf_generator import generate_pdf, get_brands, get_render_version
         
         # Check if this is an AJAX request
         ajax_request = is_ajax_request()
-        logger.info(f"Is AJAX request: {ajax_request}")
+        logger.debug(f"Is AJAX request: {ajax_request}")
         
         # Check if business type was selected
         business_type = request.form.get('business_type')
@@ -213,7 +516,17 @@ def index():
             logger.warning("No business type selected")
             error_msg = 'Please select a business type (BusiVet or BusiHealth)'
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
+                logger.debug("Returning JSON error for AJAX request")
+                return jsonify({'error': error_msg}), 400
+            flash(error_msg, 'error')
+            return redirect(request.url)
+        
+        # Check the business type is a configured brand
+        if business_type.lower() not in get_brands():
+            logger.warning(f"Unknown business type: {business_type}")
+            error_msg = f'Unknown business type: {business_type}'
+            if ajax_request:
+                logger.debug("Returning JSON error for AJAX request")
                 return jsonify({'error': error_msg}), 400
             flash(error_msg, 'error')
             return redirect(request.url)
@@ -224,7 +537,7 @@ def index():
             logger.warning("No first line text provided")
             error_msg = 'Please provide the first line text (e.g., Vet Partners)'
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
+                logger.debug("Returning JSON error for AJAX request")
                 return jsonify({'error': error_msg}), 400
             flash(error_msg, 'error')
             return redirect(request.url)
@@ -235,7 +548,7 @@ def index():
             logger.warning("No second line text provided")
             error_msg = 'Please provide the second line text (e.g., Landscape Report & Site Search)'
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
+                logger.debug("Returning JSON error for AJAX request")
                 return jsonify({'error': error_msg}), 400
             flash(error_msg, 'error')
             return redirect(request.url)
@@ -246,7 +559,7 @@ def index():
             logger.warning("No third line text provided")
             error_msg = 'Please provide the third line text (e.g., Oran Park & Mickleham)'
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
+                logger.debug("Returning JSON error for AJAX request")
                 return jsonify({'error': error_msg}), 400
             flash(error_msg, 'error')
             return redirect(request.url)
@@ -257,29 +570,27 @@ def index():
             logger.warning("No report date provided")
             error_msg = 'Please provide a date for the report'
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
+                logger.debug("Returning JSON error for AJAX request")
                 return jsonify({'error': error_msg}), 400
             flash(error_msg, 'error')
             return redirect(request.url)
 
-        # Check if file was submitted
-        if 'file' not in request.files:
-            logger.warning("No file part in request")
-            error_msg = 'No file part'
+        # Check if file was submitted (or refers to an earlier upload)
+        file, error_msg, status_code = get_request_file()
+        if file is None:
+            logger.warning(f"No usable file in request: {error_msg}")
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
-                return jsonify({'error': error_msg}), 400
+                logger.debug("Returning JSON error for AJAX request")
+                return jsonify({'error': error_msg}), status_code
             flash(error_msg, 'error')
             return redirect(request.url)
         
-        file = request.files['file']
-        
         # Check if file was selected
         if file.filename == '':
             logger.warning("No file selected")
             error_msg = 'No selected file'
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
+                logger.debug("Returning JSON error for AJAX request")
                 return jsonify({'error': error_msg}), 400
             flash(error_msg, 'error')
             return redirect(request.url)
@@ -290,7 +601,7 @@ def index():
             logger.warning("No sheet selected for Excel file")
             error_msg = 'Please select a sheet from the dropdown'
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
+                logger.debug("Returning JSON error for AJAX request")
                 return jsonify({'error': error_msg}), 400
             flash(error_msg, 'error')
             return redirect(request.url)
@@ -298,88 +609,118 @@ def index():
         # Process valid file
         if file and allowed_file(file.filename):
             try:
-                logger.info(f"Processing file: {file.filename}")
+                logger.debug(f"Processing file: {file.filename}")
+                report_meter = start_stage('report')
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                logger.info(f"File saved at {filepath}")
+                filepath = hold_file(save_upload(file, app.config['UPLOAD_FOLDER']))
+                logger.debug(f"File saved at {filepath}")
+                log_stage(logger, 'upload', file=filename, bytes=os.path.getsize(filepath))
                 
-                # Validate headers first
-                logger.info("Validating headers...")
-                header_validation = validate_headers(filepath, sheet_name)
-                if not header_validation['valid']:
-                    logger.error(f"Header validation failed: {header_validation['error']}")
-                    # For AJAX requests, return JSON error response
+                # Load the normalized table (cached after the first request for this sheet)
+                df, error_msg = read_property_table(filepath, filename, sheet_name)
+                if df is None:
                     if ajax_request:
-                        logger.info("Returning JSON error for AJAX request")
-                        return jsonify({'error': f"Header validation error: {header_validation['error']}"}), 400
-                    # For regular form submissions, use flash messages
-                    flash(f"Header validation error: {header_validation['error']}", 'error')
+                        logger.debug("Returning JSON error for AJAX request")
+                        return jsonify({'error': error_msg}), 400
+                    flash(error_msg, 'error')
                     return redirect(request.url)
                 
-                # Process the file data
-                logger.info("Reading Excel/CSV data...")
-                df = None
+                # Same workbook sheet, cover details and renderer version means the same report
+                render_key = make_key('render', get_upload_digest(filepath), sheet_name, business_type.lower(),
+                                      first_line, second_line, third_line, report_date, get_render_version())
                 
-                # Determine file type and read accordingly
-                if filename.endswith('.csv'):
-                    logger.info("Reading CSV file")
-                    df = pd.read_csv(filepath)
-                else:  # Excel file
-                    logger.info(f"Reading Excel file, sheet: {sheet_name}")
-                    df = pd.read_excel(filepath, sheet_name=sheet_name)
+                def render_report():
+                    """Render the report, store it and return its digest."""
+                    # Reuse a report rendered for identical parameters by any process or replica
+                    report_digest = find_render(render_key)
+                    if report_digest is not None:
+                        log_stage(logger, 'render_cache', hit=True, report=report_digest[:12])
+                        return report_digest
+                    
+                    # Estimate the render cost and wait for capacity
+                    check_cancelled()
+                    selected_count = int((df['PUT IN REPORT (T/F)'] == 'T').sum()) if 'PUT IN REPORT (T/F)' in df.columns else 0
+                    job_cost = estimate_job_cost(len(df), selected_count, get_workbook_image_bytes(filepath))
+                    started = time.monotonic()
+                    with render_admission.admit(job_cost, cancel_token=get_cancel_token()):
+                        log_stage(logger, 'admit', cost_mb=round(job_cost), waited=round(time.monotonic() - started, 3))
+                        # Process data
+                        logger.debug("Processing property data...")
+                        processed_data = process_excel_data(df, filepath)  # Pass the filepath for image extraction
+                        
+                        # Generate PDF report
+                        logger.debug("Generating PDF report...")
+                        pdf_path = generate_pdf(
+                            processed_data,
+                            business_type=business_type,
+                            first_line=first_line,
+                            second_line=second_line,
+                            third_line=third_line,
+                            report_date=report_date
+                        )
+                        # Retire this worker after the request if the render left it too large
+                        watchdog.check('generate_pdf')
+                    
+                    # Keep the PDF by content so every request sharing this render gets the same file
+                    report_digest = store_report(pdf_path)
+                    remember_render(render_key, report_digest)
+                    return report_digest
                 
-                if df is None or df.empty:
-                    logger.error("Empty dataframe after reading file")
-                    error_msg = 'Unable to read data from the uploaded file'
+                # Identical requests wait on the render in flight
+                try:
+                    while True:
+                        try:
+                            report_digest, shared = report_flights.do(render_key, render_report)
+                            break
+                        except JobCancelled:
+                            if get_cancel_token().is_cancelled():
+                                raise
+                            # The request this one was waiting on was cancelled; render it here instead
+                            logger.info("Shared render was cancelled; retrying")
+                    report_meter.finish(logger, coalesced=shared, peak_rss_bytes=get_peak_rss_bytes())
+                except AdmissionRejected as e:
+                    error_msg = f'{e}. Please try again in {e.retry_after} seconds.'
                     if ajax_request:
-                        logger.info("Returning JSON error for AJAX request")
-                        return jsonify({'error': error_msg}), 400
-                    flash(error_msg, 'error')
-                    return redirect(request.url)
+                        logger.debug("Returning JSON error for AJAX request")
+                        response = jsonify({'error': error_msg})
+                    else:
+                        flash(error_msg, 'error')
+                        response = app.make_response(render_template('index.html', brands=get_brands().values()))
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(e.retry_after)
+                    return response
                 
-                # Process data
-                logger.info("Processing property data...")
-                processed_data = process_excel_data(df, filepath)  # Pass the filepath for image extraction
+                # Remember these properties for repeat-listing and trend queries, once the report exists
+                index_properties(df, filepath, report_date)
                 
-                # Generate PDF report
-                logger.info("Generating PDF report...")
-                pdf_path = generate_pdf(
-                    processed_data,
-                    business_type=business_type,
-                    first_line=first_line,
-                    second_line=second_line,
-                    third_line=third_line,
-                    report_date=report_date
-                )
+                download_name = f"Property_Report_{third_line.replace(' ', '_')}_{report_date.replace(' ', '_')}.pdf"
+                if request.form.get('output') == 'bundle':
+                    # The PDF with the selected rows and their photos, streamed as a ZIP
+                    logger.debug(f"Sending report {report_digest} as a bundle")
+                    return send_bundle(report_digest, df, filepath, download_name)
+                if not ajax_request:
+                    # Let the browser download from the stable URL so it can resume or repeat it
+                    return redirect(url_for('download_report', digest=report_digest, name=download_name), code=303)
                 
-                from flask import after_this_request
-
-                # Prepare to delete file after it's been sent
-                @after_this_request
-                def remove_file(response):
-                    try:
-                        os.remove(pdf_path)
-                        logger.info(f"Deleted PDF after download: {pdf_path}")
-                    except Exception as e:
-                        logger.error(f"Failed to delete PDF after download: {e}")
-                    return response
-
                 # Send the file for download
-                logger.info(f"Sending file {pdf_path} for download")
-                return send_file(
-                    pdf_path,
-                    as_attachment=True,
-                    download_name=f"Property_Report_{third_line.replace(' ', '_')}_{report_date.replace(' ', '_')}.pdf",
-                    mimetype='application/pdf'
-                )
+                logger.debug(f"Sending report {report_digest} for download")
+                return send_report(report_digest, download_name)
 
                 
+            except UploadRejected:
+                raise
+            except JobCancelled as e:
+                # Nobody is waiting for this report; drop its data now rather than at the next collection
+                logger.info(f"Report cancelled ({e})")
+                gc.collect()
+                if ajax_request:
+                    return jsonify({'error': 'Report generation was cancelled'}), 499
+                return 'Report generation was cancelled', 499
             except Exception as e:
                 logger.error(f"Error processing file: {str(e)}", exc_info=True)
                 error_msg = f'Error processing file: {str(e)}'
                 if ajax_request:
-                    logger.info("Returning JSON error for AJAX request")
+                    logger.debug("Returning JSON error for AJAX request")
                     return jsonify({'error': error_msg}), 500
                 flash(error_msg, 'error')
                 return redirect(request.url)
@@ -387,14 +728,229 @@ def index():
             logger.warning(f"Invalid file type: {file.filename}")
             error_msg = 'File type not allowed. Please upload an Excel (.xlsx, .xls) or CSV file.'
             if ajax_request:
-                logger.info("Returning JSON error for AJAX request")
+                logger.debug("Returning JSON error for AJAX request")
                 return jsonify({'error': error_msg}), 400
             flash(error_msg, 'error')
             return redirect(request.url)
     
     # GET request: render the form
-    logger.info("Rendering index page")
-    return render_template('index.html')
+    logger.debug("Rendering index page")
+    from utils.pdf_generator import get_brands
+    return render_template('index.html', brands=get_brands().values())
+
+def send_report(digest, download_name):
+    """
+    Send a stored report with a strong ETag, range support and its stable URL.
+    
+    Args:
+        digest (str): Hex SHA-256 of the report
+        download_name (str): Filename offered to the browser
+        
+    Returns:
+        Response: The PDF (or 304/206 for conditional and range requests), or 404
+    """
+    path = find_report(digest)
+    if path is None:
+        return "Report not found", 404
+    touch_report(path)
+    
+    response = send_file(
+        path,
+        as_attachment=True,
+        download_name=download_name,
+        mimetype='application/pdf',
+        conditional=True,
+        etag=digest,
+        max_age=int(REPORT_RETENTION_SECONDS)
+    )
+    # The content behind a digest never changes, but reports are not for shared caches
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    response.headers['Content-Location'] = url_for('download_report', digest=digest, name=download_name)
+    return response
+
+def send_bundle(digest, df, filepath, download_name):
+    """
+    Stream a ZIP of a stored report, the selected rows as CSV and their original photos.
+    
+    Args:
+        digest (str): Hex SHA-256 of the report
+        df (pandas.DataFrame): Normalized property table
+        filepath (str): Path of the stored upload
+        download_name (str): Filename of the PDF; the ZIP and CSV are named after it
+        
+    Returns:
+        Response: The streamed ZIP, or 404
+    """
+    from utils.bundle import stream_bundle
+    
+    path = find_report(digest)
+    if path is None:
+        return "Report not found", 404
+    touch_report(path)
+    
+    # The stream doesn't need the request context, but the request's own holds end before
+    # streaming starts, so hold the upload and report until the server closes the response
+    held = [janitor.hold(filepath), janitor.hold(path)]
+    report_name = os.path.splitext(secure_filename(download_name))[0]
+    response = app.response_class(stream_bundle(path, df, filepath, report_name), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{report_name}.zip"'
+    response.headers['Cache-Control'] = 'no-store'
+    
+    def release_held():
+        for held_path in held:
+            janitor.release(held_path)
+    response.call_on_close(release_held)
+    return response
+
+@app.route('/reports/<digest>', methods=['GET'])
+def download_report(digest):
+    """Download a stored report; supports If-None-Match and Range requests."""
+    download_name = secure_filename(request.args.get('name', ''))
+    if not download_name.lower().endswith('.pdf'):
+        download_name = f"Property_Report_{digest[:12]}.pdf"
+    return send_report(digest, download_name)
+
+@app.route('/cancel', methods=['POST'])
+def cancel():
+    """Cancel a report submission by the X-Request-ID it was sent with."""
+    job_id = (request.get_json(silent=True) or {}).get('job_id') or request.form.get('job_id')
+    if not job_id:
+        return jsonify({'error': 'No job_id given'}), 400
+    running_here = cancel_job(job_id[:32])
+    logger.info(f"Cancel requested for job {job_id[:32]} (running in this process: {running_here})")
+    return jsonify({'status': 'cancelling', 'job_id': job_id[:32]}), 202
+
+@app.route('/validate', methods=['POST'])
+def validate():
+    """Check every row of the selected sheet and return per-cell diagnostics, without rendering."""
+    from utils.validation import validate_property_table
+    
+    file, error_msg, status_code = get_request_file()
+    if file is None:
+        return jsonify({'error': error_msg}), status_code
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'File type not allowed. Please upload an Excel (.xlsx, .xls) or CSV file.'}), 400
+    
+    sheet_name = request.form.get('sheet_name')
+    if file.filename.lower().endswith(('.xlsx', '.xls')) and not sheet_name:
+        return jsonify({'error': 'Please select a sheet from the dropdown'}), 400
+    
+    try:
+        filepath = hold_file(save_upload(file, app.config['UPLOAD_FOLDER']))
+        # The parsed table is cached, so the report request that follows skips parsing
+        df, error_msg = read_property_table(filepath, secure_filename(file.filename), sheet_name)
+        if df is None:
+            return jsonify({'valid': False, 'error': error_msg}), 422
+        
+        meter = start_stage('validate')
+        result = validate_property_table(df)
+        meter.finish(logger, rows=result['rows'], errors=result['errors'], warnings=result['warnings'])
+        
+        # Properties seen in earlier workbooks and how this period compares with the last
+        result['history'] = get_property_history(df, filepath, request.form.get('report_date', ''))
+        # Later requests for this workbook refer to the stored upload instead of sending it again
+        result['upload'] = {'digest': get_upload_digest(filepath), 'name': file.filename}
+        return jsonify(result)
+    except UploadRejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error validating file: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Error validating file: {str(e)}'}), 500
+
+def preview_error(error_msg, status_code=400):
+    """Return a preview error as JSON for AJAX requests, or as plain text for a browser tab."""
+    if is_ajax_request():
+        return jsonify({'error': error_msg}), status_code
+    return error_msg, status_code, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    """Show the report as HTML in the browser, without rendering a PDF."""
+    from utils.data_processor import process_excel_data
+    from utils.pdf_generator import generate_html, get_brands
+    from utils.preview import build_preview_html
+    
+    business_type = request.form.get('business_type', '')
+    if business_type.lower() not in get_brands():
+        return preview_error('Please select a business type')
+    
+    file, error_msg, status_code = get_request_file()
+    if file is None:
+        return preview_error(error_msg, status_code)
+    if file.filename == '':
+        return preview_error('No selected file')
+    if not allowed_file(file.filename):
+        return preview_error('File type not allowed. Please upload an Excel (.xlsx, .xls) or CSV file.')
+    
+    sheet_name = request.form.get('sheet_name')
+    if file.filename.lower().endswith(('.xlsx', '.xls')) and not sheet_name:
+        return preview_error('Please select a sheet from the dropdown')
+    
+    try:
+        filename = secure_filename(file.filename)
+        filepath = hold_file(save_upload(file, app.config['UPLOAD_FOLDER']))
+        df, error_msg = read_property_table(filepath, filename, sheet_name)
+        if df is None:
+            return preview_error(error_msg)
+        
+        processed_data = process_excel_data(df, filepath)
+        
+        meter = start_stage('preview')
+        html_content = generate_html(
+            processed_data,
+            business_type=business_type,
+            first_line=request.form.get('first_line', ''),
+            second_line=request.form.get('second_line', ''),
+            third_line=request.form.get('third_line', ''),
+            report_date=request.form.get('report_date', '')
+        )
+        html_content = build_preview_html(
+            html_content,
+            processed_data['images'],
+            asset_url=f"{request.script_root}/preview/assets/",
+            stylesheet_url=url_for('preview_stylesheet')
+        )
+        meter.finish(logger, html_bytes=len(html_content))
+        
+        response = app.make_response(html_content)
+        response.cache_control.no_store = True
+        return response
+    except UploadRejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error building preview: {str(e)}", exc_info=True)
+        return preview_error(f'Error processing file: {str(e)}', 500)
+
+@app.route('/preview/styles.css')
+def preview_stylesheet():
+    """Serve the report stylesheet for previews."""
+    from utils.pdf_components.html_builder import CSS_PATH
+    return send_file(CSS_PATH, mimetype='text/css', max_age=3600)
+
+@app.route('/preview/assets/<path:asset_path>')
+def preview_asset(asset_path):
+    """Serve brand assets and photo thumbnails referenced by previews."""
+    from utils.pdf_generator import get_brand_asset
+    from utils.preview import get_thumbnail_path
+    from utils.pdf_components.brand_registry import ASSET_URL_PREFIX
+    
+    if asset_path.startswith('image/'):
+        # Thumbnails are named by the photo's digest, so they never change
+        thumbnail_path = get_thumbnail_path(asset_path[len('image/'):])
+        if thumbnail_path is None or not os.path.exists(thumbnail_path):
+            return "Not found", 404
+        return send_file(thumbnail_path, mimetype='image/jpeg', max_age=86400)
+    
+    asset = get_brand_asset(f"{ASSET_URL_PREFIX}{asset_path}")
+    if asset is None:
+        return "Not found", 404
+    response = app.response_class(asset['string'], mimetype=asset['mime_type'])
+    response.cache_control.max_age = 3600
+    return response
 
 @app.route('/reset', methods=['POST'])
 def reset():
@@ -403,6 +959,34 @@ def reset():
     # Instead of redirecting, return a success response to be handled by JavaScript
     return jsonify({"status": "success", "message": "Form reset successful"})
 
+@app.context_processor
+def inject_asset_url():
+    """Make asset_url() available to templates."""
+    def asset_url(filename):
+        """URL of a static file, fingerprinted when it is in the asset manifest."""
+        fingerprinted = static_assets.get_name(filename)
+        if fingerprinted is None:
+            return url_for('static', filename=filename)
+        return url_for('fingerprinted_asset', filename=fingerprinted)
+    return {'asset_url': asset_url}
+
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """Serve a fingerprinted asset, precompressed when the client accepts it."""
+    selected = static_assets.select(filename, request.accept_encodings)
+    if selected is None:
+        return "Not found", 404
+    path, encoding, mimetype = selected
+    
+    # Name the asset as requested, not the precompressed .br/.gz file it is served from
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=ASSET_MAX_AGE,
+                         download_name=os.path.basename(filename))
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
 @app.route('/favicon.ico')
 def favicon():
     try:
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Property Report Generator - ASGI entry point
+
+Serves the Flask app through an async server (uvicorn) so that receiving
+uploads and sending PDFs happen on the event loop, and only the report work
+itself uses a worker thread. Run with SERVER_MODE=asgi and gunicorn.conf.py,
+or directly with: uvicorn asgi:app
+"""
+
+import os
+from app import app as flask_app
+from utils.asgi_bridge import AsgiBridge
+
+app = AsgiBridge(
+    flask_app,
+    # Threads that run views; renders are further limited by the admission controller
+    app_threads=int(os.environ.get('ASGI_APP_THREADS', 4)),
+    io_threads=int(os.environ.get('ASGI_IO_THREADS', 8)),
+    max_body_size=flask_app.config['MAX_CONTENT_LENGTH']
+)
@@ -0,0 +1,43 @@
+"""
+Gunicorn configuration for the Property Report Generator.
+
+The app is preloaded in the master process: pandas, openpyxl and WeasyPrint
+are imported, brand assets and templates prepared and a warm-up report
+rendered once, then workers are forked and share that memory copy-on-write.
+Set PRELOAD_WARMUP=false to fall back to per-worker background warm-up.
+
+Set SERVER_MODE=asgi to serve asgi:app with uvicorn workers, so uploads and
+downloads are handled on an event loop instead of holding a sync worker.
+
+Workers whose RSS stays above WORKER_MAX_RSS_MB after a render are retired
+gracefully by the memory watchdog and replaced.
+"""
+
+import os
+
+# Tell app.py to warm up synchronously at import time when preloading
+os.environ.setdefault('PRELOAD_WARMUP', 'true')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Sync (WSGI) or async (ASGI under uvicorn) serving
+if os.environ.get('SERVER_MODE', 'wsgi').lower() == 'asgi':
+    wsgi_app = 'asgi:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:app'
+
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+# More than one thread per worker switches gunicorn to the gthread worker (WSGI mode only)
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+preload_app = os.environ['PRELOAD_WARMUP'].lower() == 'true'
+
+# Rendering large reports can take a while
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+# A worker retired by the memory watchdog finishes the renders it has in flight
+graceful_timeout = timeout
+
+def post_fork(server, worker):
+    """Let the memory watchdog retire this worker; gunicorn forks a replacement."""
+    from utils.memory_watchdog import watchdog
+    watchdog.enable_recycling()
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Property Report Generator - Load Testing Harness
+
+Starts the app under gunicorn on this machine (or targets a running server
+with --url) and drives /get_sheet_names followed by / with synthetic
+workbooks of several sizes. Latency percentiles, throughput, error rate and
+server RSS over time are written to loadtest.json and loadtest.html so runs
+with different worker/thread settings can be compared.
+
+Example:
+    python loadtest.py --workers 2 --threads 2 --concurrency 4 --rate 0.2 --duration 300
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# Header row expected by validate_headers, by column letter
+WORKBOOK_HEADERS = {
+    'A': 'Type', 'B': 'Property Photo', 'C': 'Street Address', 'D': 'Suburb', 'E': 'State',
+    'F': 'Postcode', 'G': 'Site Zoning', 'H': 'Property Type', 'K': 'Car', 'N': 'Floor Size (m²)',
+    'O': 'Sale Price', 'AL': 'Last Listed Price (Sold/For Sale)', 'AT': 'Total Lease Price (Base + Outgoings)',
+    'AZ': 'Allowable Use in Zone (T/F)', 'BA': '$/m²', 'BD': 'PUT IN REPORT (T/F)', 'BF': "Busi's Comment"
+}
+PROPERTY_TYPES = ['For Lease', 'For Sale', 'Sold', 'Already Leased']
+SHEET_NAME = 'Data'
+
+# Form fields sent with every report request
+REPORT_FIELDS = {
+    'business_type': 'busivet',
+    'first_line': 'Load Test',
+    'second_line': 'Landscape Report & Site Search',
+    'third_line': 'Oran Park',
+    'report_date': '1 January 2025'
+}
+
+def build_workbook(path, rows, images, seed):
+    """
+    Write a synthetic property workbook.
+
+    Args:
+        path (str): Where to save the .xlsx file
+        rows (int): Number of property rows
+        images (int): Number of photos to embed (one per row, from the top)
+        seed (int): Random seed, so each variant has different contents
+    """
+    from openpyxl import Workbook
+    from openpyxl.drawing.image import Image as XLImage
+    from openpyxl.utils import column_index_from_string
+    from PIL import Image
+
+    rng = random.Random(seed)
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = SHEET_NAME
+    for letter, header in WORKBOOK_HEADERS.items():
+        sheet.cell(1, column_index_from_string(letter), header)
+
+    for i in range(rows):
+        row = i + 2
+        property_type = PROPERTY_TYPES[i % len(PROPERTY_TYPES)]
+        values = {
+            'A': property_type, 'C': f"{rng.randint(1, 999)} Main Street", 'D': 'ORAN PARK', 'E': 'NSW',
+            'F': 2570, 'G': 'B2', 'H': 'Retail', 'K': rng.randint(0, 20), 'N': rng.randint(80, 2000),
+            'O': rng.randint(300000, 5000000), 'AL': rng.randint(300000, 5000000),
+            'AT': f"{rng.randint(20000, 400000):,}", 'AZ': 'T', 'BA': f"${rng.randint(150, 900)}",
+            'BD': 'T' if rng.random() < 0.3 else 'F', 'BF': 'Synthetic load test property'
+        }
+        for letter, value in values.items():
+            sheet.cell(row, column_index_from_string(letter), value)
+
+        if i < images:
+            # Noisy pixels so the photo doesn't compress to nothing, like a real photo
+            photo = Image.frombytes('RGB', (640, 480), rng.randbytes(640 * 480 * 3))
+            buffer = io.BytesIO()
+            photo.save(buffer, 'JPEG', quality=80)
+            buffer.seek(0)
+            sheet.add_image(XLImage(buffer), f"B{row}")
+
+    workbook.save(path)
+
+def encode_multipart(fields, filename, content):
+    """
+    Encode form fields and one file as multipart/form-data.
+
+    Returns:
+        tuple: (body bytes, Content-Type header value)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n'.encode()
+    )
+    parts.append(content)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+def post_form(base_url, path, fields, filename, content, timeout):
+    """
+    POST a workbook to the app as an AJAX request.
+
+    Returns:
+        tuple: (status code, response body bytes); status is 0 on a connection error
+    """
+    url = urlsplit(base_url)
+    body, content_type = encode_multipart(fields, filename, content)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    try:
+        connection.request('POST', path, body=body, headers={
+            'Content-Type': content_type,
+            'X-Requested-With': 'XMLHttpRequest'
+        })
+        response = connection.getresponse()
+        return response.status, response.read()
+    except (OSError, http.client.HTTPException):
+        return 0, b''
+    finally:
+        connection.close()
+
+def get_process_tree_rss(pid):
+    """
+    Get the total RSS of a process and all its descendants (Linux only).
+
+    Returns:
+        int or None: RSS in bytes, or None if /proc is unavailable
+    """
+    if not os.path.isdir('/proc'):
+        return None
+
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces; fields after it are fixed
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, ValueError, IndexError):
+                continue
+
+    total = 0
+    pending = [pid]
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+        pending.extend(children.get(current, []))
+    return total
+
+class RssSampler(threading.Thread):
+    """
+    Background thread that samples the server's RSS at a fixed interval.
+    """
+
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (seconds since start, RSS in MB)
+        self._stop_event = threading.Event()
+        self._started = time.monotonic()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rss = get_process_tree_rss(self.pid)
+            if rss is not None:
+                self.samples.append((round(time.monotonic() - self._started, 1), round(rss / (1024 * 1024), 1)))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def start_server(port, workers, threads, log_path):
+    """
+    Start the app under gunicorn with the repo's configuration (SERVER_MODE is passed through).
+
+    Returns:
+        subprocess.Popen: The gunicorn master process
+    """
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads))
+    log_file = open(log_path, 'wb')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=log_file,
+        stderr=subprocess.STDOUT
+    )
+
+def wait_until_ready(base_url, timeout, server=None):
+    """Poll /ready until the app has warmed up."""
+    url = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode} before becoming ready")
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=5)
+        try:
+            connection.request('GET', '/ready')
+            if connection.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+        time.sleep(1)
+    raise RuntimeError(f"Server not ready after {timeout} seconds")
+
+def run_job(base_url, workbook, timeout):
+    """
+    Run one user session: fetch the sheet names, then generate the report.
+
+    Args:
+        base_url (str): App URL
+        workbook (dict): {'name', 'rows', 'content'}
+        timeout (float): Per-request timeout in seconds
+
+    Returns:
+        dict: Status and latency of each request
+    """
+    result = {'rows': workbook['rows']}
+
+    started = time.monotonic()
+    status, body = post_form(base_url, '/get_sheet_names', {}, workbook['name'], workbook['content'], timeout)
+    result['sheet_names_status'] = status
+    result['sheet_names_seconds'] = time.monotonic() - started
+    sheet_name = SHEET_NAME
+    if status == 200:
+        sheet_name = json.loads(body).get('sheet_names', [SHEET_NAME])[0]
+
+    started = time.monotonic()
+    fields = dict(REPORT_FIELDS, sheet_name=sheet_name)
+    status, body = post_form(base_url, '/', fields, workbook['name'], workbook['content'], timeout)
+    result['report_status'] = status
+    result['report_seconds'] = time.monotonic() - started
+    result['report_bytes'] = len(body) if status == 200 else 0
+    return result
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return round(ordered[index], 3)
+
+def summarize_latencies(values):
+    """Get count and latency percentiles in seconds."""
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': round(max(values), 3) if values else None
+    }
+
+def summarize(results, elapsed, rss_samples, config):
+    """
+    Build the run summary.
+
+    Returns:
+        dict: Configuration, per-endpoint latency, throughput, error rate and RSS timeline
+    """
+    reports_ok = [r for r in results if r['report_status'] == 200]
+    rejected = [r for r in results if r['report_status'] == 429]
+    failed = [r for r in results if r['report_status'] not in (200, 429)]
+
+    by_size = {}
+    for rows in sorted({r['rows'] for r in results}):
+        sized = [r['report_seconds'] for r in reports_ok if r['rows'] == rows]
+        by_size[str(rows)] = summarize_latencies(sized)
+
+    rss_values = [mb for _, mb in rss_samples]
+    return {
+        'config': config,
+        'started': config['started'],
+        'elapsed_seconds': round(elapsed, 1),
+        'jobs': len(results),
+        'reports_ok': len(reports_ok),
+        'rejected_429': len(rejected),
+        'errors': len(failed),
+        'error_rate': round(len(failed) / len(results), 4) if results else 0,
+        'reports_per_minute': round(len(reports_ok) / elapsed * 60, 2) if elapsed else 0,
+        'latency': {
+            'get_sheet_names': summarize_latencies([r['sheet_names_seconds'] for r in results if r['sheet_names_status'] == 200]),
+            'report': summarize_latencies([r['report_seconds'] for r in reports_ok]),
+            'report_by_rows': by_size,
+            'client_queue': summarize_latencies([r['queued_seconds'] for r in results])
+        },
+        'rss_mb': {
+            'peak': max(rss_values) if rss_values else None,
+            'final': rss_values[-1] if rss_values else None,
+            'samples': rss_samples
+        }
+    }
+
+def render_html(summary):
+    """Render the summary as a standalone HTML page with an RSS chart."""
+    rows = []
+    latencies = summary['latency']
+    named = [('get_sheet_names', latencies['get_sheet_names']), ('report', latencies['report'])]
+    named += [(f"report ({rows} rows)", latency) for rows, latency in latencies['report_by_rows'].items()]
+    named.append(('client queue wait', latencies['client_queue']))
+    for name, latency in named:
+        rows.append(
+            f"<tr><td>{name}</td><td>{latency['count']}</td><td>{latency['p50']}</td>"
+            f"<td>{latency['p95']}</td><td>{latency['p99']}</td><td>{latency['max']}</td></tr>"
+        )
+
+    # RSS over time as an inline SVG polyline
+    samples = summary['rss_mb']['samples']
+    chart = '<p>No RSS samples (server not started by the harness or /proc unavailable).</p>'
+    if samples:
+        width, height = 800, 240
+        max_t = max(t for t, _ in samples) or 1
+        max_mb = max(mb for _, mb in samples) or 1
+        points = ' '.join(f"{t / max_t * width:.1f},{height - mb / max_mb * height:.1f}" for t, mb in samples)
+        chart = (
+            f'<svg width="{width}" height="{height}" style="border:1px solid #ccc">'
+            f'<polyline fill="none" stroke="#3A6CA8" stroke-width="2" points="{points}"/></svg>'
+            f'<p>0 to {max_t:.0f} s; peak {max_mb} MB</p>'
+        )
+
+    config = ''.join(f"<tr><td>{key}</td><td>{value}</td></tr>" for key, value in summary['config'].items())
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Load test {summary['started']}</title>
+<style>body{{font-family:sans-serif;margin:2em}}table{{border-collapse:collapse;margin-bottom:1.5em}}
+td,th{{border:1px solid #ccc;padding:4px 10px;text-align:right}}td:first-child{{text-align:left}}</style></head>
+<body>
+<h1>Load test {summary['started']}</h1>
+<table>{config}</table>
+<table>
+<tr><td>Jobs</td><td>{summary['jobs']}</td></tr>
+<tr><td>Reports OK</td><td>{summary['reports_ok']}</td></tr>
+<tr><td>Rejected (429)</td><td>{summary['rejected_429']}</td></tr>
+<tr><td>Errors</td><td>{summary['errors']} ({summary['error_rate']:.2%})</td></tr>
+<tr><td>Reports per minute</td><td>{summary['reports_per_minute']}</td></tr>
+</table>
+<h2>Latency (seconds)</h2>
+<table><tr><th>Request</th><th>Count</th><th>p50</th><th>p95</th><th>p99</th><th>Max</th></tr>{''.join(rows)}</table>
+<h2>Server RSS (MB)</h2>
+{chart}
+</body></html>
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the Property Report Generator')
+    parser.add_argument('--url', help='Test an already running server instead of starting gunicorn')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the gunicorn server started by the harness')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--concurrency', type=int, default=2, help='Maximum concurrent user sessions')
+    parser.add_argument('--rate', type=float, default=0, help='Session arrivals per second (0 = closed loop at full concurrency)')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to generate load for')
+    parser.add_argument('--sizes', default='20,200,1000', help='Comma-separated workbook row counts')
+    parser.add_argument('--images', type=int, default=20, help='Photos embedded per workbook (at most one per row)')
+    parser.add_argument('--variants', type=int, default=3, help='Distinct workbooks per size (identical uploads hit the table cache)')
+    parser.add_argument('--timeout', type=float, default=300, help='Per-request timeout in seconds')
+    parser.add_argument('--output', default='loadtest_results', help='Directory for the JSON/HTML report')
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    # Build the workbooks up front so generating them doesn't skew the timings
+    print(f"Building {len(sizes) * args.variants} synthetic workbooks...")
+    workbooks = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for rows in sizes:
+            for variant in range(args.variants):
+                path = os.path.join(temp_dir, f"loadtest_{rows}_{variant}.xlsx")
+                build_workbook(path, rows, min(args.images, rows), seed=rows * 1000 + variant)
+                with open(path, 'rb') as f:
+                    workbooks.append({'name': os.path.basename(path), 'rows': rows, 'content': f.read()})
+
+    server = None
+    sampler = None
+    base_url = args.url
+    if not base_url:
+        base_url = f"http://127.0.0.1:{args.port}"
+        print(f"Starting gunicorn ({args.workers} workers x {args.threads} threads) on {base_url}...")
+        server = start_server(args.port, args.workers, args.threads, os.path.join(args.output, 'server.log'))
+
+    try:
+        wait_until_ready(base_url, 300, server)
+        if server is not None:
+            sampler = RssSampler(server.pid, 1.0)
+            sampler.start()
+
+        config = {
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'url': base_url,
+            'workers': args.workers if server else None,
+            'threads': args.threads if server else None,
+            'concurrency': args.concurrency,
+            'rate': args.rate,
+            'duration': args.duration,
+            'sizes': sizes,
+            'images': args.images,
+            'variants': args.variants
+        }
+        print(f"Generating load for {args.duration:.0f}s...")
+
+        results = []
+        results_lock = threading.Lock()
+        rng = random.Random(0)
+
+        def session(arrival=None):
+            # Time spent waiting for a free session slot after arriving (open loop only)
+            queued = time.monotonic() - arrival if arrival is not None else 0.0
+            result = run_job(base_url, rng.choice(workbooks), args.timeout)
+            result['queued_seconds'] = queued
+            with results_lock:
+                results.append(result)
+
+        started = time.monotonic()
+        deadline = started + args.duration
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            if args.rate > 0:
+                # Open loop: Poisson arrivals, independent of how fast the server answers
+                next_arrival = started
+                while next_arrival < deadline:
+                    time.sleep(max(0, next_arrival - time.monotonic()))
+                    executor.submit(session, next_arrival)
+                    next_arrival += rng.expovariate(args.rate)
+            else:
+                # Closed loop: each slot starts a new session as soon as its last one ends
+                def worker():
+                    while time.monotonic() < deadline:
+                        session()
+                for _ in range(args.concurrency):
+                    executor.submit(worker)
+        elapsed = time.monotonic() - started
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    summary = summarize(results, elapsed, sampler.samples if sampler else [], config)
+    json_path = os.path.join(args.output, 'loadtest.json')
+    html_path = os.path.join(args.output, 'loadtest.html')
+    with open(json_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(render_html(summary))
+
+    report_latency = summary['latency']['report']
+    print(f"{summary['reports_ok']}/{summary['jobs']} reports OK, {summary['rejected_429']} rejected, "
+          f"{summary['errors']} errors; {summary['reports_per_minute']} reports/min; "
+          f"report p50/p95/p99 {report_latency['p50']}/{report_latency['p95']}/{report_latency['p99']}s; "
+          f"peak RSS {summary['rss_mb']['peak']} MB")
+    print(f"Wrote {json_path} and {html_path}")
+
+if __name__ == '__main__':
+    main()
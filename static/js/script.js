@@ -32,7 +32,14 @@ document.addEventListener('DOMContentLoaded', function() {
     const sheetSelectionContainer = document.getElementById('sheet-selection-container');
     const sheetSelect = document.getElementById('sheet_name');
     const sheetLoading = document.getElementById('sheet-loading');
+    const sheetValidation = document.getElementById('sheet-validation');
+    const uploadDigestInput = document.getElementById('upload_digest');
+    const uploadNameInput = document.getElementById('upload_name');
+    
+    // The selected file once /validate has stored it: {file, digest, name}
+    let storedUpload = null;
     const generateBtn = document.getElementById('generateBtn');
+    const previewBtn = document.getElementById('previewBtn');
     
     // Initially disable generate button until all requirements are met
     generateBtn.disabled = true;
@@ -67,6 +74,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     // For CSV files, hide sheet selection and update button state
                     sheetSelectionContainer.style.display = 'none';
                     updateGenerateButtonState();
+                    validateSheet(file, '');
                 }
             } else {
                 resetFileInput();
@@ -78,17 +86,244 @@ document.addEventListener('DOMContentLoaded', function() {
     if (sheetSelect) {
         sheetSelect.addEventListener('change', function() {
             updateGenerateButtonState();
+            if (sheetSelect.value && fileInput.files.length > 0) {
+                validateSheet(fileInput.files[0], sheetSelect.value);
+            } else {
+                sheetValidation.style.display = 'none';
+            }
+        });
+    }
+    
+    /**
+     * Function to check every row of the selected sheet before generating
+     * Shows a summary and the first few problems below the sheet dropdown
+     */
+    function validateSheet(file, sheetName) {
+        const formData = new FormData();
+        const upload = getStoredUpload(file);
+        if (upload) {
+            // Already on the server: send its digest instead of the file
+            formData.append('upload_digest', upload.digest);
+            formData.append('upload_name', upload.name);
+        } else {
+            formData.append('file', file);
+        }
+        formData.append('sheet_name', sheetName);
+        formData.append('report_date', reportDateInput.value.trim());
+        
+        sheetValidation.style.display = 'block';
+        sheetValidation.textContent = 'Checking rows...';
+        
+        fetch('/validate', {
+            method: 'POST',
+            body: formData
+        })
+        .then(response => {
+            if (response.status === 410 && upload) {
+                // The stored upload was cleaned up; upload the file again
+                storedUpload = null;
+                validateSheet(file, sheetName);
+                return null;
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (!data) return;
+            if (data.upload) {
+                storedUpload = { file: file, digest: data.upload.digest, name: data.upload.name };
+            }
+            sheetValidation.innerHTML = '';
+            
+            if (data.error) {
+                sheetValidation.style.color = '#c0392b';
+                sheetValidation.textContent = data.error;
+                return;
+            }
+            
+            const summary = document.createElement('div');
+            summary.textContent = `${data.rows} rows checked, ${data.reported} properties will be shown: ` +
+                `${data.errors} errors, ${data.warnings} warnings`;
+            sheetValidation.style.color = data.errors ? '#c0392b' : (data.warnings ? '#b9770e' : '#1e8449');
+            sheetValidation.appendChild(summary);
+            
+            // Note properties already listed in earlier workbooks
+            if (data.history && data.history.repeat_listings.length) {
+                const repeats = document.createElement('div');
+                repeats.textContent = `${data.history.repeat_listings.length} properties were listed in earlier workbooks`;
+                sheetValidation.appendChild(repeats);
+            }
+            
+            // List the first few problems by cell
+            const list = document.createElement('ul');
+            list.style.margin = '6px 0 0 18px';
+            data.issues.slice(0, 10).forEach(issue => {
+                const item = document.createElement('li');
+                const value = issue.value === null ? '' : ` ("${issue.value}")`;
+                item.textContent = `${issue.cell}${value}: ${issue.message}`;
+                list.appendChild(item);
+            });
+            if (data.issues.length > 10 || data.truncated) {
+                const more = document.createElement('li');
+                more.textContent = `...and ${data.errors + data.warnings - 10} more`;
+                list.appendChild(more);
+            }
+            sheetValidation.appendChild(list);
+        })
+        .catch(error => {
+            console.error('Error validating sheet:', error);
+            sheetValidation.style.display = 'none';
+        });
+    }
+    
+    /**
+     * Get the stored upload of a file, or null if it hasn't been stored yet
+     */
+    function getStoredUpload(file) {
+        return storedUpload && storedUpload.file === file ? storedUpload : null;
+    }
+    
+    /**
+     * Point the form at the stored upload of the selected file, if there is one.
+     * Disabled inputs aren't submitted, so the file itself is only sent when needed.
+     * Returns true if the stored upload is used; call restoreFileInput() after submitting.
+     */
+    function useStoredUpload() {
+        const upload = fileInput.files.length > 0 ? getStoredUpload(fileInput.files[0]) : null;
+        uploadDigestInput.value = upload ? upload.digest : '';
+        uploadNameInput.value = upload ? upload.name : '';
+        fileInput.disabled = Boolean(upload);
+        return Boolean(upload);
+    }
+    
+    /**
+     * Re-enable the file input after a submission that used the stored upload
+     */
+    function restoreFileInput() {
+        fileInput.disabled = false;
+    }
+    
+    /**
+     * Function to read a file range as bytes
+     */
+    function readBytes(file, start, end) {
+        return file.slice(start, end).arrayBuffer().then(buffer => new Uint8Array(buffer));
+    }
+    
+    /**
+     * Function to read one file from a ZIP archive (an .xlsx workbook) without uploading it
+     * Supports stored and deflated entries; rejects anything else so the caller can fall back
+     */
+    function readZipEntry(file, entryName) {
+        // The end-of-central-directory record is in the last 22 bytes plus an optional comment
+        const tailStart = Math.max(0, file.size - 22 - 65535);
+        return readBytes(file, tailStart, file.size).then(tail => {
+            const tailView = new DataView(tail.buffer);
+            let eocd = -1;
+            for (let i = tail.length - 22; i >= 0; i--) {
+                if (tailView.getUint32(i, true) === 0x06054b50) {
+                    eocd = i;
+                    break;
+                }
+            }
+            if (eocd < 0) throw new Error('Not a ZIP file');
+            
+            const directorySize = tailView.getUint32(eocd + 12, true);
+            const directoryOffset = tailView.getUint32(eocd + 16, true);
+            if (directoryOffset === 0xffffffff) throw new Error('ZIP64 archives are not supported');
+            return readBytes(file, directoryOffset, directoryOffset + directorySize);
+        }).then(directory => {
+            // Find the entry in the central directory
+            const view = new DataView(directory.buffer);
+            const decoder = new TextDecoder();
+            for (let pos = 0; pos + 46 <= directory.length && view.getUint32(pos, true) === 0x02014b50;) {
+                const nameLength = view.getUint16(pos + 28, true);
+                const name = decoder.decode(directory.subarray(pos + 46, pos + 46 + nameLength));
+                if (name === entryName) {
+                    return {
+                        method: view.getUint16(pos + 10, true),
+                        compressedSize: view.getUint32(pos + 20, true),
+                        localOffset: view.getUint32(pos + 42, true)
+                    };
+                }
+                pos += 46 + nameLength + view.getUint16(pos + 30, true) + view.getUint16(pos + 32, true);
+            }
+            throw new Error(`${entryName} not found`);
+        }).then(entry => {
+            // The data follows the local header, whose name and extra lengths may differ
+            return readBytes(file, entry.localOffset, entry.localOffset + 30).then(header => {
+                const headerView = new DataView(header.buffer);
+                const dataStart = entry.localOffset + 30 + headerView.getUint16(26, true) + headerView.getUint16(28, true);
+                return readBytes(file, dataStart, dataStart + entry.compressedSize);
+            }).then(data => {
+                if (entry.method === 0) return data;
+                if (entry.method !== 8 || typeof DecompressionStream === 'undefined') {
+                    throw new Error('Unsupported compression');
+                }
+                const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream('deflate-raw'));
+                return new Response(stream).arrayBuffer().then(buffer => new Uint8Array(buffer));
+            });
         });
     }
     
+    /**
+     * Function to list the sheets of an .xlsx file in the browser
+     * Reads xl/workbook.xml from the archive, so the file is not uploaded
+     */
+    function readSheetNamesLocally(file) {
+        return readZipEntry(file, 'xl/workbook.xml').then(data => {
+            const xml = new DOMParser().parseFromString(new TextDecoder().decode(data), 'application/xml');
+            if (xml.getElementsByTagName('parsererror').length) throw new Error('Unreadable workbook.xml');
+            const sheetNames = Array.from(xml.getElementsByTagNameNS('*', 'sheet')).map(sheet => sheet.getAttribute('name'));
+            if (!sheetNames.length) throw new Error('No sheets found');
+            return sheetNames;
+        });
+    }
+    
+    /**
+     * Function to fill the sheet dropdown
+     */
+    function populateSheetNames(sheetNames) {
+        sheetLoading.style.display = 'none';
+        
+        // Clear existing options and add new ones
+        sheetSelect.innerHTML = '<option value="">Select a sheet...</option>';
+        
+        // Add each sheet name to the dropdown
+        sheetNames.forEach(sheetName => {
+            const option = document.createElement('option');
+            option.value = sheetName;
+            option.textContent = sheetName;
+            sheetSelect.appendChild(option);
+        });
+        
+        console.log('Sheet names loaded:', sheetNames);
+    }
+    
     /**
      * Function to get sheet names from Excel file
-     * Sends the file to the backend and populates the dropdown with available sheets
+     * Reads .xlsx files in the browser; .xls files (and anything the browser
+     * can't read) are sent to the backend instead
      */
     function getSheetNames(file) {
         sheetLoading.style.display = 'block';
         sheetSelectionContainer.style.display = 'block';
         
+        if (file.name.toLowerCase().endsWith('.xlsx')) {
+            readSheetNamesLocally(file)
+                .then(populateSheetNames)
+                .catch(error => {
+                    console.log('Reading sheet names in the browser failed, asking the server:', error.message);
+                    getSheetNamesFromServer(file);
+                });
+        } else {
+            getSheetNamesFromServer(file);
+        }
+    }
+    
+    /**
+     * Function to get sheet names by uploading the file to the backend
+     */
+    function getSheetNamesFromServer(file) {
         const formData = new FormData();
         formData.append('file', file);
         
@@ -98,27 +333,15 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => response.json())
         .then(data => {
-            sheetLoading.style.display = 'none';
-            
             if (data.error) {
+                sheetLoading.style.display = 'none';
                 console.error('Error getting sheet names:', data.error);
                 showErrorPopup(data.error);
                 sheetSelectionContainer.style.display = 'none';
                 return;
             }
             
-            // Clear existing options and add new ones
-            sheetSelect.innerHTML = '<option value="">Select a sheet...</option>';
-            
-            // Add each sheet name to the dropdown
-            data.sheet_names.forEach(sheetName => {
-                const option = document.createElement('option');
-                option.value = sheetName;
-                option.textContent = sheetName;
-                sheetSelect.appendChild(option);
-            });
-            
-            console.log('Sheet names loaded:', data.sheet_names);
+            populateSheetNames(data.sheet_names);
         })
         .catch(error => {
             console.error('Error fetching sheet names:', error);
@@ -139,17 +362,20 @@ document.addEventListener('DOMContentLoaded', function() {
         // Check if all required fields are filled
         if (!file) {
             generateBtn.disabled = true;
+            if (previewBtn) previewBtn.disabled = true;
             return;
         }
         
         // For Excel files, check if sheet is selected
         if ((fileExt === 'xlsx' || fileExt === 'xls') && !sheetSelect.value) {
             generateBtn.disabled = true;
+            if (previewBtn) previewBtn.disabled = true;
             return;
         }
         
         // Enable button if all conditions are met
         generateBtn.disabled = false;
+        if (previewBtn) previewBtn.disabled = false;
     }
     
     /**
@@ -161,9 +387,12 @@ document.addEventListener('DOMContentLoaded', function() {
         fileUploadText.textContent = 'Choose Excel/CSV file';
         fileUploadIcon.innerHTML = '<i class="fas fa-cloud-upload-alt"></i>';
         if (fileInput) fileInput.value = '';
+        storedUpload = null;
         sheetSelectionContainer.style.display = 'none';
         sheetSelect.innerHTML = '<option value="">Select a sheet...</option>';
         generateBtn.disabled = true;
+        if (previewBtn) previewBtn.disabled = true;
+        sheetValidation.style.display = 'none';
     }
     
     /**
@@ -187,6 +416,57 @@ document.addEventListener('DOMContentLoaded', function() {
     const loadingOverlay = document.getElementById('loading-overlay');
     const successOverlay = document.getElementById('success-overlay');
     const closeSuccessBtn = document.getElementById('closeSuccessBtn');
+    const cancelReportBtn = document.getElementById('cancelReportBtn');
+    
+    // The report request in progress, so it can be cancelled
+    let currentJob = null;
+    
+    /**
+     * Function to cancel the report request in progress
+     * Aborts the download and tells the server to stop rendering
+     */
+    function cancelCurrentJob() {
+        if (!currentJob) return;
+        const job = currentJob;
+        currentJob = null;
+        job.controller.abort();
+        
+        const cancelData = new FormData();
+        cancelData.append('job_id', job.id);
+        navigator.sendBeacon('/cancel', cancelData);
+    }
+    
+    // Stop the render if the page is closed while it is running
+    window.addEventListener('pagehide', cancelCurrentJob);
+    
+    if (cancelReportBtn) {
+        cancelReportBtn.addEventListener('click', function() {
+            cancelCurrentJob();
+            loadingOverlay.classList.remove('active');
+            showNotification('Report generation was cancelled', 'success');
+        });
+    }
+    
+    // Handle preview button click: show the report HTML in a new tab, without a PDF render
+    if (previewBtn) {
+        previewBtn.addEventListener('click', function(e) {
+            e.preventDefault();
+            const originalAction = form.getAttribute('action');
+            form.setAttribute('action', '/preview');
+            form.setAttribute('target', '_blank');
+            useStoredUpload();
+            form.submit();
+            restoreFileInput();
+            
+            // Restore the form so Generate Report still posts to the main page
+            if (originalAction === null) {
+                form.removeAttribute('action');
+            } else {
+                form.setAttribute('action', originalAction);
+            }
+            form.removeAttribute('target');
+        });
+    }
     
     // Handle generate button click
     if (generateBtn) {
@@ -312,7 +592,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Check each field and return specific error messages
         if (!businessType) {
-            return { isValid: false, errorMessage: 'Please select a business type (BusiVet or BusiHealth).' };
+            return { isValid: false, errorMessage: 'Please select a business type.' };
         }
 
         if (!firstLine) {
@@ -356,22 +636,40 @@ document.addEventListener('DOMContentLoaded', function() {
     function submitForm() {
         console.log('Submitting form...');
         
-        // Create a form data object for submission
+        // Create a form data object for submission (with the stored upload's digest rather than the file, if there is one)
+        const usedStoredUpload = useStoredUpload();
         const formData = new FormData(form);
+        restoreFileInput();
+        
+        // The request ID lets the server cancel this job if it is aborted
+        const job = {
+            id: Date.now().toString(36) + Math.random().toString(36).slice(2, 10),
+            controller: new AbortController()
+        };
+        currentJob = job;
         
         // Submit form using fetch API with custom headers to identify AJAX requests
         fetch('/', {
             method: 'POST',
             body: formData,
+            signal: job.controller.signal,
             headers: {
                 'X-Requested-With': 'XMLHttpRequest',  // This tells the backend this is an AJAX request
-                'Accept': 'application/json, application/pdf'  // We accept both JSON (errors) and PDF (success)
+                'Accept': 'application/json, application/pdf, application/zip',  // JSON (errors), or the PDF or ZIP bundle (success)
+                'X-Request-ID': job.id
             }
         })
         .then(response => {
             console.log('Response status:', response.status);
             console.log('Response content-type:', response.headers.get('content-type'));
             
+            if (response.status === 410 && usedStoredUpload) {
+                // The stored upload was cleaned up; submit again with the file itself
+                storedUpload = null;
+                submitForm();
+                return null;
+            }
+            
             // Check if the response indicates an error (4xx or 5xx status codes)
             if (!response.ok) {
                 // The response is an error, try to parse it as JSON
@@ -391,10 +689,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
             }
             
-            // Check if the response is actually a PDF file
+            // Check if the response is actually a PDF file or a ZIP bundle
             const contentType = response.headers.get('content-type');
-            if (contentType && contentType.includes('application/pdf')) {
-                console.log('Received PDF response');
+            if (contentType && (contentType.includes('application/pdf') || contentType.includes('application/zip'))) {
+                console.log('Received report response:', contentType);
                 return response.blob();
             } else {
                 // If it's not a PDF and not an error, something unexpected happened
@@ -403,6 +701,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         })
         .then(blob => {
+            if (currentJob === job) currentJob = null;
             if (!blob) return; // Skip if no blob (shouldn't happen)
             
             console.log('Processing PDF download...');
@@ -415,7 +714,8 @@ document.addEventListener('DOMContentLoaded', function() {
             const businessType = document.querySelector('input[name="business_type"]:checked').value;
             const thirdLine = document.getElementById('third_line').value.trim();
             const reportDate = document.getElementById('report_date').value.trim();
-            const filename = `Property_Report_${thirdLine.replace(/\s+/g, '_')}_${reportDate.replace(/\s+/g, '_')}.pdf`;
+            const extension = blob.type.includes('application/zip') ? 'zip' : 'pdf';
+            const filename = `Property_Report_${thirdLine.replace(/\s+/g, '_')}_${reportDate.replace(/\s+/g, '_')}.${extension}`;
             
             a.href = url;
             a.download = filename;
@@ -438,6 +738,11 @@ document.addEventListener('DOMContentLoaded', function() {
             }, 1000);
         })
         .catch(error => {
+            if (currentJob === job) currentJob = null;
+            if (error.name === 'AbortError') {
+                console.log('Report request cancelled');
+                return;
+            }
             console.error('Error during form submission:', error);
             
             // Hide loading overlay
@@ -490,8 +795,9 @@ document.addEventListener('DOMContentLoaded', function() {
         ];
         document.getElementById('report_date').value = `${now.getDate()} ${months[now.getMonth()]} ${now.getFullYear()}`;
         
-        // Reset business type to BusiVet
-        document.getElementById('busivet').checked = true;
+        // Reset business type to the first configured brand
+        const firstBusinessType = document.querySelector('input[name="business_type"]');
+        if (firstBusinessType) firstBusinessType.checked = true;
         
         // Reset file input and sheet selection
         resetFileInput();
@@ -0,0 +1,88 @@
+"""
+Concurrency tests for the shared HTML builder and PDF renderer.
+
+One renderer serves every thread in a worker, so reports built at the same
+time from many threads must come out exactly as they do one at a time.
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from utils.pdf_generator import get_renderer, get_brands, generate_pdf
+    from utils.property_record import PropertyRecord
+except (ImportError, OSError) as e:  # WeasyPrint needs Pango at import time
+    pytest.skip(f"WeasyPrint is not available: {e}", allow_module_level=True)
+
+REPORTS = 24
+THREADS = 8
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches():
+    """Switch threads far more often than usual so interleavings that expose shared state show up."""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+def make_property(report, number):
+    """Build a property whose fields identify the report and property."""
+    return PropertyRecord(
+        suburb=f"Suburb {report}",
+        suburb_formatted=f"SUBURB {report}",
+        street_address=f"{number} Report {report} Street",
+        floor_area=str(100 + report * 10 + number),
+        price=f"${report},{number:03d}",
+        zoning=f"B{number % 7}",
+        property_type='Commercial' if number % 2 else 'Retail',
+        car_spaces=str(number),
+        comments=f"Report {report} property {number}",
+        image=None
+    )
+
+def make_report(report):
+    """Build the arguments of one report; every report differs in brand, text and property count."""
+    brands = sorted(get_brands())
+    statistics = {
+        key: {'total': report + offset, 'criteria': report, 'avg_price': 100 * report + offset}
+        for offset, key in enumerate(('for_lease', 'already_leased', 'for_sale', 'sold'))
+    }
+    data = {
+        'for_lease_properties': [make_property(report, number) for number in range(report % 5 + 1)],
+        'for_sale_properties': [make_property(report, number) for number in range(100, 100 + report % 4)],
+        'statistics': statistics,
+        'images': {}
+    }
+    return (data, brands[report % len(brands)], f"Client {report}", f"Title {report}",
+            f"Location {report}", f"{report % 28 + 1} March 2025")
+
+def test_concurrent_build_html_matches_sequential():
+    builder = get_renderer().html_builder
+    reports = [make_report(report) for report in range(REPORTS)]
+    expected = [builder.build_html(*report) for report in reports]
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        # Each report built several times so builds overlap across threads
+        results = list(pool.map(lambda report: builder.build_html(*report), reports * 3))
+
+    for index, html in enumerate(results):
+        assert html == expected[index % REPORTS]
+    assert len(set(expected)) == REPORTS
+
+def test_concurrent_generate_pdf_writes_separate_files():
+    reports = [make_report(report) for report in range(THREADS * 2)]
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        paths = list(pool.map(lambda report: generate_pdf(*report), reports))
+
+    try:
+        assert len(set(paths)) == len(reports)
+        for path in paths:
+            with open(path, 'rb') as f:
+                assert f.read(5) == b'%PDF-'
+    finally:
+        for path in paths:
+            os.remove(path)
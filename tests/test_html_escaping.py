@@ -0,0 +1,62 @@
+"""
+Escaping tests for report HTML.
+
+Workbook cells and form fields are inserted into the report HTML, which
+/preview serves on the app's own origin, so they must never become markup.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from utils.pdf_generator import generate_html, get_brands
+    from utils.property_record import PropertyRecord
+    from utils.preview import build_preview_html
+except (ImportError, OSError) as e:  # WeasyPrint needs Pango at import time
+    pytest.skip(f"WeasyPrint is not available: {e}", allow_module_level=True)
+
+SCRIPT = '<script>alert(1)</script>'
+
+def build(street_address=SCRIPT, comments=SCRIPT, first_line=SCRIPT):
+    """Build report HTML for one property with the given text."""
+    record = PropertyRecord(
+        suburb=SCRIPT,
+        suburb_formatted=SCRIPT,
+        street_address=street_address,
+        floor_area='100',
+        price='$1',
+        zoning='B2',
+        property_type='Commercial',
+        car_spaces='-',
+        comments=comments,
+        image=None
+    )
+    empty_stats = {'total': 0, 'criteria': 0, 'avg_price': 0}
+    data = {
+        'for_lease_properties': [record],
+        'for_sale_properties': [],
+        'statistics': {key: dict(empty_stats) for key in ('for_lease', 'already_leased', 'for_sale', 'sold')},
+        'images': {}
+    }
+    return generate_html(data, next(iter(get_brands())), first_line, SCRIPT, SCRIPT, SCRIPT)
+
+def test_cells_and_form_fields_are_escaped():
+    html = build()
+    assert SCRIPT not in html
+    assert '&lt;script&gt;alert(1)&lt;/script&gt;' in html
+
+def test_attribute_breakout_is_escaped():
+    html = build(street_address='" onmouseover="alert(1)', comments="' onfocus='alert(1)")
+    assert '" onmouseover="' not in html
+    assert "' onfocus='" not in html
+
+def test_preview_rewrites_only_asset_attributes():
+    html = build(street_address='asset://shared/map', comments=SCRIPT, first_line='x')
+    preview = build_preview_html(html, {}, '/preview/assets/', '/preview/styles.css')
+    assert 'src="/preview/assets/' in preview
+    assert 'src="asset://' not in preview
+    # Text typed by the user is left as text
+    assert '>asset://shared/map<' in preview
@@ -0,0 +1,92 @@
+"""
+Memory ceiling tests for processing large workbooks.
+
+A synthetic workbook with thousands of rows and hundreds of photos is put
+through the table normalization and processing stages. Each photo must be
+held in memory once, so the stage's traced peak stays within a fixed margin
+of the photo bytes however many rows reference them.
+"""
+
+import os
+import sys
+import zipfile
+import logging
+import tracemalloc
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_processor import normalize_property_table, process_excel_data
+from utils.memory_stats import start_stage, collect_stages, get_stage_meters, MB
+
+ROWS = 5000
+PHOTOS = 300
+PHOTO_BYTES = 128 * 1024
+
+# Allowed memory beyond the photo bytes for the records and bookkeeping (a second
+# copy of the photos would exceed it)
+OVERHEAD_BYTES = 16 * MB
+
+@pytest.fixture(scope='module')
+def large_workbook(tmp_path_factory):
+    """Write a workbook with ROWS properties and PHOTOS distinct photos."""
+    path = tmp_path_factory.mktemp('workbook') / 'large.xlsx'
+    types = ['For Lease', 'For Sale', 'Sold', 'Already Leased']
+    pd.DataFrame({
+        'Type': [types[i % len(types)] for i in range(ROWS)],
+        'Property Photo': [''] * ROWS,
+        'Street Address': [f"{i} Synthetic Street" for i in range(ROWS)],
+        'Suburb': [f"Suburb {i % 50}" for i in range(ROWS)],
+        'State': ['NSW'] * ROWS,
+        'Postcode': [2000 + i % 50 for i in range(ROWS)],
+        'Site Zoning': ['B5'] * ROWS,
+        'Property Type': ['Warehouse'] * ROWS,
+        'Car': [i % 10 for i in range(ROWS)],
+        'Floor Size (m²)': [100 + i for i in range(ROWS)],
+        'Sale Price': [f"${1000000 + i}" for i in range(ROWS)],
+        'Last Listed Price (Sold/For Sale)': [f"${900000 + i}" for i in range(ROWS)],
+        'Total Lease Price (Base + Outgoings)': [f"${50000 + i}" for i in range(ROWS)],
+        'PUT IN REPORT (T/F)': ['T' if i % 5 else 'F' for i in range(ROWS)],
+        "Busi's Comment": [f"Comment for property {i}" for i in range(ROWS)],
+        '$/m²': [1000 + i % 700 for i in range(ROWS)],
+    }).to_excel(path, sheet_name='Data', index=False)
+
+    # Photos only need to be media parts; random bytes keep every one distinct
+    with zipfile.ZipFile(path, 'a') as workbook:
+        for i in range(PHOTOS):
+            workbook.writestr(f"xl/media/image{i + 1}.jpeg", os.urandom(PHOTO_BYTES))
+    return str(path)
+
+def test_process_stage_stays_under_memory_ceiling(large_workbook):
+    df = normalize_property_table(pd.read_excel(large_workbook, sheet_name='Data'), large_workbook)
+
+    tracemalloc.start()
+    try:
+        with collect_stages():
+            result = process_excel_data(df, large_workbook)
+            meters = get_stage_meters()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    photo_bytes = PHOTOS * PHOTO_BYTES
+    assert len(result['images']) == PHOTOS
+    assert peak < photo_bytes + OVERHEAD_BYTES, f"peak {peak / MB:.1f} MB for {photo_bytes / MB:.1f} MB of photos"
+
+    # The stage's meter reports the same payload
+    [meter] = [meter for meter in meters if meter.stage == 'process']
+    assert meter.fields['rows'] == ROWS
+    assert meter.fields['unique_images'] == PHOTOS
+    assert meter.fields['image_bytes'] == photo_bytes
+
+def test_stage_meters_are_only_collected_inside_the_block():
+    logger = logging.getLogger(__name__)
+    start_stage('before').finish(logger)
+    with collect_stages() as meters:
+        start_stage('inside').finish(logger, table_bytes=MB)
+    start_stage('after').finish(logger)
+
+    assert [meter.stage for meter in meters] == ['inside']
+    assert meters[0].fields['table_bytes'] == MB
+    assert get_stage_meters() == []
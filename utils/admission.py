@@ -0,0 +1,177 @@
+"""
+Admission control module for limiting concurrent report renders.
+
+Each job's memory cost is estimated up front from the workbook and jobs are
+admitted against a per-process budget. Waiting jobs are admitted cheapest
+first, and jobs that cannot be admitted in time are rejected so the caller
+can answer with 429 instead of risking an out-of-memory kill.
+"""
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Rough memory model for a render, in MB
+BASE_JOB_COST_MB = 150          # WeasyPrint layout and PDF writer baseline
+COST_PER_ROW_MB = 0.05          # pandas row storage
+COST_PER_PROPERTY_MB = 2        # layout boxes for a rendered property
+IMAGE_COST_MULTIPLIER = 6       # decoded pixels + PDF stream per byte of encoded image file
+
+# Initial guess for how long a render takes, refined as jobs finish
+DEFAULT_JOB_SECONDS = 20
+
+# How often a waiting job checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.5
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be admitted; carries a Retry-After hint in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def estimate_job_cost(row_count, selected_count, image_bytes):
+    """
+    Estimate the peak memory a report render will need.
+
+    Args:
+        row_count (int): Number of rows in the sheet
+        selected_count (int): Number of rows marked for the report
+        image_bytes (int): Total size of the workbook's encoded image files (uncompressed from the ZIP)
+
+    Returns:
+        float: Estimated cost in MB
+    """
+    return (
+        BASE_JOB_COST_MB
+        + row_count * COST_PER_ROW_MB
+        + selected_count * COST_PER_PROPERTY_MB
+        + image_bytes * IMAGE_COST_MULTIPLIER / (1024 * 1024)
+    )
+
+class AdmissionController:
+    """
+    Semaphore-style gate that admits jobs against a memory budget.
+    """
+
+    def __init__(self, budget_mb, max_concurrent, max_queue, queue_timeout):
+        """
+        Initialize the controller.
+
+        Args:
+            budget_mb (float): Total estimated cost allowed to run at once
+            max_concurrent (int): Maximum number of jobs running at once
+            max_queue (int): Maximum number of jobs waiting before new ones are rejected
+            queue_timeout (float): Seconds a job may wait before it is rejected
+        """
+        self.budget_mb = budget_mb
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._condition = threading.Condition()
+        self._waiting = []  # Heap of (cost, sequence) so cheaper jobs go first
+        self._sequence = itertools.count()
+        self._running = 0
+        self._in_use_mb = 0.0
+        self._avg_job_seconds = DEFAULT_JOB_SECONDS
+
+        self.admitted_total = 0
+        self.rejected_total = 0
+
+    def _fits(self, cost):
+        """Check whether a job of this cost can start now."""
+        if self._running >= self.max_concurrent:
+            return False
+        # An oversized job is still allowed to run on its own
+        return self._running == 0 or self._in_use_mb + cost <= self.budget_mb
+
+    def _retry_after(self):
+        """Estimate seconds until capacity frees up."""
+        backlog = len(self._waiting) + self._running
+        return max(1, int(self._avg_job_seconds * backlog / self.max_concurrent))
+
+    def _reject(self, reason):
+        """Count a rejection and build the exception to raise."""
+        self.rejected_total += 1
+        retry_after = self._retry_after()
+        logger.warning(f"Render rejected ({reason}); retry after {retry_after}s")
+        return AdmissionRejected(f"Server is busy generating other reports ({reason})", retry_after)
+
+    @contextmanager
+    def admit(self, cost, cancel_token=None):
+        """
+        Wait for capacity and hold it for the duration of the block.
+
+        Args:
+            cost (float): Estimated job cost in MB
+            cancel_token (CancelToken, optional): Stop waiting if the job is cancelled
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait times out
+            JobCancelled: If the job is cancelled while waiting
+        """
+        with self._condition:
+            if len(self._waiting) >= self.max_queue:
+                raise self._reject('queue full')
+
+            entry = (cost, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            deadline = time.monotonic() + self.queue_timeout
+
+            # Only the cheapest waiting job may take capacity
+            while not (self._waiting[0] == entry and self._fits(cost)):
+                remaining = deadline - time.monotonic()
+                cancelled = cancel_token is not None and cancel_token.is_cancelled()
+                if remaining <= 0 or cancelled:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                    if cancelled:
+                        cancel_token.check()
+                    raise self._reject('timed out waiting')
+                self._condition.wait(min(remaining, CANCEL_POLL_SECONDS) if cancel_token is not None else remaining)
+
+            heapq.heappop(self._waiting)
+            self._running += 1
+            self._in_use_mb += cost
+            self.admitted_total += 1
+            # Let the next cheapest waiter check whether it also fits
+            self._condition.notify_all()
+
+        logger.debug(f"Render admitted (cost {cost:.0f} MB, {self._running} running)")
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._in_use_mb -= cost
+                elapsed = time.monotonic() - started
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+                self._condition.notify_all()
+
+    def stats(self):
+        """
+        Get current queue and capacity figures.
+
+        Returns:
+            dict: Running jobs, queue depth, budget use and totals
+        """
+        with self._condition:
+            return {
+                'running': self._running,
+                'queue_depth': len(self._waiting),
+                'in_use_mb': round(self._in_use_mb),
+                'budget_mb': self.budget_mb,
+                'max_concurrent': self.max_concurrent,
+                'admitted_total': self.admitted_total,
+                'rejected_total': self.rejected_total,
+                'avg_job_seconds': round(self._avg_job_seconds, 1)
+            }
@@ -0,0 +1,357 @@
+"""
+ASGI bridge module for serving the Flask app from an async server.
+
+The request body is received on the event loop and handed to the Flask
+view through a small buffer as it arrives, so uploads are checked and
+written to their final place while they stream in (and bad ones are
+rejected before the rest is received); the buffer's limit holds the client
+back when the view reads slower than it sends. The response is streamed
+back on the event loop. Only the view itself, which parses the workbook and
+renders the PDF, runs on a bounded thread pool, and downloads don't hold a
+rendering thread. A client disconnect sets the threading.Event in
+environ['asgi_bridge.disconnected'] so the app can stop work nobody will
+receive.
+"""
+
+import io
+import sys
+import asyncio
+import logging
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Request body bytes received ahead of the app before the client is held back
+BODY_BUFFER_SIZE = 1024 * 1024
+
+# Chunk size used when streaming files (e.g. PDFs from send_file)
+FILE_CHUNK_SIZE = 256 * 1024
+
+class FileWrapper:
+    """wsgi.file_wrapper that reads files in large chunks."""
+
+    def __init__(self, file, buffer_size=FILE_CHUNK_SIZE):
+        self.file = file
+        self.buffer_size = max(buffer_size, FILE_CHUNK_SIZE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.file.read(self.buffer_size)
+        if not data:
+            raise StopIteration
+        return data
+
+    def close(self):
+        if hasattr(self.file, 'close'):
+            self.file.close()
+
+class RequestBody(io.RawIOBase):
+    """
+    wsgi.input fed by the event loop while the app thread reads it.
+
+    The event loop appends chunks as they are received and waits while
+    max_buffered bytes are unread; the app thread blocks in readinto() until
+    data, the end of the body or an error arrives. Once the app is done with
+    the request, close() drops the rest of the body as it arrives.
+    """
+
+    def __init__(self, loop, max_buffered=BODY_BUFFER_SIZE):
+        """
+        Initialize an empty body.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): Loop that feeds the body
+            max_buffered (int): Unread bytes held before feed() waits
+        """
+        super().__init__()
+        self.max_buffered = max_buffered
+        self._loop = loop
+        self._chunks = deque()
+        self._buffered = 0
+        self._finished = False
+        self._error = None
+        self._dropping = False
+        self._condition = threading.Condition()
+        self._space = asyncio.Event()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """Read the next received bytes into buffer, waiting for them if needed (app thread)."""
+        with self._condition:
+            while not self._chunks and not self._finished and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+            if not self._chunks:
+                return 0
+            chunk = self._chunks[0]
+            size = min(len(buffer), len(chunk))
+            buffer[:size] = chunk[:size]
+            if size == len(chunk):
+                self._chunks.popleft()
+            else:
+                self._chunks[0] = chunk[size:]
+            self._buffered -= size
+        # Let feed() continue if it is waiting for room
+        self._loop.call_soon_threadsafe(self._space.set)
+        return size
+
+    async def feed(self, chunk):
+        """Append a received chunk, waiting while the buffer is full (event loop)."""
+        while True:
+            with self._condition:
+                if self._dropping:
+                    return
+                if self._buffered < self.max_buffered:
+                    self._chunks.append(memoryview(chunk))
+                    self._buffered += len(chunk)
+                    self._condition.notify_all()
+                    return
+                self._space.clear()
+            await self._space.wait()
+
+    def finish(self):
+        """Mark the end of the body (event loop)."""
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
+
+    def fail(self, error):
+        """Make the app's reads raise error, e.g. when the client disconnects (event loop)."""
+        with self._condition:
+            self._error = error
+            self._chunks.clear()
+            self._condition.notify_all()
+
+    def drop(self):
+        """Discard unread and further body data."""
+        with self._condition:
+            self._dropping = True
+            self._chunks.clear()
+            self._buffered = 0
+            self._condition.notify_all()
+        self._loop.call_soon_threadsafe(self._space.set)
+
+    def close(self):
+        """Drop the rest of the body once the app is done with it."""
+        self.drop()
+        super().close()
+
+class AsgiBridge:
+    """
+    ASGI application that runs a WSGI app with async body and response I/O.
+    """
+
+    def __init__(self, wsgi_app, app_threads, io_threads, max_body_size=None, body_buffer_size=BODY_BUFFER_SIZE):
+        """
+        Initialize the bridge.
+
+        Args:
+            wsgi_app (callable): The WSGI application
+            app_threads (int): Threads that run the WSGI app (views, parsing, rendering)
+            io_threads (int): Threads for response chunk reads
+            max_body_size (int, optional): Largest request body accepted, in bytes
+            body_buffer_size (int): Request body bytes received ahead of the app
+        """
+        self.wsgi_app = wsgi_app
+        self.max_body_size = max_body_size
+        self.body_buffer_size = body_buffer_size
+        self.app_pool = ThreadPoolExecutor(max_workers=app_threads, thread_name_prefix='asgi-app')
+        self.io_pool = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix='asgi-io')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        """Acknowledge server startup and shutdown."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.app_pool.shutdown(wait=False)
+                self.io_pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        """Run the WSGI app on the app pool while its body arrives, and stream the response."""
+        loop = asyncio.get_running_loop()
+
+        # Reject oversized uploads from the Content-Length header before reading them
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        declared_length = headers.get('content-length', '')
+        if self.max_body_size and declared_length.isdigit() and int(declared_length) > self.max_body_size:
+            logger.warning(f"Rejecting {declared_length} byte request body for {scope['path']}")
+            await self._send_simple(send, 413, b'Request body too large')
+            return
+
+        body = RequestBody(loop, self.body_buffer_size)
+        environ = self._build_environ(scope, headers, body)
+        # Tell the app when the client goes away so it can cancel its work
+        disconnected = threading.Event()
+        environ['asgi_bridge.disconnected'] = disconnected
+        receiver = asyncio.ensure_future(self._receive(receive, body, disconnected, scope['path']))
+        try:
+            await self._respond(loop, send, environ, disconnected)
+        finally:
+            receiver.cancel()
+            body.close()
+
+    async def _receive(self, receive, body, disconnected, path):
+        """Feed the request body to the app, then set the disconnected event when the client goes away."""
+        size = 0
+        more_body = True
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                body.fail(ClientDisconnected())
+                return
+            if not more_body:
+                continue
+            chunk = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            size += len(chunk)
+            if self.max_body_size and size > self.max_body_size:
+                logger.warning(f"Rejecting request body over {self.max_body_size} bytes for {path}")
+                body.fail(RequestEntityTooLarge())
+                # Keep receiving (and dropping) the body so a disconnect is still noticed
+                body.drop()
+                continue
+            if chunk:
+                await body.feed(chunk)
+            if not more_body:
+                body.finish()
+
+    async def _respond(self, loop, send, environ, disconnected):
+        """Run the WSGI app on the app pool and stream its response."""
+        # The app, every chunk and close() run in one context, so context variables the app
+        # sets (e.g. Flask's request context kept by stream_with_context) are there throughout
+        context = contextvars.copy_context()
+        running = self.app_pool.submit(context.run, self._run_app, environ)
+        try:
+            status, response_headers, first_chunk, iterator, result = await asyncio.wrap_future(running)
+        except asyncio.CancelledError:
+            # The app keeps running in its thread; close its response once it has one
+            running.add_done_callback(lambda future: self._close_abandoned(future, context))
+            raise
+        # Body data the app didn't read is dropped from here on
+        environ['wsgi.input'].close()
+
+        pending = None
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response_headers]
+            })
+            chunk = first_chunk
+            while chunk is not None and not disconnected.is_set():
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                # File reads happen on the I/O pool; waiting on a slow client happens here
+                pending = self.io_pool.submit(context.run, next, iterator, None)
+                chunk = await asyncio.wrap_future(pending)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if pending is not None and not pending.done():
+                # Cancelled while next() is still running in the context, which close() can't enter until it leaves
+                await asyncio.wait([asyncio.wrap_future(pending)])
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.io_pool, context.run, result.close)
+
+    @staticmethod
+    def _close_abandoned(future, context):
+        """Close the response of an app call whose request was cancelled (app pool thread)."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()[4]
+        if hasattr(result, 'close'):
+            try:
+                context.run(result.close)
+            except Exception:
+                logger.exception("Error closing an abandoned response")
+
+    def _build_environ(self, scope, headers, body):
+        """Build the WSGI environ for an ASGI HTTP scope."""
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            # The body ends where the client's does, so it can be read without a Content-Length
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileWrapper,
+        }
+        for name, value in headers.items():
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'content-length':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                environ[f"HTTP_{name.upper().replace('-', '_')}"] = value
+        return environ
+
+    def _run_app(self, environ):
+        """
+        Call the WSGI app and produce the first chunk of the response (app pool thread).
+
+        Returns:
+            tuple: (status code, headers, first chunk or None, iterator, result)
+        """
+        response = {}
+        written = []
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = response_headers
+            return written.append
+
+        result = self.wsgi_app(environ, start_response)
+        iterator = iter(result)
+        # Generators only call start_response once iterated
+        first_chunk = next(iterator, None)
+        if written:
+            first_chunk = b''.join(written) + (first_chunk or b'')
+        return response['status'], response['headers'], first_chunk, iterator, result
+
+    @staticmethod
+    async def _send_simple(send, status, text):
+        """Send a short plain-text response."""
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'), (b'content-length', str(len(text)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': text})
@@ -0,0 +1,165 @@
+"""
+Bundle module for streaming a report together with its source data as a ZIP.
+
+A bundle holds the PDF, a CSV of the properties put in the report and the
+original photos of those properties. The ZIP is generated entry by entry
+into a small buffer that is handed to the response after every chunk, so
+nothing is staged in a temp file and memory stays flat however large the
+bundle is. Photos are copied from the workbook's xl/media parts as they are,
+without decoding, and stored uncompressed as they are already compressed.
+"""
+
+import os
+import codecs
+import zipfile
+import logging
+from datetime import datetime
+import pandas as pd
+from werkzeug.utils import secure_filename
+from utils.data_processor import IMAGE_FILE_COLUMN, PRICE_PER_SQM_RAW_COLUMN
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read from the PDF and photos
+CHUNK_SIZE = 64 * 1024
+
+# Rows converted to CSV at a time
+CSV_CHUNK_ROWS = 500
+
+# Header occupies row 1, so DataFrame position 0 is worksheet row 2
+FIRST_DATA_ROW = 2
+
+# Column added to the CSV naming each row's photo in the bundle
+PHOTO_COLUMN = 'Photo'
+
+class _ChunkSink:
+    """Write-only file object that keeps what ZipFile writes until the response takes it."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Take everything written since the last drain."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _entry(name, size=0, compress_type=zipfile.ZIP_STORED):
+    """Build a ZIP entry; a known size lets ZipFile decide up front whether it needs ZIP64."""
+    info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+    info.compress_type = compress_type
+    info.file_size = size
+    info.external_attr = 0o644 << 16
+    return info
+
+def get_selected_rows(df):
+    """
+    Get the rows put in the report, as they appear in the worksheet.
+
+    Internal columns are dropped and '$/m²' values that could not be parsed
+    get their original text back.
+
+    Args:
+        df (pandas.DataFrame): Normalized property table
+
+    Returns:
+        pandas.DataFrame: Rows with 'PUT IN REPORT (T/F)' set to 'T'
+    """
+    if 'PUT IN REPORT (T/F)' not in df.columns:
+        return df.iloc[0:0]
+    selected = df[df['PUT IN REPORT (T/F)'] == 'T']
+    if PRICE_PER_SQM_RAW_COLUMN in selected.columns and '$/m²' in selected.columns:
+        selected = selected.assign(**{'$/m²': selected['$/m²'].astype(object).where(
+            selected[PRICE_PER_SQM_RAW_COLUMN].isna(), selected[PRICE_PER_SQM_RAW_COLUMN])})
+    return selected
+
+def get_photo_names(df, selected, workbook_path):
+    """
+    Name the bundle entry of each selected row's photo.
+
+    Photos are named by worksheet row and street address, e.g.
+    'photos/row5_12_Main_St.jpeg', so they can be matched to the CSV.
+
+    Args:
+        df (pandas.DataFrame): Normalized property table
+        selected (pandas.DataFrame): Rows put in the report
+        workbook_path (str): Path of the uploaded workbook
+
+    Returns:
+        dict: Row index to (xl/media filename, bundle path), for rows with a photo
+    """
+    if IMAGE_FILE_COLUMN not in selected.columns or not zipfile.is_zipfile(workbook_path):
+        return {}
+
+    rows = df.index.get_indexer(selected.index) + FIRST_DATA_ROW
+    addresses = selected['Street Address'] if 'Street Address' in selected.columns else pd.Series(None, index=selected.index)
+    photos = {}
+    for row, (idx, image_file), address in zip(rows, selected[IMAGE_FILE_COLUMN].items(), addresses):
+        if pd.isna(image_file):
+            continue
+        stem = f"row{row}"
+        if pd.notna(address) and secure_filename(str(address)):
+            stem = f"{stem}_{secure_filename(str(address))}"
+        photos[idx] = (image_file, f"photos/{stem}{os.path.splitext(image_file)[1].lower()}")
+    return photos
+
+def stream_bundle(pdf_path, df, workbook_path, report_name):
+    """
+    Generate a report bundle ZIP chunk by chunk.
+
+    Args:
+        pdf_path (str): Path of the rendered report
+        df (pandas.DataFrame): Normalized property table
+        workbook_path (str): Path of the uploaded workbook
+        report_name (str): Name of the report without extension, used for the PDF and CSV entries
+
+    Yields:
+        bytes: The next part of the ZIP
+    """
+    selected = get_selected_rows(df)
+    photos = get_photo_names(df, selected, workbook_path)
+    columns = [col for col in selected.columns if not col.startswith('_')]
+    sink = _ChunkSink()
+
+    with zipfile.ZipFile(sink, 'w') as bundle:
+        # The report (PDF streams are already compressed)
+        with open(pdf_path, 'rb') as source, bundle.open(_entry(f"{report_name}.pdf", os.path.getsize(pdf_path)), 'w') as target:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                target.write(chunk)
+                yield sink.drain()
+
+        # The selected rows, with a BOM so Excel reads the '²' in '$/m²'
+        with bundle.open(_entry(f"{report_name}.csv", compress_type=zipfile.ZIP_DEFLATED), 'w') as target:
+            target.write(codecs.BOM_UTF8)
+            for start in range(0, max(len(selected), 1), CSV_CHUNK_ROWS):
+                part = selected.iloc[start:start + CSV_CHUNK_ROWS][columns]
+                if photos:
+                    part = part.assign(**{PHOTO_COLUMN: [photos.get(idx, (None, ''))[1] for idx in part.index]})
+                target.write(part.to_csv(index=False, header=start == 0).encode('utf-8'))
+                yield sink.drain()
+
+        # The original photos, copied from the workbook without decoding
+        if photos:
+            with zipfile.ZipFile(workbook_path) as workbook:
+                for image_file, name in photos.values():
+                    try:
+                        part_info = workbook.getinfo(f"xl/media/{image_file}")
+                    except KeyError:
+                        logger.warning(f"Photo {image_file} is missing from the workbook")
+                        continue
+                    with workbook.open(part_info) as source, bundle.open(_entry(name, part_info.file_size), 'w') as target:
+                        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                            target.write(chunk)
+                            yield sink.drain()
+
+    # The central directory is written when the archive closes
+    yield sink.drain()
+    logger.debug(f"Streamed bundle {report_name}: {len(selected)} rows, {len(photos)} photos")
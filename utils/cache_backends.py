@@ -0,0 +1,418 @@
+"""
+Cache backend module for sharing cached results between processes and replicas.
+
+The report store, table cache and thumbnail cache keep their entries on
+local disk. A cache backend sits behind them as a second level: entries are
+published to it when they are created and fetched from it on a local miss,
+so a replica that has never seen a workbook can reuse a table, thumbnail or
+rendered report produced elsewhere. Keys are derived from content digests
+and render parameters, so they stay valid across restarts and routing.
+
+CACHE_BACKEND selects the implementation:
+- 'none' (the default) turns the second level off;
+- 'memory' keeps an LRU in each worker process, limited by MEMORY_CACHE_MAX_MB;
+- 'filesystem' uses a directory, which may be a mount shared by replicas;
+- 'sqlite' uses a SQLite database shared by the processes and containers on one host.
+
+Uploads and fingerprinted static assets stay on local disk only. Static
+assets are built from the files shipped with the app when it starts, so
+every replica already has identical copies. Uploads are raw inputs as large
+as MAX_CONTENT_LENGTH; publishing each one would evict the derived entries
+that are worth sharing, and a replica asked for an upload digest it doesn't
+have answers 410 so the page sends the file again.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Backend selection, location and size limit
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'none').lower()
+CACHE_PATH = os.environ.get('CACHE_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'shared'))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_MB', 1024)) * 1024 * 1024
+
+# Size limit of the memory backend, which every worker process holds its own copy of
+MEMORY_CACHE_MAX_BYTES = int(os.environ.get('MEMORY_CACHE_MAX_MB', 128)) * 1024 * 1024
+
+# Minimum seconds between size checks of a filesystem backend (they scan the directory)
+EVICT_INTERVAL_SECONDS = 60
+
+def make_key(namespace, *parts):
+    """
+    Build a cache key from a namespace and the values that identify an entry.
+
+    Args:
+        namespace (str): Kind of entry, e.g. 'report' or 'table'
+        *parts: Values the entry depends on (None is allowed)
+
+    Returns:
+        str: Key of the form '<namespace>:<sha256>'
+    """
+    sha256 = hashlib.sha256()
+    for part in parts:
+        sha256.update(str(part).encode('utf-8'))
+        sha256.update(b'\0')
+    return f"{namespace}:{sha256.hexdigest()}"
+
+class CacheBackend(ABC):
+    """
+    Interface of a byte-valued cache.
+    """
+
+    name = 'base'
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def get(self, key):
+        """
+        Get an entry.
+
+        Args:
+            key (str): Entry key
+
+        Returns:
+            bytes or None: The value, or None on a miss
+        """
+
+    @abstractmethod
+    def set(self, key, value):
+        """
+        Store an entry, evicting least recently used entries if the cache is full.
+
+        Args:
+            key (str): Entry key
+            value (bytes): Value to store
+        """
+
+    @abstractmethod
+    def delete(self, key):
+        """
+        Remove an entry if present.
+
+        Args:
+            key (str): Entry key
+        """
+
+    def _count(self, value):
+        """Record a hit or miss and pass the value through."""
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self):
+        """
+        Get counters for /status.
+
+        Returns:
+            dict: Backend name, hits and misses
+        """
+        return {'backend': self.name, 'hits': self.hits, 'misses': self.misses}
+
+class MemoryBackend(CacheBackend):
+    """
+    Least recently used cache held in this process.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_bytes=MEMORY_CACHE_MAX_BYTES):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes (int): Size limit in bytes
+        """
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return self._count(value)
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(entries=len(self._entries), mb=round(self._size / (1024 * 1024), 1))
+        return stats
+
+class FilesystemBackend(CacheBackend):
+    """
+    Cache stored as files in a directory, which replicas may share via a mount.
+    """
+
+    name = 'filesystem'
+
+    def __init__(self, root=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        """
+        Initialize the cache directory.
+
+        Args:
+            root (str): Cache directory
+            max_bytes (int): Size limit in bytes
+        """
+        super().__init__()
+        self.root = root
+        self.max_bytes = max_bytes
+        self._last_evicted = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        # Fan out by the first two hex digits so no directory gets too large
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+        except OSError:
+            return self._count(None)
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        return self._count(value)
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique temp name, as several hosts may write the same key at once
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(value)
+        os.replace(temp_path, path)
+
+        if time.monotonic() - self._last_evicted > EVICT_INTERVAL_SECONDS:
+            self._last_evicted = time.monotonic()
+            self.evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until the directory fits its size limit."""
+        entries = []
+        for root, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                pass
+
+class SqliteBackend(CacheBackend):
+    """
+    Cache stored in a SQLite database that several processes can open at once.
+
+    SQLite relies on file locking, so the database should be on a local or
+    container-shared volume rather than a network share; use the filesystem
+    backend for directories mounted by several hosts.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=None, max_bytes=CACHE_MAX_BYTES):
+        """
+        Open the database, creating the table if needed.
+
+        Args:
+            path (str, optional): Database file (defaults to cache.sqlite3 in CACHE_PATH)
+            max_bytes (int): Size limit in bytes
+        """
+        super().__init__()
+        self.path = path or os.path.join(CACHE_PATH, 'cache.sqlite3')
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _connect(self):
+        """Get this thread's connection (connections can't be shared between threads)."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        connection = self._connect()
+        with connection:
+            row = connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return self._count(row[0] if row else None)
+
+    def set(self, key, value):
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), time.time())
+            )
+            total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total_bytes > self.max_bytes:
+                # Delete the least recently used entries covering the excess
+                connection.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM ("
+                    "SELECT key, SUM(size) OVER (ORDER BY accessed ROWS UNBOUNDED PRECEDING) - size AS before "
+                    "FROM entries) WHERE before < ?)",
+                    (total_bytes - self.max_bytes,)
+                )
+
+    def delete(self, key):
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def stats(self):
+        stats = super().stats()
+        with self._connect() as connection:
+            entries, total_bytes = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        stats.update(entries=entries, mb=round(total_bytes / (1024 * 1024), 1))
+        return stats
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'filesystem': FilesystemBackend,
+    'sqlite': SqliteBackend
+}
+
+# Backend shared by every cache in the process
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_cache_backend():
+    """
+    Get the configured cache backend, creating it on first use.
+
+    Returns:
+        CacheBackend or None: The backend, or None when CACHE_BACKEND is 'none'
+    """
+    global _backend
+    if _backend is None and CACHE_BACKEND != 'none':
+        with _backend_lock:
+            if _backend is None:
+                if CACHE_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+                _backend = BACKENDS[CACHE_BACKEND]()
+                logger.info(f"Using {CACHE_BACKEND} cache backend")
+    return _backend
+
+def publish_file(key, path):
+    """
+    Copy a locally cached file to the backend, if one is configured.
+
+    Failures are logged and ignored; the local copy is still usable.
+
+    Args:
+        key (str): Entry key
+        path (str): Local file
+    """
+    backend = get_cache_backend()
+    if backend is None:
+        return
+    try:
+        with open(path, 'rb') as f:
+            backend.set(key, f.read())
+    except Exception as e:
+        logger.warning(f"Could not publish {key} to the cache backend: {str(e)}")
+
+def fetch_file(key, path):
+    """
+    Copy an entry from the backend to a local file, if one is configured.
+
+    Args:
+        key (str): Entry key
+        path (str): Local file to create
+
+    Returns:
+        bool: True if the entry was found and written to path
+    """
+    backend = get_cache_backend()
+    if backend is None:
+        return False
+    try:
+        value = backend.get(key)
+        if value is None:
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(value)
+        os.replace(temp_path, path)
+        logger.debug(f"Fetched {key} from the cache backend")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not fetch {key} from the cache backend: {str(e)}")
+        return False
+
+def get_cache_stats():
+    """
+    Get the backend's counters for /status.
+
+    Returns:
+        dict: Backend stats, or {'backend': 'none'}
+    """
+    backend = get_cache_backend()
+    return backend.stats() if backend is not None else {'backend': 'none'}
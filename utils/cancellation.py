@@ -0,0 +1,224 @@
+"""
+Cancellation module for stopping report jobs whose client has gone away.
+
+Each report job gets a CancelToken. The pipeline calls check_cancelled()
+between stages (and between images, properties and page batches), which
+raises JobCancelled once the token is cancelled, so the job unwinds and
+releases its admission slot, files and memory instead of rendering a PDF
+nobody will download.
+
+A token is cancelled when:
+- the serving layer reports that the client disconnected;
+- a probe of the client's socket finds it closed;
+- /cancel is called with the job's ID.
+
+/cancel may reach a different worker than the one running the job, so it
+also leaves a marker file that every worker's tokens look for.
+"""
+
+import os
+import ssl
+import time
+import socket
+import logging
+import threading
+import contextvars
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Marker files for jobs cancelled through another process
+CANCEL_DIR = os.environ.get('CANCEL_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'cancel'))
+
+# Minimum seconds between probes of the client connection and marker file
+PROBE_INTERVAL_SECONDS = 0.5
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a cancelled job.
+
+    Like asyncio.CancelledError it derives from BaseException, so the
+    pipeline's 'except Exception' handlers don't swallow it.
+    """
+
+def _marker_path(job_id):
+    """Get the marker file path for a job ID (None for IDs unsafe as filenames)."""
+    if not job_id or not all(char.isalnum() or char in '-_' for char in job_id):
+        return None
+    return os.path.join(CANCEL_DIR, job_id)
+
+def client_socket_closed(sock):
+    """
+    Check without blocking whether the peer has closed a client socket.
+
+    TLS sockets can't be peeked (the bytes are encrypted records and
+    SSLSocket rejects recv flags), so they always count as open and their
+    jobs rely on /cancel instead.
+
+    Args:
+        sock (socket.socket): The client connection
+
+    Returns:
+        bool: True if the connection was closed or reset
+    """
+    if isinstance(sock, ssl.SSLSocket):
+        return False
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except (BlockingIOError, InterruptedError):
+        return False  # Open, nothing to read
+    except ValueError:
+        return False  # Socket type that doesn't take recv flags
+    except OSError:
+        return True
+
+class CancelToken:
+    """
+    Cancellation flag for one job.
+    """
+
+    def __init__(self, job_id, disconnected=None, client_socket=None):
+        """
+        Initialize an uncancelled token.
+
+        Args:
+            job_id (str): The job's ID, used by /cancel
+            disconnected (threading.Event, optional): Set by the server when the client disconnects
+            client_socket (socket.socket, optional): Client connection to probe for a disconnect
+        """
+        self.job_id = job_id
+        self.reason = None
+        self._event = threading.Event()
+        self._disconnected = disconnected
+        self._client_socket = client_socket
+        self.marker_path = _marker_path(job_id)
+        self._last_probe = 0.0
+
+    def cancel(self, reason):
+        """
+        Cancel the job.
+
+        Args:
+            reason (str): Why, for the log
+        """
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+            logger.info(f"Job {self.job_id} cancelled: {reason}")
+
+    def is_cancelled(self):
+        """
+        Check whether the job was cancelled, probing its client at most every PROBE_INTERVAL_SECONDS.
+
+        Returns:
+            bool: True once the job has been cancelled
+        """
+        if self._event.is_set():
+            return True
+        if self._disconnected is not None and self._disconnected.is_set():
+            self.cancel('client disconnected')
+            return True
+
+        now = time.monotonic()
+        if now - self._last_probe >= PROBE_INTERVAL_SECONDS:
+            self._last_probe = now
+            if self._client_socket is not None and client_socket_closed(self._client_socket):
+                self.cancel('client disconnected')
+            elif self.marker_path is not None and os.path.exists(self.marker_path):
+                self.cancel('cancel requested')
+        return self._event.is_set()
+
+    def check(self):
+        """
+        Raise JobCancelled if the job was cancelled.
+
+        Raises:
+            JobCancelled: If the job was cancelled
+        """
+        if self.is_cancelled():
+            raise JobCancelled(self.reason)
+
+# Tokens of jobs running in this process, by job ID
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+# Token of the job running in the current context
+_current_token = contextvars.ContextVar('cancel_token', default=None)
+
+def start_job(job_id, disconnected=None, client_socket=None):
+    """
+    Create and bind the cancel token for a job.
+
+    Args:
+        job_id (str): The job's ID
+        disconnected (threading.Event, optional): Set by the server on client disconnect
+        client_socket (socket.socket, optional): Client connection to probe
+
+    Returns:
+        tuple: (token, context token for end_job)
+    """
+    token = CancelToken(job_id, disconnected, client_socket)
+    with _tokens_lock:
+        _tokens[job_id] = token
+    return token, _current_token.set(token)
+
+def end_job(token, context_token):
+    """
+    Unbind a job's cancel token and remove any cancel marker.
+
+    Args:
+        token (CancelToken): Token from start_job
+        context_token: Context token from start_job
+    """
+    _current_token.reset(context_token)
+    with _tokens_lock:
+        if _tokens.get(token.job_id) is token:
+            del _tokens[token.job_id]
+    if token.marker_path is not None and os.path.exists(token.marker_path):
+        try:
+            os.remove(token.marker_path)
+        except OSError:
+            pass
+
+def get_cancel_token():
+    """
+    Get the current job's cancel token.
+
+    Returns:
+        CancelToken or None: The token, or None outside a job
+    """
+    return _current_token.get()
+
+def check_cancelled():
+    """
+    Raise JobCancelled if the current job was cancelled (no-op outside a job).
+
+    Raises:
+        JobCancelled: If the current job was cancelled
+    """
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+def cancel_job(job_id):
+    """
+    Cancel a job in this process, or leave a marker for the process running it.
+
+    Args:
+        job_id (str): The job's ID
+
+    Returns:
+        bool: True if the job was running in this process
+    """
+    with _tokens_lock:
+        token = _tokens.get(job_id)
+    if token is not None:
+        token.cancel('cancel requested')
+        return True
+
+    marker_path = _marker_path(job_id)
+    if marker_path is not None:
+        os.makedirs(CANCEL_DIR, exist_ok=True)
+        with open(marker_path, 'w'):
+            pass
+    return False
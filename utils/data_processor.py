@@ -8,14 +8,28 @@ import os
 import logging
 import pandas as pd
 import numpy as np
-import base64
-import tempfile
+import re
+import hashlib
 import zipfile
-import shutil
+from utils.property_record import PropertyRecord
+from utils.memory_stats import start_stage, get_image_bytes
+from utils.cancellation import check_cancelled
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+# URL prefix for extracted images; the PDF renderer serves these from memory
+IMAGE_URL_PREFIX = 'asset://image/'
+
+# Image formats extracted from the workbook's xl/media folder
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+# Column added by normalize_property_table holding each row's xl/media image filename
+IMAGE_FILE_COLUMN = '_image_file'
+
+# Column added by normalize_property_table keeping '$/m²' values that could not be parsed
+PRICE_PER_SQM_RAW_COLUMN = '_price_per_sqm_raw'
+
 def validate_headers(file_path, sheet_name=None):
     """
     Validate that headers are in the correct columns as specified.
@@ -90,90 +104,133 @@ def validate_headers(file_path, sheet_name=None):
                     'error': f"Column '{col_letter}' contains '{actual_header}' but should contain '{expected_header}'"
                 }
         
-        logger.info("Header validation passed successfully")
+        logger.debug("Header validation passed successfully")
         return {'valid': True, 'error': None}
         
     except Exception as e:
         logger.error(f"Error validating headers: {str(e)}")
         return {'valid': False, 'error': f"Error reading file: {str(e)}"}
 
-def extract_excel_images(excel_path):
+def list_excel_images(excel_path):
+    """
+    List the images in an Excel file's xl/media folder.
+    
+    Excel names media parts image1, image2, ... in insertion order, so the
+    names are sorted numerically rather than alphabetically.
+    
+    Args:
+        excel_path (str): Path to the Excel file
+        
+    Returns:
+        list: Image filenames in insertion order
+    """
+    with zipfile.ZipFile(excel_path, 'r') as zip_ref:
+        image_files = [
+            name[len('xl/media/'):] for name in zip_ref.namelist()
+            if name.startswith('xl/media/') and name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+    return sorted(image_files, key=lambda name: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)])
+
+def extract_excel_images(excel_path, filenames=None):
     """
     Extract images from Excel by treating the file as a ZIP archive.
     
+    Images are read straight from the archive and content-hashed so that
+    identical photos share one URL and one in-memory copy, which WeasyPrint
+    then embeds as a single image object.
+    
     Args:
         excel_path (str): Path to the Excel file
+        filenames (iterable, optional): Only extract these xl/media filenames
         
     Returns:
-        dict: Dictionary of extracted images as base64 data URLs
+        dict: Dictionary of extracted images with their shared URL and image bytes
     """
     if not os.path.exists(excel_path):
         logger.error(f"Excel file not found: {excel_path}")
         return {}
     
     image_dict = {}
-    temp_dir = tempfile.mkdtemp()
+    unique_images = {}  # Content digest -> shared image resource
+    duplicate_count = 0
+    duplicate_bytes = 0
     
     try:
-        logger.info(f"Extracting Excel file as ZIP: {excel_path}")
+        logger.debug(f"Extracting images from Excel file as ZIP: {excel_path}")
         
-        # Copy Excel file to temp folder and rename to zip
-        temp_excel = os.path.join(temp_dir, "temp.xlsx")
-        temp_zip = os.path.join(temp_dir, "temp.zip")
-        shutil.copy2(excel_path, temp_excel)
-        shutil.move(temp_excel, temp_zip)
+        image_files = list_excel_images(excel_path)
+        if not image_files:
+            logger.warning("No media folder found in Excel file. No images to extract.")
+            return {}
         
-        # Extract the ZIP contents
-        extract_folder = os.path.join(temp_dir, "extracted")
-        os.makedirs(extract_folder, exist_ok=True)
+        logger.debug(f"Found {len(image_files)} images in Excel file")
+        wanted = set(filenames) if filenames is not None else None
         
-        with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
-            zip_ref.extractall(extract_folder)
-            
-        # Look for images in xl/media folder
-        media_folder = os.path.join(extract_folder, "xl", "media")
-        if os.path.exists(media_folder):
-            image_files = [f for f in os.listdir(media_folder) 
-                          if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
-            
-            logger.info(f"Found {len(image_files)} images in Excel file")
-            
-            # Convert each image to a data URL
+        with zipfile.ZipFile(excel_path, 'r') as zip_ref:
+            # Hash each image and collapse duplicates onto one shared resource
             for i, img_file in enumerate(image_files):
-                img_path = os.path.join(media_folder, img_file)
+                if wanted is not None and img_file not in wanted:
+                    continue
+                check_cancelled()
                 try:
-                    with open(img_path, 'rb') as f:
-                        img_data = f.read()
+                    img_data = zip_ref.read(f"xl/media/{img_file}")
                         
                     img_format = img_file.split('.')[-1].lower()
                     if img_format == 'jpg':
                         img_format = 'jpeg'
-                        
-                    b64_data = base64.b64encode(img_data).decode('utf-8')
-                    data_url = f"data:image/{img_format};base64,{b64_data}"
+                    
+                    digest = hashlib.sha256(img_data).hexdigest()
+                    if digest in unique_images:
+                        duplicate_count += 1
+                        duplicate_bytes += len(img_data)
+                    else:
+                        unique_images[digest] = {
+                            'url': f"{IMAGE_URL_PREFIX}{digest}",
+                            'image': {'string': img_data, 'mime_type': f"image/{img_format}"}
+                        }
+                    shared = unique_images[digest]
                     
                     # Store with index (will need to be mapped to the correct property later)
                     image_dict[i+1] = {
-                        'data_url': data_url,
+                        'url': shared['url'],
+                        'image': shared['image'],
+                        'digest': digest,
                         'filename': img_file
                     }
                     
-                    logger.info(f"Processed image {i+1}: {img_file} ({len(img_data)} bytes)")
+                    logger.debug(f"Processed image {i+1}: {img_file} ({len(img_data)} bytes)")
                 except Exception as e:
                     logger.error(f"Error processing image {img_file}: {str(e)}")
-        else:
-            logger.warning("No media folder found in Excel file. No images to extract.")
+        
+        logger.info(f"Image dedup: {len(unique_images)} unique of {len(image_dict)} images, "
+                    f"{duplicate_count} duplicates collapsed saving {duplicate_bytes} bytes")
     
     except Exception as e:
         logger.error(f"Error extracting images from Excel: {str(e)}")
     
-    finally:
-        # Clean up temp directory
-        shutil.rmtree(temp_dir)
-    
     return image_dict
 
-def map_images_to_properties(df, images):
+def get_workbook_image_bytes(excel_path):
+    """
+    Get the total size of the image files in an Excel file.
+    
+    This is each xl/media file's uncompressed size in the ZIP, i.e. the
+    encoded PNG/JPEG bytes before decoding, not the (barely smaller) size
+    after ZIP deflate. Only the ZIP directory is read, so this is cheap
+    enough to run before deciding whether to accept a render.
+    
+    Args:
+        excel_path (str): Path to the Excel file
+        
+    Returns:
+        int: Total image file size in bytes (0 for CSV or unreadable files)
+    """
+    if not zipfile.is_zipfile(excel_path):
+        return 0
+    with zipfile.ZipFile(excel_path, 'r') as zip_ref:
+        return sum(info.file_size for info in zip_ref.infolist() if info.filename.startswith('xl/media/'))
+
+def map_images_to_properties(df, images, field='url'):
     """
     Map extracted images to properties.
     This is a simple approach that assumes images appear in the same order as properties.
@@ -181,9 +238,10 @@ def map_images_to_properties(df, images):
     Args:
         df (pandas.DataFrame): The property DataFrame
         images (dict): Dictionary of extracted images
+        field (str): Image attribute to map to ('url' or 'filename')
         
     Returns:
-        dict: DataFrame index to image data URL mapping
+        dict: DataFrame index to image URL (or filename) mapping
     """
     if not images:
         return {}
@@ -191,7 +249,7 @@ def map_images_to_properties(df, images):
     # Get properties that should be included in the report
     properties_for_report = df[df['PUT IN REPORT (T/F)'] == 'T'].copy()
     
-    # Create mapping of DataFrame index to image data URL
+    # Create mapping of DataFrame index to image URL
     image_mapping = {}
     
     # Get properties by type for consistent ordering
@@ -204,20 +262,83 @@ def map_images_to_properties(df, images):
     # Map images to For Lease properties
     for idx in for_lease.index:
         if image_counter <= len(images):
-            image_mapping[idx] = images[image_counter]['data_url']
-            logger.info(f"Mapped image {image_counter} to property at index {idx}")
+            image_mapping[idx] = images[image_counter][field]
+            logger.debug(f"Mapped image {image_counter} to property at index {idx}")
             image_counter += 1
     
     # Map images to For Sale properties
     for idx in for_sale.index:
         if image_counter <= len(images):
-            image_mapping[idx] = images[image_counter]['data_url']
-            logger.info(f"Mapped image {image_counter} to property at index {idx}")
+            image_mapping[idx] = images[image_counter][field]
+            logger.debug(f"Mapped image {image_counter} to property at index {idx}")
             image_counter += 1
     
-    logger.info(f"Mapped {image_counter-1} images to properties")
+    logger.debug(f"Mapped {image_counter-1} images to properties")
     return image_mapping
 
+def parse_price_per_sqm(values):
+    """
+    Parse '$/m²' values such as '$1,250' into numbers.
+    
+    Args:
+        values (pandas.Series): Raw column values
+        
+    Returns:
+        pandas.Series: Float values, NaN where the value is not numeric
+    """
+    temp_series = pd.Series(values).astype(str)
+    temp_series = temp_series.str.replace('$', '', regex=False)
+    temp_series = temp_series.str.replace(',', '', regex=False)
+    return pd.to_numeric(temp_series, errors='coerce')
+
+def normalize_property_table(df, excel_file_path=None):
+    """
+    Build the normalized, strongly typed table used for caching.
+    
+    Parses '$/m²' to numbers (keeping unparseable text in
+    PRICE_PER_SQM_RAW_COLUMN), stores 'Type' and 'PUT IN REPORT (T/F)' as
+    categoricals, turns mixed-type text columns into plain strings and
+    resolves each row's image reference into IMAGE_FILE_COLUMN, so that the
+    table can be written to a columnar file and processed later without the
+    original workbook being parsed again.
+    
+    Args:
+        df (pandas.DataFrame): The dataframe as read from the Excel/CSV file
+        excel_file_path (str, optional): Path to the Excel file for image references
+        
+    Returns:
+        pandas.DataFrame: The normalized dataframe
+    """
+    normalized = df.copy()
+    normalized.columns = [str(col) for col in normalized.columns]
+    
+    if '$/m²' in normalized.columns:
+        raw_values = normalized['$/m²']
+        parsed_values = parse_price_per_sqm(raw_values)
+        # Keep the original text of non-blank values that are not numbers so they can be reported
+        unparsed = parsed_values.isna() & raw_values.notna() & (raw_values.astype(str).str.strip() != '')
+        normalized[PRICE_PER_SQM_RAW_COLUMN] = raw_values.where(unparsed).map(lambda value: str(value) if pd.notna(value) else None)
+        normalized['$/m²'] = parsed_values
+    for col in ('Type', 'PUT IN REPORT (T/F)'):
+        if col in normalized.columns:
+            normalized[col] = normalized[col].astype('category')
+    
+    # Mixed-type object columns (e.g. numbers and text) are stored as text, keeping blanks as nulls
+    for col in normalized.columns:
+        if normalized[col].dtype == object:
+            types = {type(value) for value in normalized[col].dropna()}
+            if len(types) > 1:
+                normalized[col] = normalized[col].map(lambda value: str(value) if pd.notna(value) else None)
+    
+    # Resolve which xl/media image belongs to each row
+    image_files = {}
+    if excel_file_path and zipfile.is_zipfile(excel_file_path):
+        listed = {i + 1: {'filename': name} for i, name in enumerate(list_excel_images(excel_file_path))}
+        image_files = map_images_to_properties(normalized, listed, field='filename')
+    normalized[IMAGE_FILE_COLUMN] = pd.Series(image_files, index=normalized.index, dtype=object)
+    
+    return normalized
+
 def process_excel_data(df, excel_file_path=None):
     """
     Process the Excel/CSV data and extract relevant information for the report.
@@ -229,19 +350,39 @@ def process_excel_data(df, excel_file_path=None):
     Returns:
         dict: A dictionary containing all processed data needed for the report
     """
-    logger.info("Starting data processing")
-    logger.info(f"DataFrame shape: {df.shape}")
-    logger.info(f"DataFrame columns: {list(df.columns)}")
+    meter = start_stage('process')
+    logger.debug("Starting data processing")
+    logger.debug(f"DataFrame shape: {df.shape}")
+    logger.debug(f"DataFrame columns: {list(df.columns)}")
     
     # Extract images using the ZIP method if Excel file path is provided
     image_dict = {}
-    if excel_file_path and os.path.exists(excel_file_path):
-        logger.info(f"Extracting images from Excel file: {excel_file_path}")
+    image_resources = {}
+    if excel_file_path and os.path.exists(excel_file_path) and IMAGE_FILE_COLUMN in df.columns:
+        # Normalized table: image references were resolved when it was built
+        image_files = df[IMAGE_FILE_COLUMN].dropna()
+        extracted_images = extract_excel_images(excel_file_path, filenames=set(image_files))
+        images_by_file = {entry['filename']: entry for entry in extracted_images.values()}
+        for idx, img_file in image_files.items():
+            if img_file in images_by_file:
+                image_dict[idx] = images_by_file[img_file]['url']
+                image_resources[image_dict[idx]] = images_by_file[img_file]['image']
+        logger.debug(f"Loaded {len(image_dict)} referenced images for properties")
+    elif excel_file_path and os.path.exists(excel_file_path) and zipfile.is_zipfile(excel_file_path):
+        logger.debug(f"Extracting images from Excel file: {excel_file_path}")
         extracted_images = extract_excel_images(excel_file_path)
         if extracted_images:
             # Map images to properties
             image_dict = map_images_to_properties(df, extracted_images)
-            logger.info(f"Mapped {len(image_dict)} images to properties")
+            logger.debug(f"Mapped {len(image_dict)} images to properties")
+            
+            # Keep one copy of each image that is actually referenced
+            referenced_urls = set(image_dict.values())
+            image_resources = {
+                entry['url']: entry['image']
+                for entry in extracted_images.values()
+                if entry['url'] in referenced_urls
+            }
         else:
             logger.warning("No images were extracted from the Excel file")
     
@@ -263,11 +404,12 @@ def process_excel_data(df, excel_file_path=None):
         'for_lease_properties': [],
         'for_sale_properties': [],
         'statistics': {},
+        'images': image_resources,  # Image URL -> shared image bytes
     }
     
     # Process statistics for the map page
     try:
-        logger.info("Processing statistics for the map page")
+        logger.debug("Processing statistics for the map page")
         
         # Count properties by type
         for_lease_count = len(df[df['Type'] == 'For Lease'])
@@ -275,7 +417,7 @@ def process_excel_data(df, excel_file_path=None):
         for_sale_count = len(df[df['Type'] == 'For Sale'])
         sold_count = len(df[df['Type'] == 'Sold'])
         
-        logger.info(f"Property counts - For Lease: {for_lease_count}, Already Leased: {already_leased_count}, "
+        logger.debug(f"Property counts - For Lease: {for_lease_count}, Already Leased: {already_leased_count}, "
                    f"For Sale: {for_sale_count}, Sold: {sold_count}")
         
         # Count properties that meet criteria (PUT IN REPORT = T) by type
@@ -284,7 +426,7 @@ def process_excel_data(df, excel_file_path=None):
         for_sale_criteria = len(df[(df['Type'] == 'For Sale') & (df['PUT IN REPORT (T/F)'] == 'T')])
         sold_criteria = len(df[(df['Type'] == 'Sold') & (df['PUT IN REPORT (T/F)'] == 'T')])
         
-        logger.info(f"Properties meeting criteria - For Lease: {for_lease_criteria}, Already Leased: {already_leased_criteria}, "
+        logger.debug(f"Properties meeting criteria - For Lease: {for_lease_criteria}, Already Leased: {already_leased_criteria}, "
                    f"For Sale: {for_sale_criteria}, Sold: {sold_criteria}")
         
         # Calculate average $/m² for each type that meets criteria
@@ -293,7 +435,7 @@ def process_excel_data(df, excel_file_path=None):
         for_sale_avg_price = calculate_average_price_per_sqm(df, 'For Sale', 'T')
         sold_avg_price = calculate_average_price_per_sqm(df, 'Sold', 'T')
         
-        logger.info(f"Average prices $/m² - For Lease: ${for_lease_avg_price}, Already Leased: ${already_leased_avg_price}, "
+        logger.debug(f"Average prices $/m² - For Lease: ${for_lease_avg_price}, Already Leased: ${already_leased_avg_price}, "
                    f"For Sale: ${for_sale_avg_price}, Sold: ${sold_avg_price}")
         
         # Store statistics in the result
@@ -320,43 +462,57 @@ def process_excel_data(df, excel_file_path=None):
             }
         }
         
-        logger.info("Statistics processed successfully")
+        logger.debug("Statistics processed successfully")
     except Exception as e:
         logger.error(f"Error processing statistics: {str(e)}", exc_info=True)
         raise
     
     # Extract 'For Lease' properties to include in the report
     try:
-        logger.info("Processing 'For Lease' properties")
+        logger.debug("Processing 'For Lease' properties")
         lease_properties = df[(df['Type'] == 'For Lease') & (df['PUT IN REPORT (T/F)'] == 'T')]
         
         for idx, property_row in lease_properties.iterrows():
+            check_cancelled()
             # Get image data for this property if available
             image_data = image_dict.get(idx)
             property_data = extract_property_data(property_row, 'For Lease', image_data)
             result['for_lease_properties'].append(property_data)
             
-        logger.info(f"Processed {len(result['for_lease_properties'])} 'For Lease' properties")
+        logger.debug(f"Processed {len(result['for_lease_properties'])} 'For Lease' properties")
     except Exception as e:
         logger.error(f"Error processing 'For Lease' properties: {str(e)}", exc_info=True)
         raise
     
     # Extract 'For Sale' properties to include in the report
     try:
-        logger.info("Processing 'For Sale' properties")
+        logger.debug("Processing 'For Sale' properties")
         sale_properties = df[(df['Type'] == 'For Sale') & (df['PUT IN REPORT (T/F)'] == 'T')]
         
         for idx, property_row in sale_properties.iterrows():
+            check_cancelled()
             # Get image data for this property if available
             image_data = image_dict.get(idx)
             property_data = extract_property_data(property_row, 'For Sale', image_data)
             result['for_sale_properties'].append(property_data)
             
-        logger.info(f"Processed {len(result['for_sale_properties'])} 'For Sale' properties")
+        logger.debug(f"Processed {len(result['for_sale_properties'])} 'For Sale' properties")
     except Exception as e:
         logger.error(f"Error processing 'For Sale' properties: {str(e)}", exc_info=True)
         raise
     
+    # One summary line for the whole stage
+    properties = result['for_lease_properties'] + result['for_sale_properties']
+    meter.finish(
+        logger,
+        rows=len(df),
+        for_lease=len(result['for_lease_properties']),
+        for_sale=len(result['for_sale_properties']),
+        missing_images=sum(1 for prop in properties if not prop.image),
+        unique_images=len(image_resources),
+        image_bytes=get_image_bytes(image_resources)
+    )
+    
     return result
 
 def calculate_average_price_per_sqm(df, property_type, put_in_report):
@@ -385,10 +541,7 @@ def calculate_average_price_per_sqm(df, property_type, put_in_report):
     if '$/m²' in filtered_df.columns:
         # Create a temporary series from the column to avoid FutureWarning
         # and perform operations on it instead of directly on the DataFrame
-        temp_series = pd.Series(filtered_df['$/m²']).astype(str)
-        temp_series = temp_series.str.replace('$', '', regex=False)
-        temp_series = temp_series.str.replace(',', '', regex=False)
-        numeric_values = pd.to_numeric(temp_series, errors='coerce')
+        numeric_values = parse_price_per_sqm(filtered_df['$/m²'])
         
         # Assign back to DataFrame
         filtered_df.loc[:, '$/m²'] = numeric_values
@@ -407,10 +560,10 @@ def extract_property_data(row, property_type, image_data=None):
     Args:
         row (pandas.Series): A row from the properties dataframe
         property_type (str): The type of property ('For Lease' or 'For Sale')
-        image_data (str, optional): Base64 image data if available
+        image_data (str, optional): Image URL if available
         
     Returns:
-        dict: A dictionary with the formatted property data
+        PropertyRecord: The formatted property data
     """
     logger.debug(f"Extracting property data for {property_type} - Suburb: {row['Suburb']}")
     
@@ -441,31 +594,22 @@ def extract_property_data(row, property_type, image_data=None):
     # Format car spaces
     car_spaces = str(row['Car']) if pd.notna(row['Car']) else "-"
     
-    # Extract property data with key names matching pdf_generator expectations
-    property_data = {
-        'suburb': str(row['Suburb']),  # Keep original for header
-        'suburb_formatted': suburb,    # Formatted for display
-        'street address': street_address,  # Note the space in the key name to match pdf_generator
-        'floor area': floor_area,      # Space in key name
-        'price': price,
-        'zoning': str(row['Site Zoning']) if pd.notna(row['Site Zoning']) else "Not Specified",
-        'property type': str(row['Property Type']) if pd.notna(row['Property Type']) else "Commercial",
-        'car spaces': car_spaces,      # Space in key name
-        'comments': str(row["Busi's Comment"]) if pd.notna(row["Busi's Comment"]) else "",
-        'image_data': image_data       # Base64 image data from Excel
-    }
-    
-    # Log detailed information about extracted property
-    logger.info(f"Extracted property data for {street_address}, {suburb}")
-    logger.info(f"Property Type: {property_type}, Price: {price}, Floor Area: {floor_area}")
-    logger.info(f"Image data present: {'Yes' if image_data else 'No'}")
-    
-    # Count of properties processed with images
-    if image_data:
-        logger.info(f"✅ Property {street_address} has image data")
-        logger.info(f"Image data URL starts with: {image_data[:50]}") # Log first 50 chars for brevity
-    else:
-        logger.info(f"❌ Property {street_address} is missing image data")
+    property_data = PropertyRecord(
+        suburb=str(row['Suburb']),  # Keep original for header
+        suburb_formatted=suburb,    # Formatted for display
+        street_address=street_address,
+        floor_area=floor_area,
+        price=price,
+        zoning=str(row['Site Zoning']) if pd.notna(row['Site Zoning']) else "Not Specified",
+        property_type=str(row['Property Type']) if pd.notna(row['Property Type']) else "Commercial",
+        car_spaces=car_spaces,
+        comments=str(row["Busi's Comment"]) if pd.notna(row["Busi's Comment"]) else "",
+        image=image_data            # Image URL from Excel (bytes live in result['images'])
+    )
+    
+    # Per-property detail is only logged at DEBUG (and rate-limited) to keep log volume O(1) per report
+    logger.debug(f"Extracted {property_type} property {street_address}, {suburb}: price={price}, "
+                 f"floor_area={floor_area}, image={'yes' if image_data else 'no'}")
     
     return property_data
 
@@ -0,0 +1,324 @@
+"""
+Janitor module for keeping the app's working directories within disk quotas.
+
+A background thread in each process sweeps the directories on an interval.
+A file lock makes sure only one process sweeps at a time. The sweep does
+three things:
+- deletes files in uploads/ and output/ that are past their age limit;
+- deletes the least recently used files there until each directory fits its
+  size quota;
+- runs the caches' own eviction.
+
+Files held by a job in this process are never deleted. Neither is any file
+modified within the grace period, which protects jobs in other processes:
+uploads are rewritten on every request and renders finish well inside it.
+Usage figures from the last sweep are shared through a JSON file for /status.
+"""
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import logging
+import threading
+from datetime import datetime
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# Sweep interval, and how recently modified a file must be to count as in use
+JANITOR_INTERVAL_SECONDS = float(os.environ.get('JANITOR_INTERVAL_SECONDS', 600))
+IN_USE_GRACE_SECONDS = float(os.environ.get('JANITOR_GRACE_SECONDS', 900))
+
+# Lock that elects the sweeping process, and the last sweep's report
+JANITOR_LOCK_PATH = os.path.join(BASE_DIR, 'cache', 'janitor.lock')
+JANITOR_STATE_PATH = os.path.join(BASE_DIR, 'cache', 'janitor.json')
+
+MB = 1024 * 1024
+
+# Placeholders that keep empty directories in the repository
+KEEP_FILES = {'.gitkeep'}
+
+def _quota(path, max_age_env, max_age_hours, max_mb_env, max_mb):
+    """Build a directory quota from environment overrides and defaults."""
+    return {
+        'path': path,
+        'max_age_seconds': float(os.environ.get(max_age_env, max_age_hours)) * 3600,
+        'max_bytes': int(os.environ.get(max_mb_env, max_mb)) * MB
+    }
+
+def _scan(path):
+    """
+    List the regular files directly in a directory.
+
+    Returns:
+        list: (mtime, size, path) for each file, oldest first
+    """
+    entries = []
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return entries
+    for name in names:
+        if name in KEEP_FILES:
+            continue
+        file_path = os.path.join(path, name)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        if os.path.isfile(file_path):
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+    return sorted(entries)
+
+def get_directory_usage(path):
+    """
+    Get the size of a directory tree.
+
+    Args:
+        path (str): Directory to measure
+
+    Returns:
+        dict: {'files': int, 'mb': float}
+    """
+    files = 0
+    total_bytes = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total_bytes += os.stat(os.path.join(root, name)).st_size
+                files += 1
+            except OSError:
+                pass
+    return {'files': files, 'mb': round(total_bytes / MB, 1)}
+
+class Janitor:
+    """
+    Periodic disk cleanup for uploads, outputs and caches.
+    """
+
+    def __init__(self, configure, interval=JANITOR_INTERVAL_SECONDS, grace_seconds=IN_USE_GRACE_SECONDS):
+        """
+        Initialize the janitor.
+
+        Args:
+            configure (callable): Returns (quotas, evictors, reported_dirs) and is
+                called on the first sweep, so the cache modules it needs are
+                imported in the background rather than at app startup:
+                quotas maps a name to {'path', 'max_age_seconds', 'max_bytes'}
+                for directories the janitor evicts from, evictors maps a name
+                to a callable that enforces a cache's own limits, and
+                reported_dirs maps a name to every directory reported in /status
+            interval (float): Seconds between sweeps
+            grace_seconds (float): Files modified more recently than this are never deleted
+        """
+        self.configure = configure
+        self.quotas = None
+        self.evictors = None
+        self.reported_dirs = None
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+
+        self._held = {}  # Absolute path -> number of jobs holding it
+        self._held_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def hold(self, path):
+        """
+        Protect a file from deletion while a job uses it.
+
+        Args:
+            path (str): File the job uses
+
+        Returns:
+            str: The path, so calls can be chained
+        """
+        with self._held_lock:
+            key = os.path.abspath(path)
+            self._held[key] = self._held.get(key, 0) + 1
+        return path
+
+    def release(self, path):
+        """
+        Release a file held with hold().
+
+        Args:
+            path (str): File the job used
+        """
+        with self._held_lock:
+            key = os.path.abspath(path)
+            count = self._held.get(key, 0) - 1
+            if count > 0:
+                self._held[key] = count
+            else:
+                self._held.pop(key, None)
+
+    def _is_held(self, path):
+        with self._held_lock:
+            return os.path.abspath(path) in self._held
+
+    def _enforce(self, quota, now):
+        """
+        Delete expired files, then least recently used ones until the directory fits its quota.
+
+        Returns:
+            dict: Files and MB evicted
+        """
+        evicted_files = 0
+        evicted_bytes = 0
+        entries = _scan(quota['path'])
+        total_bytes = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            expired = now - mtime > quota['max_age_seconds']
+            if not expired and total_bytes <= quota['max_bytes']:
+                continue
+            if now - mtime < self.grace_seconds or self._is_held(path):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            evicted_files += 1
+            evicted_bytes += size
+        if total_bytes > quota['max_bytes']:
+            logger.warning(f"{quota['path']} is over its {quota['max_bytes'] // MB} MB quota; remaining files are in use")
+        return {'evicted_files': evicted_files, 'evicted_mb': round(evicted_bytes / MB, 1)}
+
+    def sweep(self):
+        """
+        Run one sweep if no other process is sweeping.
+
+        Returns:
+            dict or None: The sweep report, or None if another process holds the lock
+        """
+        os.makedirs(os.path.dirname(JANITOR_LOCK_PATH), exist_ok=True)
+        with open(JANITOR_LOCK_PATH, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            # Another process may have just finished a sweep
+            try:
+                if time.time() - os.path.getmtime(JANITOR_STATE_PATH) < self.interval / 2:
+                    return None
+            except OSError:
+                pass
+
+            if self.quotas is None:
+                self.quotas, self.evictors, self.reported_dirs = self.configure()
+
+            started = time.monotonic()
+            now = time.time()
+            report = {'swept_at': datetime.now().isoformat(), 'directories': {}}
+            for name, quota in self.quotas.items():
+                report['directories'][name] = self._enforce(quota, now)
+            for name, evict in self.evictors.items():
+                try:
+                    evict()
+                except FileNotFoundError:
+                    pass  # Cache not created yet
+                except Exception as e:
+                    logger.error(f"Eviction failed for {name}: {str(e)}")
+
+            for name, path in self.reported_dirs.items():
+                usage = report['directories'].setdefault(name, {})
+                usage.update(get_directory_usage(path))
+                if name in self.quotas:
+                    usage['quota_mb'] = self.quotas[name]['max_bytes'] // MB
+                    usage['max_age_hours'] = round(self.quotas[name]['max_age_seconds'] / 3600, 1)
+            disk = shutil.disk_usage(BASE_DIR)
+            report['disk_free_mb'] = round(disk.free / MB)
+            report['seconds'] = round(time.monotonic() - started, 3)
+
+            temp_path = f"{JANITOR_STATE_PATH}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(report, f)
+            os.replace(temp_path, JANITOR_STATE_PATH)
+
+        evicted = sum(usage.get('evicted_files', 0) for usage in report['directories'].values())
+        logger.info(f"Janitor sweep evicted {evicted} files in {report['seconds']}s")
+        return report
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Janitor sweep failed: {str(e)}", exc_info=True)
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        """Start the background sweep thread (also called in forked children)."""
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='janitor', daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        """
+        Get the last sweep's report for /status.
+
+        Returns:
+            dict: Per-directory usage and evictions, free disk space and sweep time
+        """
+        try:
+            with open(JANITOR_STATE_PATH) as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            report = {'swept_at': None}
+        with self._held_lock:
+            report['held_files'] = len(self._held)
+        report['interval_seconds'] = self.interval
+        return report
+
+def create_janitor(upload_dir, output_dir):
+    """
+    Create the janitor for the app's directories.
+
+    Args:
+        upload_dir (str): Directory uploads are stored in
+        output_dir (str): Directory PDFs are rendered into
+
+    Returns:
+        Janitor: The janitor; call start() to begin sweeping
+    """
+    def configure():
+        from utils.table_cache import CACHE_DIR, evict_tables
+        from utils.preview import THUMBNAIL_DIR, evict_thumbnails
+        from utils.report_store import REPORT_DIR, evict_reports
+        from utils.profiling import PROFILE_DIR, prune_profiles
+        from utils.static_assets import ASSET_CACHE_DIR
+        from utils.cache_backends import CACHE_PATH
+        from utils.cancellation import CANCEL_DIR
+
+        quotas = {
+            'uploads': _quota(upload_dir, 'UPLOAD_MAX_AGE_HOURS', 24, 'UPLOAD_QUOTA_MB', 1024),
+            # Renders move their PDF into the report store at once, so anything left here failed
+            'output': _quota(output_dir, 'OUTPUT_MAX_AGE_HOURS', 1, 'OUTPUT_QUOTA_MB', 256),
+            # Markers for cancelled jobs that never ran in any process
+            'cancel': _quota(CANCEL_DIR, 'CANCEL_MARKER_MAX_AGE_HOURS', 1, 'CANCEL_MARKER_QUOTA_MB', 1)
+        }
+        evictors = {
+            'tables': evict_tables,
+            'thumbnails': evict_thumbnails,
+            'reports': evict_reports,
+            'profiles': prune_profiles
+        }
+        reported_dirs = {
+            'uploads': upload_dir,
+            'output': output_dir,
+            'tables': CACHE_DIR,
+            'thumbnails': THUMBNAIL_DIR,
+            'reports': REPORT_DIR,
+            'static': ASSET_CACHE_DIR,
+            'shared': CACHE_PATH,
+            'profiles': PROFILE_DIR
+        }
+        return quotas, evictors, reported_dirs
+
+    return Janitor(configure)
@@ -0,0 +1,177 @@
+"""
+Logging setup module for non-blocking, per-job application logging.
+
+Log records are put on an in-memory queue by the request threads and written
+to stdout by a single background listener, so a slow log stream never blocks
+report generation. Each record is tagged with the current job ID, repeated
+messages from the same line of code are rate-limited, and each stage of a
+report is summarised in a single structured line.
+"""
+
+import os
+import sys
+import time
+import queue
+import uuid
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from utils.profiling import record_stage
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(job_id)s] %(message)s'
+
+# Default rate limit: messages allowed per call site per window
+RATE_LIMIT_BURST = int(os.environ.get('LOG_RATE_LIMIT_BURST', 20))
+RATE_LIMIT_WINDOW = float(os.environ.get('LOG_RATE_LIMIT_WINDOW', 60))
+
+# ID of the job (report request) the current thread is working on
+_current_job_id = contextvars.ContextVar('job_id', default='-')
+
+# Queue shared by the handler and listener
+_log_queue = None
+_listener = None
+
+class JobContextFilter(logging.Filter):
+    """Tag every record with the current job ID."""
+
+    def filter(self, record):
+        record.job_id = _current_job_id.get()
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limit how often a single line of code can log below WARNING.
+
+    Each call site may log `burst` records per `window` seconds; the rest are
+    dropped and the count is appended to the next record that gets through.
+    Stage summaries from log_stage all come from one call site but are one
+    line per stage per report, so they are never limited.
+    """
+
+    def __init__(self, burst=RATE_LIMIT_BURST, window=RATE_LIMIT_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._sites = {}  # (pathname, lineno) -> [window start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or hasattr(record, 'stage'):
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.setdefault(key, [now, 0, 0])
+            if now - site[0] >= self.window:
+                site[0], site[1] = now, 0
+            site[1] += 1
+            if site[1] > self.burst:
+                site[2] += 1
+                return False
+            suppressed, site[2] = site[2], 0
+
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+def _start_listener():
+    """Start the background thread that writes queued records to stdout."""
+    global _listener
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = QueueListener(_log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+
+def _stop_listener():
+    """Flush remaining records and stop the listener thread."""
+    if _listener is not None:
+        _listener.stop()
+
+def configure_logging(level=None):
+    """
+    Route all logging through a queue to a background stdout writer.
+
+    Safe to call more than once; only the first call has an effect. The
+    listener thread is restarted in forked children (e.g. gunicorn workers
+    forked from a preloaded master).
+
+    Args:
+        level (str, optional): Log level name (defaults to LOG_LEVEL env var or INFO)
+    """
+    global _log_queue
+    if _log_queue is not None:
+        return
+
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    _log_queue = queue.SimpleQueue()
+
+    queue_handler = QueueHandler(_log_queue)
+    queue_handler.addFilter(JobContextFilter())
+    queue_handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _start_listener()
+    atexit.register(_stop_listener)
+    # Threads don't survive fork, so each child needs its own listener
+    os.register_at_fork(after_in_child=_start_listener)
+
+def bind_job_id(job_id=None):
+    """
+    Tag log records from the current context with a job ID until reset_job_id is called.
+
+    Args:
+        job_id (str, optional): ID to use (a short random ID by default)
+
+    Returns:
+        contextvars.Token: Token to pass to reset_job_id
+    """
+    return _current_job_id.set(job_id or uuid.uuid4().hex[:8])
+
+def reset_job_id(token):
+    """Restore the job ID that was current before bind_job_id."""
+    _current_job_id.reset(token)
+
+def get_job_id():
+    """Get the job ID of the current context ('-' outside a job)."""
+    return _current_job_id.get()
+
+@contextmanager
+def job_context(job_id=None):
+    """
+    Tag all log records in this block with a job ID.
+
+    Args:
+        job_id (str, optional): ID to use (a short random ID by default)
+
+    Yields:
+        str: The job ID
+    """
+    token = bind_job_id(job_id)
+    try:
+        yield get_job_id()
+    finally:
+        reset_job_id(token)
+
+def log_stage(logger, stage, **fields):
+    """
+    Log a single structured summary line for a processing stage.
+
+    The stage is also recorded in the request's profile if one is being captured.
+
+    Args:
+        logger (logging.Logger): Logger to write to
+        stage (str): Stage name, e.g. 'process' or 'render'
+        **fields: Key/value details for the stage
+    """
+    details = ' '.join(f"{key}={value}" for key, value in fields.items())
+    logger.info(f"stage={stage} {details}", extra={'stage': stage, 'fields': fields})
+    # Keep the timings with the request's profile when it is being profiled
+    record_stage(stage, fields)
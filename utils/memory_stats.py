@@ -0,0 +1,274 @@
+"""
+Memory accounting module for measuring each stage of a report.
+
+A StageMeter samples the process RSS when a stage starts and ends, and when
+tracemalloc is tracing it also records which lines allocated the most memory
+during the stage. The stage's summary line is logged with these figures and
+any payload sizes (DataFrame, images, HTML), and each figure is added to a
+process-wide histogram that /status reports.
+
+The meters finished while a request is handled can be collected with
+collect_stages() (or bind/reset around a request), so tests can assert
+memory ceilings on individual stages.
+"""
+
+import os
+import sys
+import time
+import bisect
+import resource
+import threading
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+from utils.logging_setup import log_stage
+
+MB = 1024 * 1024
+
+# Histogram bucket upper bounds in MB (the last bucket is unbounded)
+HISTOGRAM_BUCKETS_MB = [1, 4, 16, 64, 128, 256, 512, 1024, 2048]
+
+# Number of top allocating lines reported per stage when tracemalloc is tracing
+TOP_ALLOCATORS = 3
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Meters finished in the current context (request), when they are being collected
+_collected_meters = contextvars.ContextVar('stage_meters', default=None)
+
+def get_rss_bytes():
+    """
+    Get the current resident set size of this process.
+
+    Returns:
+        int: RSS in bytes (the peak RSS where the current value is unavailable)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss_bytes()
+
+def get_peak_rss_bytes():
+    """
+    Get the highest resident set size this process has reached.
+
+    Returns:
+        int: Peak RSS in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def get_dataframe_bytes(df):
+    """
+    Get the memory held by a DataFrame, including the contents of string columns.
+
+    Args:
+        df (pandas.DataFrame): The table
+
+    Returns:
+        int: Size in bytes
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+def get_image_bytes(images):
+    """
+    Get the total size of the image payloads held for a report.
+
+    Args:
+        images (dict): Image URL to {'string', 'mime_type'} mapping
+
+    Returns:
+        int: Size in bytes
+    """
+    return sum(len(image['string']) for image in images.values())
+
+class MemoryHistogram:
+    """
+    Bucketed distribution of a memory figure in MB.
+    """
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS_MB):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            buckets (list): Ascending bucket upper bounds in MB
+        """
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_mb):
+        """Add one value in MB."""
+        self.counts[bisect.bisect_left(self.buckets, value_mb)] += 1
+        self.count += 1
+        self.total += value_mb
+        self.max = max(self.max, value_mb)
+
+    def to_dict(self):
+        """
+        Get the histogram as a JSON-friendly dict.
+
+        Returns:
+            dict: Count, mean, max, bucket upper bounds and per-bucket counts
+        """
+        return {
+            'count': self.count,
+            'mean_mb': round(self.total / self.count, 1) if self.count else 0,
+            'max_mb': round(self.max, 1),
+            'bucket_bounds_mb': self.buckets,
+            'bucket_counts': self.counts
+        }
+
+# Histograms keyed by (stage, figure name)
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+def observe(stage, name, value_mb):
+    """
+    Add a value to the process-wide histogram for a stage figure.
+
+    Args:
+        stage (str): Stage name
+        name (str): Figure name, e.g. 'rss_delta_mb'
+        value_mb (float): Value in MB (negative values are counted as 0)
+    """
+    with _histograms_lock:
+        histogram = _histograms.get((stage, name))
+        if histogram is None:
+            histogram = _histograms[(stage, name)] = MemoryHistogram()
+        histogram.observe(max(0.0, value_mb))
+
+def get_memory_stats():
+    """
+    Get the current RSS figures and all stage histograms.
+
+    Returns:
+        dict: RSS, peak RSS and {stage: {figure: histogram}}
+    """
+    with _histograms_lock:
+        stages = {}
+        for (stage, name), histogram in sorted(_histograms.items()):
+            stages.setdefault(stage, {})[name] = histogram.to_dict()
+    return {
+        'rss_mb': round(get_rss_bytes() / MB, 1),
+        'peak_rss_mb': round(get_peak_rss_bytes() / MB, 1),
+        'stages': stages
+    }
+
+class StageMeter:
+    """
+    Time and memory measurement of one stage of a report.
+    """
+
+    def __init__(self, stage):
+        """
+        Start measuring a stage.
+
+        Args:
+            stage (str): Stage name, e.g. 'process' or 'layout'
+        """
+        self.stage = stage
+        self.fields = {}
+        self._snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        self._rss_start = get_rss_bytes()
+        self._started = time.monotonic()
+
+    def finish(self, logger, **fields):
+        """
+        Stop measuring, log the stage summary line and update the histograms.
+
+        Fields whose names end in '_bytes' are payload sizes; they are logged
+        as given and added to the histograms in MB.
+
+        Args:
+            logger (logging.Logger): Logger to write the summary to
+            **fields: Stage details to include in the summary
+
+        Returns:
+            dict: All fields of the summary, including the memory figures
+        """
+        rss = get_rss_bytes()
+        self.fields.update(fields)
+        self.fields['seconds'] = round(time.monotonic() - self._started, 3)
+        self.fields['rss_mb'] = round(rss / MB, 1)
+        # RSS belongs to the whole process: the delta includes whatever other
+        # threads (concurrent requests) allocated or freed during the stage
+        self.fields['rss_delta_mb'] = round((rss - self._rss_start) / MB, 1)
+
+        # tracemalloc may have been stopped during the stage (e.g. by a finished profile)
+        if self._snapshot is not None and tracemalloc.is_tracing():
+            # Ignore tracemalloc's own bookkeeping
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+            diffs = snapshot.compare_to(self._snapshot.filter_traces(ignore), 'lineno')
+            top = sorted(diffs, key=lambda stat: stat.size_diff, reverse=True)[:TOP_ALLOCATORS]
+            self.fields['top_allocations'] = [
+                f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}=+{stat.size_diff // 1024}KiB"
+                for stat in top if stat.size_diff > 0
+            ]
+        # Snapshots are large; collected meters only need the fields
+        self._snapshot = None
+
+        observe(self.stage, 'rss_delta_mb', (rss - self._rss_start) / MB)
+        for name, value in self.fields.items():
+            if name.endswith('_bytes') and isinstance(value, int):
+                observe(self.stage, f"{name[:-len('_bytes')]}_mb", value / MB)
+
+        log_stage(logger, self.stage, **self.fields)
+        meters = _collected_meters.get()
+        if meters is not None:
+            meters.append(self)
+        return self.fields
+
+def start_stage(stage):
+    """
+    Start measuring a stage of a report.
+
+    Args:
+        stage (str): Stage name
+
+    Returns:
+        StageMeter: Call finish() on it when the stage is done
+    """
+    return StageMeter(stage)
+
+def bind_stage_collection():
+    """
+    Keep every meter finished in the current context until reset_stage_collection is called.
+
+    Returns:
+        contextvars.Token: Token to pass to reset_stage_collection
+    """
+    return _collected_meters.set([])
+
+def reset_stage_collection(token):
+    """Stop collecting the meters started by bind_stage_collection."""
+    _collected_meters.reset(token)
+
+def get_stage_meters():
+    """
+    Get the meters of the stages finished so far in the current context (e.g. request).
+
+    Returns:
+        list: StageMeter objects in the order they finished (empty if not collecting)
+    """
+    return list(_collected_meters.get() or [])
+
+@contextmanager
+def collect_stages():
+    """
+    Collect the meters of every stage finished in this block.
+
+    Yields:
+        list: StageMeter objects, appended to as stages finish
+    """
+    token = bind_stage_collection()
+    try:
+        yield _collected_meters.get()
+    finally:
+        reset_stage_collection(token)
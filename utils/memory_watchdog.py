@@ -0,0 +1,202 @@
+"""
+Memory watchdog module for retiring workers whose memory has grown too far.
+
+WeasyPrint, cairo and pango caches and heap fragmentation keep a worker's RSS
+high after image-heavy renders, and it only grows until the worker is
+OOM-killed in the middle of a request. The watchdog measures RSS after each
+render. Past the threshold it first returns freed memory to the OS, and if
+the worker is still over, it marks the worker for retirement. Once the
+current request has finished the worker sends itself SIGTERM; gunicorn
+treats that as a graceful shutdown (in-flight requests complete) and forks a
+fresh worker from the warm master.
+
+Recycle events are logged and counted in a JSON file shared by every worker,
+so the count survives the retired processes and /status can report it.
+"""
+
+import gc
+import os
+import json
+import time
+import fcntl
+import ctypes
+import ctypes.util
+import signal
+import logging
+import threading
+from utils.memory_stats import get_rss_bytes, MB
+from utils.logging_setup import log_stage
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# RSS after a render above which the worker is retired (0 disables the watchdog)
+WORKER_MAX_RSS_MB = float(os.environ.get('WORKER_MAX_RSS_MB', 1536))
+
+# Recycle counts shared by every worker
+WATCHDOG_STATE_PATH = os.path.join(BASE_DIR, 'cache', 'memory_watchdog.json')
+
+def _load_malloc_trim():
+    """Find glibc's malloc_trim, which returns freed heap pages to the OS."""
+    try:
+        return ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6').malloc_trim
+    except (OSError, AttributeError):
+        return None
+
+_malloc_trim = _load_malloc_trim()
+
+def release_memory():
+    """
+    Free unreachable objects and return freed heap memory to the OS where possible.
+
+    Returns:
+        int: RSS in bytes afterwards
+    """
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+    return get_rss_bytes()
+
+class MemoryWatchdog:
+    """
+    Per-process watchdog that decides when a worker should be recycled.
+    """
+
+    def __init__(self, max_rss_mb=WORKER_MAX_RSS_MB):
+        """
+        Initialize the watchdog.
+
+        Args:
+            max_rss_mb (float): RSS threshold in MB (0 disables the watchdog)
+        """
+        self.max_rss_bytes = int(max_rss_mb * MB)
+        self.recycling_enabled = False
+        self._lock = threading.Lock()
+        self._retire_requested = False
+        self._retired = False
+        self._renders = 0
+
+    def enable_recycling(self):
+        """
+        Allow the watchdog to retire this process.
+
+        Only call this in a worker managed by gunicorn, which replaces retired
+        workers; anywhere else SIGTERM would stop the server.
+        """
+        self.recycling_enabled = True
+
+    def reset(self):
+        """Forget the parent's state in a newly forked worker."""
+        self._lock = threading.Lock()
+        self._retire_requested = False
+        self._retired = False
+        self._renders = 0
+
+    def check(self, stage='render'):
+        """
+        Measure RSS after a render and mark the worker for retirement if it is over the threshold.
+
+        Args:
+            stage (str): What just finished, for the log
+
+        Returns:
+            bool: True if the worker will be retired
+        """
+        if self.max_rss_bytes <= 0:
+            return False
+        with self._lock:
+            self._renders += 1
+            renders = self._renders
+        rss = get_rss_bytes()
+        if rss <= self.max_rss_bytes:
+            return False
+
+        # Try handing freed memory back before giving up on the worker
+        trimmed_rss = release_memory()
+        if trimmed_rss <= self.max_rss_bytes:
+            log_stage(logger, 'memory_trim', after=stage, rss_mb=round(rss / MB),
+                      trimmed_rss_mb=round(trimmed_rss / MB))
+            return False
+
+        with self._lock:
+            if self._retire_requested:
+                return True
+            self._retire_requested = self.recycling_enabled
+        log_stage(logger, 'recycle', after=stage, rss_mb=round(trimmed_rss / MB),
+                  threshold_mb=round(self.max_rss_bytes / MB), renders=renders,
+                  action='retire' if self.recycling_enabled else 'none')
+        self._count(trimmed_rss, renders)
+        return self.recycling_enabled
+
+    def retire_if_requested(self):
+        """
+        Retire this worker if a render pushed it over the threshold.
+
+        Call once a request has finished. SIGTERM makes the gunicorn worker
+        stop accepting requests, finish the ones in flight and exit.
+
+        Returns:
+            bool: True if SIGTERM was sent
+        """
+        with self._lock:
+            if not self._retire_requested or self._retired:
+                return False
+            self._retired = True
+        logger.warning(f"Retiring worker {os.getpid()}: RSS over {round(self.max_rss_bytes / MB)} MB")
+        os.kill(os.getpid(), signal.SIGTERM)
+        return True
+
+    def _count(self, rss, renders):
+        """Add a recycle event to the shared counts."""
+        try:
+            os.makedirs(os.path.dirname(WATCHDOG_STATE_PATH), exist_ok=True)
+            with open(WATCHDOG_STATE_PATH, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+                state['recycles'] = state.get('recycles', 0) + (1 if self.recycling_enabled else 0)
+                state['over_threshold'] = state.get('over_threshold', 0) + 1
+                state['last'] = {
+                    'pid': os.getpid(),
+                    'rss_mb': round(rss / MB),
+                    'renders': renders,
+                    'retired': self.recycling_enabled,
+                    'at': time.strftime('%Y-%m-%dT%H:%M:%S')
+                }
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+        except OSError as e:
+            logger.warning(f"Could not record recycle event: {str(e)}")
+
+    def stats(self):
+        """
+        Get the watchdog settings and the shared recycle counts for /status.
+
+        Returns:
+            dict: Threshold, current RSS, this worker's render count and the recycle counts
+        """
+        try:
+            with open(WATCHDOG_STATE_PATH) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        return {
+            'max_rss_mb': round(self.max_rss_bytes / MB),
+            'rss_mb': round(get_rss_bytes() / MB),
+            'recycling_enabled': self.recycling_enabled,
+            'renders': self._renders,
+            'retire_requested': self._retire_requested,
+            'recycles': state.get('recycles', 0),
+            'over_threshold': state.get('over_threshold', 0),
+            'last': state.get('last')
+        }
+
+# Watchdog for this process
+watchdog = MemoryWatchdog()
+os.register_at_fork(after_in_child=watchdog.reset)
@@ -0,0 +1,184 @@
+"""
+Brand registry module for loading brand configuration and pre-optimized assets.
+
+Brands are described in brands.json. Every image asset is decoded once at
+startup, downsampled to print resolution and re-encoded in memory so that
+renders reference it by an asset:// URL instead of re-reading the originals.
+"""
+
+import os
+import io
+import json
+import math
+import logging
+import threading
+from PIL import Image
+from weasyprint import default_url_fetcher
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Default location of the brand configuration file
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'brands.json')
+
+# URL prefix used for assets served from memory
+ASSET_URL_PREFIX = 'asset://'
+
+# Default print resolution if the config does not specify one
+DEFAULT_PRINT_DPI = 150
+
+# Module-level singleton, created on first use
+_registry = None
+_registry_lock = threading.Lock()
+
+def optimize_image(image_path, width_pt, print_dpi, output_format=None, opacity=None):
+    """
+    Load an image and return print-ready bytes.
+
+    Args:
+        image_path (str): Path to the source image
+        width_pt (float): Width the image is rendered at in the PDF, in points
+        print_dpi (int): Target print resolution
+        output_format (str, optional): 'PNG' or 'JPEG' (defaults to PNG)
+        opacity (float, optional): Opacity to bake into the image against white
+
+    Returns:
+        dict: {'string': bytes, 'mime_type': str} as expected by WeasyPrint
+    """
+    output_format = (output_format or 'PNG').upper()
+
+    with Image.open(image_path) as source:
+        image = source.copy()
+        source_format = source.format
+
+    # Downsample to the pixel width needed at print resolution (never upscale)
+    max_width = math.ceil(width_pt / 72 * print_dpi)
+    if image.width <= max_width and not opacity and source_format == output_format:
+        # Already print-ready, keep the original encoding
+        with open(image_path, 'rb') as f:
+            return {'string': f.read(), 'mime_type': Image.MIME[source_format]}
+    if image.width > max_width:
+        new_height = max(1, round(image.height * max_width / image.width))
+        image = image.resize((max_width, new_height), Image.LANCZOS)
+
+    # Bake opacity into the pixels so the PDF needs no transparency group
+    if opacity is not None and opacity < 1:
+        image = image.convert('RGBA')
+        white = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.blend(white, image, opacity)
+
+    buffer = io.BytesIO()
+    if output_format == 'JPEG':
+        # JPEG has no alpha channel, so flatten onto white first
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            flattened = Image.new('RGB', image.size, (255, 255, 255))
+            flattened.paste(image, mask=image.getchannel('A'))
+            image = flattened
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, format='JPEG', quality=85, optimize=True)
+        mime_type = 'image/jpeg'
+    else:
+        image.save(buffer, format='PNG', optimize=True)
+        mime_type = 'image/png'
+
+    return {'string': buffer.getvalue(), 'mime_type': mime_type}
+
+class BrandRegistry:
+    """
+    Registry of configured brands and their optimized image assets.
+    """
+
+    def __init__(self, static_dir, config_path=CONFIG_PATH):
+        """
+        Load brand configuration and pre-process all assets.
+
+        Args:
+            static_dir (str): Path to static assets directory
+            config_path (str): Path to the brand configuration JSON file
+        """
+        self.static_dir = static_dir
+        self.images_dir = os.path.join(static_dir, 'images')
+
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+
+        self.print_dpi = config.get('print_dpi', DEFAULT_PRINT_DPI)
+        self.brands = {}
+        self.assets = {}
+
+        # Assets shared by every brand (cover background, map, icons)
+        self.shared_urls = {}
+        for name, spec in config.get('shared_assets', {}).items():
+            self.shared_urls[name] = self._load_asset(f'shared/{name}', spec)
+
+        # Per-brand details and assets
+        for brand_name, brand_config in config.get('brands', {}).items():
+            brand = {
+                'name': brand_name,
+                'display_name': brand_config.get('display_name', brand_name),
+                'form_icon': brand_config.get('form_icon', ''),
+                'website': brand_config.get('website', ''),
+                'email': brand_config.get('email', ''),
+                'assets': dict(self.shared_urls)
+            }
+            for name, spec in brand_config.get('assets', {}).items():
+                brand['assets'][name] = self._load_asset(f'brand/{brand_name}/{name}', spec)
+            self.brands[brand_name] = brand
+
+        total_bytes = sum(len(asset['string']) for asset in self.assets.values())
+        logger.info(f"Loaded {len(self.brands)} brands with {len(self.assets)} optimized assets ({total_bytes} bytes)")
+
+    def _load_asset(self, key, spec):
+        """Optimize a single asset, store it in memory and return its URL."""
+        image_path = os.path.join(self.images_dir, spec['file'])
+        url = f"{ASSET_URL_PREFIX}{key}"
+        self.assets[url] = optimize_image(
+            image_path,
+            spec['width_pt'],
+            self.print_dpi,
+            output_format=spec.get('format'),
+            opacity=spec.get('opacity')
+        )
+        logger.debug(f"Optimized asset {key}: {os.path.getsize(image_path)} -> {len(self.assets[url]['string'])} bytes")
+        return url
+
+    def get(self, business_type):
+        """
+        Get the configuration of a brand.
+
+        Args:
+            business_type (str): Brand name, e.g. 'busivet'
+
+        Returns:
+            dict: Brand details with asset URLs under 'assets'
+        """
+        brand = self.brands.get(business_type.lower())
+        if brand is None:
+            raise ValueError(f"Unknown business type: {business_type}")
+        return brand
+
+    def url_fetcher(self, url):
+        """WeasyPrint URL fetcher that serves optimized assets from memory."""
+        asset = self.assets.get(url)
+        if asset is not None:
+            return {'string': asset['string'], 'mime_type': asset['mime_type']}
+        return default_url_fetcher(url)
+
+def get_brand_registry(static_dir):
+    """
+    Get the process-wide brand registry, building it on first use.
+
+    Args:
+        static_dir (str): Path to static assets directory
+
+    Returns:
+        BrandRegistry: The shared registry instance
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = BrandRegistry(static_dir)
+    return _registry
@@ -5,8 +5,69 @@ This module uses Jinja2 to render templates with data and generate full HTML.
 """
 
 import os
+import threading
 import jinja2
 from . import templates
+from .brand_registry import get_brand_registry
+from utils.cancellation import check_cancelled
+
+# Path to the report stylesheet
+CSS_PATH = os.path.join(os.path.dirname(__file__), 'styles.css')
+
+# Template name to template source function
+TEMPLATE_SOURCES = {
+    'head': templates.get_html_head,
+    'footer': templates.get_html_footer,
+    'cover_page': templates.get_cover_page_template,
+    'map_page': templates.get_map_page_template,
+    'property_page_header': templates.get_property_page_header_template,
+    'property_item': templates.get_property_item_template,
+    'property_page_footer': templates.get_property_page_footer_template,
+    'next_steps': templates.get_next_steps_template
+}
+
+# Shared Jinja2 environment, created and compiled once per process
+_environment = None
+_environment_lock = threading.Lock()
+
+def _get_template(name):
+    """Get template content based on name."""
+    if name in TEMPLATE_SOURCES:
+        return TEMPLATE_SOURCES[name]()
+    return ""
+
+def get_environment():
+    """
+    Get the shared Jinja2 environment with every report template compiled.
+    
+    The environment is built once per process (before forking when the app is
+    preloaded) so workers share the compiled templates instead of rebuilding
+    them for each report.
+    
+    Returns:
+        jinja2.Environment: The shared environment
+    """
+    global _environment
+    if _environment is None:
+        with _environment_lock:
+            if _environment is None:
+                # Template names have no extension, so escape everything explicitly:
+                # workbook cells and form fields end up in the HTML
+                env = jinja2.Environment(
+                    loader=jinja2.FunctionLoader(_get_template),
+                    autoescape=True
+                )
+                
+                # Register CSS to include in templates
+                with open(CSS_PATH, 'r') as f:
+                    css_content = f.read()
+                env.globals['include'] = lambda name: css_content if name == 'styles.css' else ""
+                
+                # Compile every template up front
+                for name in TEMPLATE_SOURCES:
+                    env.get_template(name)
+                _environment = env
+    return _environment
 
 class HtmlBuilder:
     """
@@ -21,51 +82,19 @@ class HtmlBuilder:
             static_dir (str): Path to static assets directory
         """
         self.static_dir = static_dir
-        self.images_dir = os.path.join(static_dir, 'images')
-        self.watermark_path = None  # Will be set during build_html
-        
-        # Setup Jinja2 environment
-        template_loader = jinja2.FunctionLoader(self._get_template)
-        self.env = jinja2.Environment(
-            loader=template_loader,
-            autoescape=jinja2.select_autoescape(['html', 'xml'])
-        )
-        
-        # Add template for CSS
-        css_path = os.path.join(os.path.dirname(__file__), 'styles.css')
-        with open(css_path, 'r') as f:
-            self.css_content = f.read()
-        
-        # Register CSS to include in templates
-        self.env.globals['include'] = self._include_resource
+        self.brand_registry = get_brand_registry(static_dir)
         
-    def _include_resource(self, template_name):
-        """Include external resources like CSS in templates"""
-        if template_name == 'styles.css':
-            return self.css_content
-        return ""
-    
-    def _get_template(self, name):
-        """Get template content based on name."""
-        templates_map = {
-            'head': templates.get_html_head(),
-            'footer': templates.get_html_footer(),
-            'cover_page': templates.get_cover_page_template(),
-            'map_page': templates.get_map_page_template(),
-            'property_page_header': templates.get_property_page_header_template(),
-            'property_item': templates.get_property_item_template(),
-            'property_page_footer': templates.get_property_page_footer_template(),
-            'next_steps': templates.get_next_steps_template()
-        }
-        
-        if name in templates_map:
-            return templates_map[name]
-        return ""
+        # Use the shared, precompiled Jinja2 environment (read-only, so one
+        # builder can render many reports at once from different threads)
+        self.env = get_environment()
     
     def build_html(self, data, business_type, first_line, second_line, third_line, report_date):
         """
         Build complete HTML for the report.
         
+        All per-report state is kept in locals and passed explicitly, so this
+        is safe to call concurrently on a shared builder.
+        
         Args:
             data (dict): Processed property data
             business_type (str): 'busivet' or 'busihealth'
@@ -83,31 +112,29 @@ class HtmlBuilder:
         head_template = self.env.get_template('head')
         html_parts.append(head_template.render())
         
-        # Define paths
-        logo_path = os.path.join(self.images_dir, f'{business_type}_logo.png')
-        self.watermark_path = os.path.join(self.images_dir, f'{business_type}_watermark.png')
-        title_background_path = os.path.join(self.images_dir, 'title_page_background.png')
-        map_path = os.path.join(self.images_dir, 'template_map.png')
-        global_icon_path = os.path.join(self.images_dir, 'global_icon.png')
+        # Look up brand details and pre-optimized asset URLs
+        brand = self.brand_registry.get(business_type)
+        assets = brand['assets']
+        logo_path = assets['logo']
+        watermark_path = assets['watermark']
+        title_background_path = assets['title_background']
+        map_path = assets['map']
+        global_icon_path = assets['global_icon']
         
         # Icon paths
         icon_paths = {
-            'address_icon_path': os.path.join(self.images_dir, 'address_icon.png'),
-            'floor_area_icon_path': os.path.join(self.images_dir, 'floor_area_icon.png'),
-            'price_icon_path': os.path.join(self.images_dir, 'price_icon.png'),
-            'zoning_icon_path': os.path.join(self.images_dir, 'zoning_icon.png'),
-            'type_icon_path': os.path.join(self.images_dir, 'type_icon.png'),
-            'car_spaces_icon_path': os.path.join(self.images_dir, 'car_spaces_icon.png'),
-            'comment_icon_path': os.path.join(self.images_dir, 'comment_icon.png')
+            'address_icon_path': assets['address_icon'],
+            'floor_area_icon_path': assets['floor_area_icon'],
+            'price_icon_path': assets['price_icon'],
+            'zoning_icon_path': assets['zoning_icon'],
+            'type_icon_path': assets['type_icon'],
+            'car_spaces_icon_path': assets['car_spaces_icon'],
+            'comment_icon_path': assets['comment_icon']
         }
         
         # Set business info
-        if business_type.lower() == 'busivet':
-            website = 'BUSIVET.COM.AU'
-            email = 'BEN@BUSIVET.COM.AU'
-        else:  # busihealth
-            website = 'BUSIHEALTH.COM'
-            email = 'BEN@BUSIHEALTH.COM'
+        website = brand['website']
+        email = brand['email']
         
         # Build cover page
         cover_template = self.env.get_template('cover_page')
@@ -135,7 +162,7 @@ class HtmlBuilder:
             report_date=report_date,
             statistics=data['statistics'],
             website=website,
-            watermark_path=self.watermark_path
+            watermark_path=watermark_path
         )
         html_parts.append(map_html)
         
@@ -147,6 +174,7 @@ class HtmlBuilder:
                 data['for_lease_properties'], 
                 business_type, 
                 logo_path, 
+                watermark_path, 
                 icon_paths, 
                 report_date, 
                 website
@@ -160,6 +188,7 @@ class HtmlBuilder:
                 data['for_sale_properties'], 
                 business_type, 
                 logo_path, 
+                watermark_path, 
                 icon_paths, 
                 report_date, 
                 website
@@ -169,10 +198,11 @@ class HtmlBuilder:
         next_steps_template = self.env.get_template('next_steps')
         next_steps_html = next_steps_template.render(
             business_type=business_type,
+            display_name=brand['display_name'],
             logo_path=logo_path,
             report_date=report_date,
             website=website,
-            watermark_path=self.watermark_path
+            watermark_path=watermark_path
         )
         html_parts.append(next_steps_html)
         
@@ -182,13 +212,16 @@ class HtmlBuilder:
         
         return ''.join(html_parts)
     
-    def _add_property_pages(self, html_parts, section_title, properties, business_type, logo_path, icon_paths, report_date, website):
+    def _add_property_pages(self, html_parts, section_title, properties, business_type, logo_path, watermark_path, icon_paths, report_date, website):
         """Add property listing pages to the HTML parts list."""
         
         properties_per_page = 3  # Maximum properties per page
         property_chunks = [properties[i:i+properties_per_page] for i in range(0, len(properties), properties_per_page)]
         
         for chunk in property_chunks:
+            # Stop between pages if the job was cancelled
+            check_cancelled()
+            
             # Add page header
             header_template = self.env.get_template('property_page_header')
             header_html = header_template.render(
@@ -196,7 +229,7 @@ class HtmlBuilder:
                 business_type=business_type,
                 logo_path=logo_path,
                 report_date=report_date,
-                watermark_path=self.watermark_path
+                watermark_path=watermark_path
             )
             html_parts.append(header_html)
             
@@ -204,24 +237,10 @@ class HtmlBuilder:
             for i, property_data in enumerate(chunk):
                 property_type = "LEASE" if section_title == "FOR LEASE" else "SALE"
                 
-                # Create normalized property object with correct field names
-                property = {
-                    'suburb': property_data['suburb'],
-                    'suburb_formatted': property_data['suburb_formatted'],
-                    'street_address': property_data['street address'],
-                    'floor_area': property_data['floor area'],
-                    'price': property_data['price'],
-                    'zoning': property_data['zoning'],
-                    'property_type': property_data['property type'],
-                    'car_spaces': property_data['car spaces'],
-                    'comments': property_data.get('comments', ''),
-                    'image': property_data.get('image_data') or property_data.get('image')  # Try image_data first, then fall back to image
-                }
-                            
                 # Render property item template
                 item_template = self.env.get_template('property_item')
                 item_html = item_template.render(
-                    property=property,
+                    property=property_data,
                     property_type=property_type,
                     **icon_paths,
                     loop={'index': i+1, 'last': i == len(chunk)-1},
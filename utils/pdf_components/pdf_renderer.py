@@ -1,15 +1,42 @@
 import os
+import sys
+import uuid
 import logging
+import threading
 from weasyprint import HTML, CSS
 from datetime import datetime
-from .html_builder import HtmlBuilder
+from .html_builder import HtmlBuilder, CSS_PATH
+from utils.profiling import capture_artifact
+from utils.memory_stats import start_stage
+from utils.cancellation import check_cancelled
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+# Parsed report stylesheet, shared by every render in the process
+_stylesheet = None
+_stylesheet_lock = threading.Lock()
+
+def get_stylesheet():
+    """
+    Get the parsed report stylesheet, parsing it on first use.
+    
+    Returns:
+        weasyprint.CSS: The shared stylesheet
+    """
+    global _stylesheet
+    if _stylesheet is None:
+        with _stylesheet_lock:
+            if _stylesheet is None:
+                _stylesheet = CSS(filename=CSS_PATH)
+    return _stylesheet
+
 class PdfRenderer:
     """
     Class for rendering HTML as PDF.
+    
+    A renderer holds no per-report state, so one instance can be shared by
+    every thread in a worker.
     """
     
     def __init__(self, output_dir, static_dir):
@@ -42,9 +69,10 @@ class PdfRenderer:
         Returns:
             str: Path to the generated PDF file
         """
-        logger.info(f"Generating PDF for {business_type} report")
+        logger.debug(f"Generating PDF for {business_type} report")
         
         # Build HTML content
+        meter = start_stage('html')
         html_content = self.html_builder.build_html(
             data, 
             business_type, 
@@ -54,30 +82,61 @@ class PdfRenderer:
             report_date
         )
         
-        # Create output filename with timestamp
+        meter.finish(logger, brand=business_type.lower(), html_bytes=sys.getsizeof(html_content))
+        
+        # Keep the intermediate HTML when this request is being profiled
+        capture_artifact('report.html', html_content)
+        
+        # Create output filename with timestamp (and a random suffix, as renders can run concurrently)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f"{business_type.lower()}_report_{timestamp}.pdf"
+        output_filename = f"{business_type.lower()}_report_{timestamp}_{uuid.uuid4().hex[:8]}.pdf"
         output_path = os.path.join(self.output_dir, output_filename)
         
-        # Get CSS path
-        css_path = os.path.join(os.path.dirname(__file__), 'styles.css')
-        
         try:
             # Generate PDF from HTML
-            logger.info("Rendering HTML to PDF")
+            logger.debug("Rendering HTML to PDF")
             
             # Create PDF using WeasyPrint with explicit margins set to 0
             base_url = self.static_dir  # Use static dir as base for relative paths
             
-            # Generate the PDF
-            HTML(string=html_content, base_url=base_url).write_pdf(
-                output_path,
-                stylesheets=[CSS(filename=css_path)]
+            # Brand assets and deduplicated property images are served from memory
+            url_fetcher = self._make_url_fetcher(data.get('images', {}))
+            
+            # Lay out the pages, then write the PDF unless the job was cancelled in between
+            check_cancelled()
+            meter = start_stage('layout')
+            document = HTML(string=html_content, base_url=base_url, url_fetcher=url_fetcher).render(
+                stylesheets=[get_stylesheet()]
             )
+            check_cancelled()
+            document.write_pdf(output_path)
             
-            logger.info(f"PDF saved to {output_path}")
+            properties = len(data.get('for_lease_properties', [])) + len(data.get('for_sale_properties', []))
+            meter.finish(logger, properties=properties, pdf_bytes=os.path.getsize(output_path))
+            
+            logger.debug(f"PDF saved to {output_path}")
             return output_path
             
         except Exception as e:
             logger.error(f"Error rendering PDF: {str(e)}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
+    
+    def _make_url_fetcher(self, images):
+        """
+        Create a URL fetcher for one report.
+        
+        Args:
+            images (dict): Image URL to {'string', 'mime_type'} mapping for this report
+            
+        Returns:
+            callable: WeasyPrint URL fetcher
+        """
+        brand_fetcher = self.html_builder.brand_registry.url_fetcher
+        
+        def url_fetcher(url):
+            image = images.get(url)
+            if image is not None:
+                return {'string': image['string'], 'mime_type': image['mime_type']}
+            return brand_fetcher(url)
+        
+        return url_fetcher
@@ -290,7 +290,7 @@ def get_next_steps_template():
             </div>
             
             <div class="next-step">
-                Busi{{ business_type[4:]|capitalize }} will then review this evaluation in collaboration with you to determine which sites are to be explored in depth.
+                {{ display_name }} will then review this evaluation in collaboration with you to determine which sites are to be explored in depth.
             </div>
         </div>
     </div>
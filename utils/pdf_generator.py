@@ -5,8 +5,13 @@ This module handles the generation of PDF reports based on HTML templates.
 """
 
 import os
+import hashlib
 import logging
-from utils.pdf_components.pdf_renderer import PdfRenderer
+import threading
+from utils.pdf_components.pdf_renderer import PdfRenderer, get_stylesheet
+from utils.pdf_components.html_builder import get_environment
+from utils.pdf_components.brand_registry import get_brand_registry
+from utils.property_record import PropertyRecord
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
@@ -20,6 +25,102 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 logger.info(f"Static directory path: {STATIC_DIR}")
 logger.info(f"Output directory path: {OUTPUT_DIR}")
 
+# Renderer shared by every thread in the process
+_renderer = None
+_renderer_lock = threading.Lock()
+
+def get_renderer():
+    """
+    Get the shared PDF renderer, creating it on first use.
+    
+    The renderer and its HTML builder keep no per-report state, so a single
+    warm instance serves concurrent renders in threaded workers.
+    
+    Returns:
+        PdfRenderer: The shared renderer
+    """
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PdfRenderer(OUTPUT_DIR, STATIC_DIR)
+    return _renderer
+
+# Code, templates, styles, brand config and brand images that determine what a report looks like
+RENDER_SOURCES = [
+    os.path.join(os.path.dirname(__file__), 'pdf_components'),
+    os.path.join(os.path.dirname(__file__), 'data_processor.py'),
+    os.path.join(os.path.dirname(__file__), 'property_record.py'),
+    os.path.join(STATIC_DIR, 'images'),
+    os.path.join(STATIC_DIR, 'fonts'),
+]
+_render_version = None
+
+def get_render_version():
+    """
+    Get a hash of the code, templates and styles that render a report.
+    
+    It is part of every rendered-report cache key, so a deploy that changes
+    how reports look never serves reports rendered by the old code.
+    
+    Returns:
+        str: Hex digest identifying the renderer version
+    """
+    global _render_version
+    if _render_version is None:
+        paths = []
+        for source in RENDER_SOURCES:
+            if os.path.isfile(source):
+                paths.append(source)
+            for root, dirs, filenames in os.walk(source):
+                dirs[:] = [name for name in dirs if name != '__pycache__']
+                paths.extend(os.path.join(root, name) for name in filenames)
+        sha256 = hashlib.sha256()
+        for path in sorted(paths):
+            sha256.update(os.path.relpath(path, STATIC_DIR).encode('utf-8'))
+            with open(path, 'rb') as f:
+                sha256.update(f.read())
+        _render_version = sha256.hexdigest()[:16]
+    return _render_version
+
+def get_brands():
+    """
+    Get the configured brands, pre-processing their assets on first call.
+    
+    Returns:
+        dict: Brand name to brand details mapping
+    """
+    return get_brand_registry(STATIC_DIR).brands
+
+def get_brand_asset(url):
+    """
+    Get a pre-processed brand asset by its asset:// URL.
+    
+    Args:
+        url (str): Asset URL, e.g. 'asset://shared/map'
+        
+    Returns:
+        dict or None: {'string': bytes, 'mime_type': str}, or None if unknown
+    """
+    return get_brand_registry(STATIC_DIR).assets.get(url)
+
+def generate_html(data, business_type, first_line, second_line, third_line, report_date):
+    """
+    Build the report HTML without rendering it to PDF.
+    
+    Args:
+        data (dict): Processed property data
+        business_type (str): 'busivet' or 'busihealth'
+        first_line (str): First line of big text for cover page
+        second_line (str): Second line of big text for cover page
+        third_line (str): Third line of big text for cover page (location)
+        report_date (str): Date for the report (e.g., '26 March 2025')
+        
+    Returns:
+        str: The report HTML, with assets referenced by asset:// URLs
+    """
+    return get_renderer().html_builder.build_html(data, business_type, first_line, second_line, third_line, report_date)
+
 def generate_pdf(data, business_type, first_line, second_line, third_line, report_date):
     """
     Generate a complete property report PDF using HTML templates.
@@ -34,13 +135,10 @@ def generate_pdf(data, business_type, first_line, second_line, third_line, repor
     Returns:
         str: Path to the generated PDF file
     """
-    logger.info(f"Generating PDF for {business_type} report")
-    
-    # Initialize PDF renderer with output directory
-    pdf_renderer = PdfRenderer(OUTPUT_DIR, STATIC_DIR)
+    logger.debug(f"Generating PDF for {business_type} report")
     
-    # Generate PDF from data
-    output_path = pdf_renderer.render_pdf(
+    # Generate PDF from data with the shared renderer
+    output_path = get_renderer().render_pdf(
         data,
         business_type,
         first_line,
@@ -49,5 +147,65 @@ def generate_pdf(data, business_type, first_line, second_line, third_line, repor
         report_date
     )
     
-    logger.info(f"PDF generated at {output_path}")
-    return output_path
\ No newline at end of file
+    logger.debug(f"PDF generated at {output_path}")
+    return output_path
+
+def warm_up():
+    """
+    Prepare everything a render needs and run a throwaway report.
+    
+    Loads brand assets, compiles the templates, parses the stylesheet and
+    renders a one-property report so that WeasyPrint, Pango and fontconfig
+    caches are populated. Called before forking when the app is preloaded so
+    workers inherit the warm state.
+    
+    Returns:
+        dict: Name of each warm-up step mapped to True once it has completed
+    """
+    steps = {}
+    
+    brands = get_brands()
+    steps['brands_loaded'] = True
+    
+    get_environment()
+    steps['templates_compiled'] = True
+    
+    get_stylesheet()
+    steps['stylesheet_parsed'] = True
+    
+    # Hash the renderer sources now rather than on the first report
+    get_render_version()
+    
+    # Render a minimal report through the real pipeline
+    empty_stats = {'total': 0, 'criteria': 0, 'avg_price': 0}
+    sample_property = PropertyRecord(
+        suburb='Warm-up',
+        suburb_formatted='Warm-up',
+        street_address='1 Warm-up Street',
+        floor_area='100',
+        price='$1',
+        zoning='B2',
+        property_type='Commercial',
+        car_spaces='-',
+        comments='',
+        image=None
+    )
+    sample_data = {
+        'for_lease_properties': [sample_property],
+        'for_sale_properties': [],
+        'statistics': {key: dict(empty_stats) for key in ('for_lease', 'already_leased', 'for_sale', 'sold')},
+        'images': {}
+    }
+    output_path = generate_pdf(
+        sample_data,
+        business_type=next(iter(brands)),
+        first_line='Warm-up',
+        second_line='Warm-up',
+        third_line='Warm-up',
+        report_date='1 January 2025'
+    )
+    os.remove(output_path)
+    steps['warmup_render'] = True
+    
+    logger.info("Renderer warm-up completed")
+    return steps
@@ -0,0 +1,130 @@
+"""
+Preview module for showing report HTML in the browser without rendering a PDF.
+
+The report HTML refers to brand assets and property photos with asset://
+URLs that only the PDF renderer can fetch. For a preview these are rewritten
+to HTTP URLs: brand assets are served from the brand registry, and property
+photos are served as small JPEG thumbnails written to a shared disk cache,
+keyed by the photo's SHA-256, so any worker can serve them.
+"""
+
+import os
+import io
+import re
+import logging
+from PIL import Image
+from utils.pdf_components.brand_registry import ASSET_URL_PREFIX
+from utils.cache_backends import make_key, publish_file, fetch_file
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Thumbnail cache location, size and quality
+THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'thumbnails'))
+THUMBNAIL_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MAX_MB', 64)) * 1024 * 1024
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_QUALITY = 70
+
+# Prefix of deduplicated workbook photo URLs
+IMAGE_ASSET_PREFIX = f"{ASSET_URL_PREFIX}image/"
+
+# asset:// URLs at the start of a src or href attribute value
+ASSET_ATTRIBUTE_PATTERN = re.compile(r'(\s(?:src|href)=["\'])' + re.escape(ASSET_URL_PREFIX))
+
+def get_thumbnail_path(digest):
+    """
+    Get the cached thumbnail path for a photo digest.
+
+    Args:
+        digest (str): Hex SHA-256 of the original photo
+
+    Returns:
+        str or None: Path of the thumbnail, or None for a malformed digest
+    """
+    if not re.fullmatch(r'[0-9a-f]{64}', digest):
+        return None
+    return os.path.join(THUMBNAIL_DIR, f"{digest}.jpg")
+
+def make_thumbnail(digest, image):
+    """
+    Write a thumbnail for a photo unless one is already cached.
+
+    Args:
+        digest (str): Hex SHA-256 of the original photo
+        image (dict): {'string': bytes, 'mime_type': str}
+
+    Returns:
+        bool: True if a new thumbnail was written
+    """
+    path = get_thumbnail_path(digest)
+    if path is None or os.path.exists(path):
+        return False
+    key = make_key('thumbnail', digest, THUMBNAIL_WIDTH, THUMBNAIL_QUALITY)
+    if fetch_file(key, path):
+        return True
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with Image.open(io.BytesIO(image['string'])) as img:
+            img.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.save(temp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        os.replace(temp_path, path)
+        publish_file(key, path)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not create thumbnail for image {digest}: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+def evict_thumbnails(max_bytes=THUMBNAIL_MAX_BYTES):
+    """
+    Delete least recently written thumbnails until the cache fits its size limit.
+
+    Args:
+        max_bytes (int): Size limit in bytes
+    """
+    entries = []
+    for name in os.listdir(THUMBNAIL_DIR):
+        if name.endswith('.jpg'):
+            path = os.path.join(THUMBNAIL_DIR, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_bytes -= size
+        except OSError:
+            pass
+
+def build_preview_html(html_content, images, asset_url, stylesheet_url):
+    """
+    Make report HTML viewable in a browser.
+
+    Args:
+        html_content (str): HTML produced by HtmlBuilder.build_html
+        images (dict): Photo URL to {'string', 'mime_type'} mapping for the report
+        asset_url (str): URL prefix the asset route is mounted at (ending in '/')
+        stylesheet_url (str): URL of the report stylesheet
+
+    Returns:
+        str: HTML with asset:// URLs replaced by HTTP URLs and the stylesheet linked
+    """
+    written = 0
+    for url, image in images.items():
+        if url.startswith(IMAGE_ASSET_PREFIX):
+            written += make_thumbnail(url[len(IMAGE_ASSET_PREFIX):], image)
+    if written:
+        evict_thumbnails()
+
+    # Only rewrite src/href values, so asset:// typed into a cell or form field stays text
+    html_content = ASSET_ATTRIBUTE_PATTERN.sub(lambda match: f'{match.group(1)}{asset_url}', html_content)
+    # The PDF renderer is given the stylesheet directly; a browser needs a link to it
+    return html_content.replace('</head>', f'<link rel="stylesheet" href="{stylesheet_url}">\n</head>', 1)
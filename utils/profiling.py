@@ -0,0 +1,283 @@
+"""
+Profiling module for on-demand capture of slow report requests.
+
+A report request can be profiled when an admin asks for it with a header, or
+at random when a sampling rate is configured. The request is run under
+cProfile and tracemalloc, and the profile, the allocation summary, the
+generated report HTML and the stage timings are saved together in a folder
+under logs/profiles/. When profiling is off nothing is wrapped.
+"""
+
+import os
+import io
+import hmac
+import json
+import time
+import uuid
+import random
+import pstats
+import shutil
+import cProfile
+import logging
+import threading
+import tracemalloc
+import contextvars
+from datetime import datetime
+from werkzeug.utils import secure_filename
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Where captured profiles are stored and how many are kept
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs', 'profiles'))
+PROFILE_MAX_KEEP = int(os.environ.get('PROFILE_MAX_KEEP', 50))
+
+# Fraction of report requests profiled without being asked (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+# Token admins send in the X-Admin-Token header; profiling on request and the
+# admin endpoints are disabled when it is not set
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Number of entries written to the text summaries
+TOP_FUNCTIONS = 60
+TOP_ALLOCATIONS = 40
+
+# Profile of the request being handled in the current context, if any
+_current_session = contextvars.ContextVar('profile_session', default=None)
+
+# Only one cProfile profiler can be active in a process at a time
+_profiler_lock = threading.Lock()
+
+def is_admin_request(headers):
+    """
+    Check whether a request carries the admin token.
+
+    Args:
+        headers (werkzeug.datastructures.Headers): Request headers
+
+    Returns:
+        bool: True if ADMIN_TOKEN is set and the X-Admin-Token header matches it
+    """
+    token = headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def get_profile_reason(headers):
+    """
+    Decide whether to profile a report request.
+
+    Args:
+        headers (werkzeug.datastructures.Headers): Request headers
+
+    Returns:
+        str or None: 'requested' if an admin sent X-Profile: true, 'sampled' if
+        the request was picked at random, otherwise None
+    """
+    if headers.get('X-Profile', '').lower() == 'true' and is_admin_request(headers):
+        return 'requested'
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+class ProfileSession:
+    """
+    Profilers and captured data for one profiled request.
+    """
+
+    def __init__(self, job_id, reason):
+        """
+        Start profiling the current thread.
+
+        Args:
+            job_id (str): Job ID of the request, used in the folder name
+            reason (str): 'requested' or 'sampled'
+        """
+        self.job_id = job_id
+        self.reason = reason
+        self.created = datetime.now()
+        self.stages = []
+        self.artifacts = {}
+
+        # tracemalloc may already be running (e.g. PYTHONTRACEMALLOC); leave it running if so
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        self._started = time.monotonic()
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self):
+        """
+        Stop the profilers.
+
+        Returns:
+            tracemalloc.Snapshot: Allocations still held at the end of the request
+        """
+        self.profiler.disable()
+        self.seconds = time.monotonic() - self._started
+        snapshot = tracemalloc.take_snapshot()
+        self.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        return snapshot
+
+    def save(self, snapshot, status_code=None):
+        """
+        Write the profile and captured data to a new folder.
+
+        Args:
+            snapshot (tracemalloc.Snapshot): Allocation snapshot from stop()
+            status_code (int, optional): Response status of the request
+
+        Returns:
+            str: Path of the folder the profile was saved in
+        """
+        # The job ID can come from the client's X-Request-ID, so only keep filename-safe characters
+        safe_job_id = secure_filename(self.job_id)[:32] or uuid.uuid4().hex[:8]
+        profile_id = f"{self.created.strftime('%Y%m%d_%H%M%S')}-{safe_job_id}"
+        folder = os.path.join(PROFILE_DIR, profile_id)
+        os.makedirs(folder, exist_ok=True)
+
+        # Raw profile for snakeviz/pstats, plus a readable summary
+        self.profiler.dump_stats(os.path.join(folder, 'profile.pstats'))
+        summary = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        with open(os.path.join(folder, 'profile.txt'), 'w') as f:
+            f.write(summary.getvalue())
+
+        # Where the memory still held at the end was allocated
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        with open(os.path.join(folder, 'allocations.txt'), 'w') as f:
+            f.write(f"Peak traced memory: {self.peak_traced_bytes} bytes\n\n")
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+
+        for name, content in self.artifacts.items():
+            with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+        with open(os.path.join(folder, 'stages.json'), 'w') as f:
+            json.dump({
+                'job_id': self.job_id,
+                'reason': self.reason,
+                'created': self.created.isoformat(),
+                'status_code': status_code,
+                'seconds': round(self.seconds, 3),
+                'peak_traced_bytes': self.peak_traced_bytes,
+                'stages': self.stages
+            }, f, indent=2, default=str)
+
+        return folder
+
+def start_profile(job_id, headers):
+    """
+    Start profiling the current request if it should be profiled.
+
+    Args:
+        job_id (str): Job ID of the request
+        headers (werkzeug.datastructures.Headers): Request headers
+
+    Returns:
+        ProfileSession or None: The running session, or None if not profiling
+    """
+    reason = get_profile_reason(headers)
+    if reason is None:
+        return None
+
+    if not _profiler_lock.acquire(blocking=False):
+        logger.info("Skipping profile; another request is already being profiled")
+        return None
+
+    try:
+        session = ProfileSession(job_id, reason)
+    except Exception:
+        _profiler_lock.release()
+        raise
+    session.token = _current_session.set(session)
+    logger.info(f"Profiling request ({reason})")
+    return session
+
+def finish_profile(session, status_code=None):
+    """
+    Stop a profile started by start_profile and save it.
+
+    Args:
+        session (ProfileSession): The running session
+        status_code (int, optional): Response status of the request
+    """
+    try:
+        snapshot = session.stop()
+        folder = session.save(snapshot, status_code)
+        logger.info(f"Saved request profile to {folder} ({session.seconds:.2f}s)")
+        prune_profiles()
+    except Exception as e:
+        logger.error(f"Failed to save request profile: {str(e)}", exc_info=True)
+    finally:
+        _current_session.reset(session.token)
+        _profiler_lock.release()
+
+def record_stage(stage, fields):
+    """
+    Record a stage summary in the current profile, if the request is being profiled.
+
+    Args:
+        stage (str): Stage name
+        fields (dict): Stage details
+    """
+    session = _current_session.get()
+    if session is not None:
+        session.stages.append(dict(fields, stage=stage))
+
+def capture_artifact(name, content):
+    """
+    Save a text file (e.g. the report HTML) with the current profile, if the request is being profiled.
+
+    Args:
+        name (str): File name within the profile folder
+        content (str): File contents
+    """
+    session = _current_session.get()
+    if session is not None:
+        session.artifacts[name] = content
+
+def list_profiles():
+    """
+    List saved profiles, newest first.
+
+    Returns:
+        list: Dicts with the profile ID, its stage summary and file names
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for profile_id in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        folder = os.path.join(PROFILE_DIR, profile_id)
+        if not os.path.isdir(folder):
+            continue
+        try:
+            with open(os.path.join(folder, 'stages.json')) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            summary = {}
+        summary['id'] = profile_id
+        summary['files'] = sorted(os.listdir(folder))
+        profiles.append(summary)
+    return profiles
+
+def prune_profiles(max_keep=PROFILE_MAX_KEEP):
+    """
+    Delete the oldest profiles beyond the limit.
+
+    Args:
+        max_keep (int): Number of profiles to keep
+    """
+    profile_ids = sorted(os.listdir(PROFILE_DIR))
+    for profile_id in profile_ids[:max(0, len(profile_ids) - max_keep)]:
+        shutil.rmtree(os.path.join(PROFILE_DIR, profile_id), ignore_errors=True)
@@ -0,0 +1,342 @@
+"""
+Property index module for remembering properties across uploaded workbooks.
+
+Every report's normalized property table is upserted into a local SQLite
+database. A property is identified by its normalized street address and
+postcode. Each workbook that lists it adds an observation dated by the
+report date. Indexes on suburb, type and date let a new report find
+properties seen in earlier workbooks and compare its figures with the
+previous period using indexed lookups, without re-reading old workbooks.
+"""
+
+import os
+import re
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+from utils.data_processor import parse_price_per_sqm
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Database location (persistent data, not a cache the janitor may clear)
+PROPERTY_INDEX_PATH = os.environ.get(
+    'PROPERTY_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'property_index.sqlite3')
+)
+
+# Length of the periods compared by get_period_deltas
+PERIOD_DAYS = int(os.environ.get('PROPERTY_INDEX_PERIOD_DAYS', 90))
+
+# Statistics keys used by the map page, by Type value
+TYPE_KEYS = {
+    'For Lease': 'for_lease',
+    'Already Leased': 'already_leased',
+    'For Sale': 'for_sale',
+    'Sold': 'sold'
+}
+
+# Report date formats accepted from the form, e.g. '26 March 2025'
+REPORT_DATE_FORMATS = ('%d %B %Y', '%d %b %Y', '%B %d %Y', '%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%B %Y')
+
+# Ordinal day suffixes ('26th March 2025') are dropped before parsing
+ORDINAL_SUFFIX_PATTERN = re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)\b', re.IGNORECASE)
+
+# Street suffixes written out in full so 'St' and 'Street' match
+STREET_ABBREVIATIONS = {
+    'st': 'street', 'rd': 'road', 'ave': 'avenue', 'av': 'avenue', 'dr': 'drive', 'pde': 'parade',
+    'hwy': 'highway', 'cct': 'circuit', 'cres': 'crescent', 'ct': 'court', 'pl': 'place',
+    'bvd': 'boulevard', 'blvd': 'boulevard', 'ln': 'lane', 'tce': 'terrace', 'cl': 'close'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS properties (
+    address_key TEXT NOT NULL,
+    postcode TEXT NOT NULL,
+    street_address TEXT,
+    suburb TEXT,
+    state TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    workbooks INTEGER NOT NULL,
+    PRIMARY KEY (address_key, postcode)
+);
+CREATE TABLE IF NOT EXISTS observations (
+    address_key TEXT NOT NULL,
+    postcode TEXT NOT NULL,
+    workbook TEXT NOT NULL,
+    observed_on TEXT NOT NULL,
+    suburb TEXT,
+    type TEXT,
+    property_type TEXT,
+    floor_area REAL,
+    price_per_sqm REAL,
+    in_report INTEGER NOT NULL,
+    PRIMARY KEY (address_key, postcode, workbook)
+);
+CREATE INDEX IF NOT EXISTS observations_suburb_date ON observations (suburb, observed_on);
+CREATE INDEX IF NOT EXISTS observations_type_date ON observations (type, observed_on);
+CREATE INDEX IF NOT EXISTS observations_date ON observations (observed_on);
+"""
+
+def parse_report_date(report_date):
+    """
+    Parse the report date entered on the form.
+
+    Args:
+        report_date (str): Date text, e.g. '26 March 2025'
+
+    Returns:
+        datetime.date or None: The date, or None if it can't be parsed
+    """
+    text = ' '.join(str(report_date or '').replace(',', ' ').split())
+    text = ORDINAL_SUFFIX_PATTERN.sub(r'\1', text)
+    for date_format in REPORT_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    if text:
+        logger.warning(f"Could not parse report date {report_date!r}; it won't be used for property history")
+    return None
+
+def normalize_addresses(street_addresses):
+    """
+    Build address keys that ignore case, punctuation and street suffix abbreviations.
+
+    Args:
+        street_addresses (pandas.Series): Street address column
+
+    Returns:
+        pandas.Series: Normalized addresses ('' where the address is blank)
+    """
+    text = street_addresses.fillna('').astype(str).str.lower()
+    text = text.str.replace(r'[^\w\s/-]', ' ', regex=True).str.split()
+    return text.map(lambda words: ' '.join(STREET_ABBREVIATIONS.get(word, word) for word in words))
+
+def normalize_postcodes(postcodes):
+    """
+    Normalize postcodes read as text or numbers (e.g. 2570.0) to digit strings.
+
+    Args:
+        postcodes (pandas.Series): Postcode column
+
+    Returns:
+        pandas.Series: Postcodes as strings ('' where blank)
+    """
+    text = postcodes.fillna('').astype(str).str.strip()
+    return text.str.replace(r'\.0$', '', regex=True)
+
+class PropertyIndex:
+    """
+    SQLite index of properties and their observations across workbooks.
+    """
+
+    def __init__(self, path=PROPERTY_INDEX_PATH):
+        """
+        Open the database, creating the schema if needed.
+
+        Args:
+            path (str): Database file
+        """
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        """Get this thread's connection (connections can't be shared between threads)."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _observation_rows(self, df, workbook, observed_on=None):
+        """Build one observation row per property in a normalized table (observed_on may be None for lookups)."""
+        def column(name):
+            return df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index)
+
+        rows = pd.DataFrame({
+            'address_key': normalize_addresses(column('Street Address')),
+            'postcode': normalize_postcodes(column('Postcode')),
+            'street_address': column('Street Address'),
+            'suburb': column('Suburb').fillna('').astype(str).str.strip().str.upper(),
+            'state': column('State'),
+            'type': column('Type'),
+            'property_type': column('Property Type'),
+            'floor_area': pd.to_numeric(column('Floor Size (m²)'), errors='coerce'),
+            'price_per_sqm': parse_price_per_sqm(column('$/m²')).set_axis(df.index),
+            'in_report': (column('PUT IN REPORT (T/F)') == 'T').astype(int)
+        })
+        rows = rows[rows['address_key'] != '']
+        # A workbook listing the same address twice keeps its last row
+        rows = rows.drop_duplicates(['address_key', 'postcode'], keep='last')
+        rows.insert(2, 'workbook', workbook)
+        rows.insert(3, 'observed_on', observed_on.isoformat() if observed_on else None)
+        return rows.astype(object).where(rows.notna(), None)
+
+    def index_table(self, df, workbook, report_date):
+        """
+        Upsert the properties of a normalized table.
+
+        Args:
+            df (pandas.DataFrame): Table produced by normalize_property_table
+            workbook (str): Hex SHA-256 of the workbook
+            report_date (str): Report date from the form
+
+        Returns:
+            int: Number of properties indexed (0 if the report date can't be parsed)
+        """
+        observed_on = parse_report_date(report_date)
+        if observed_on is None:
+            return 0
+        rows = self._observation_rows(df, workbook, observed_on)
+        if rows.empty:
+            return 0
+
+        observation_columns = ['address_key', 'postcode', 'workbook', 'observed_on', 'suburb', 'type',
+                               'property_type', 'floor_area', 'price_per_sqm', 'in_report']
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                f"INSERT INTO observations ({', '.join(observation_columns)}) "
+                f"VALUES ({', '.join('?' * len(observation_columns))}) "
+                "ON CONFLICT (address_key, postcode, workbook) DO UPDATE SET "
+                + ', '.join(f"{name} = excluded.{name}" for name in observation_columns[3:]),
+                rows[observation_columns].itertuples(index=False, name=None)
+            )
+            # Refresh the summary row of each property this workbook lists
+            connection.executemany(
+                "INSERT INTO properties (address_key, postcode, street_address, suburb, state, first_seen, last_seen, workbooks) "
+                "SELECT ?, ?, ?, ?, ?, MIN(observed_on), MAX(observed_on), COUNT(*) FROM observations "
+                "WHERE address_key = ? AND postcode = ? "
+                "ON CONFLICT (address_key, postcode) DO UPDATE SET street_address = excluded.street_address, "
+                "suburb = excluded.suburb, state = excluded.state, first_seen = excluded.first_seen, "
+                "last_seen = excluded.last_seen, workbooks = excluded.workbooks",
+                (
+                    (key, postcode, address, suburb, state, key, postcode)
+                    for key, postcode, address, suburb, state in rows[
+                        ['address_key', 'postcode', 'street_address', 'suburb', 'state']
+                    ].itertuples(index=False, name=None)
+                )
+            )
+        logger.debug(f"Indexed {len(rows)} properties from workbook {workbook[:12]}")
+        return len(rows)
+
+    def find_repeat_listings(self, df, workbook):
+        """
+        Find properties in a table that earlier workbooks also listed.
+
+        Args:
+            df (pandas.DataFrame): Table produced by normalize_property_table
+            workbook (str): Hex SHA-256 of the workbook (its own observations are ignored)
+
+        Returns:
+            list: {'street_address', 'postcode', 'first_seen', 'last_seen', 'workbooks', 'last_type'}
+            for each repeat listing
+        """
+        keys = self._observation_rows(df, workbook)[['address_key', 'postcode']]
+        if keys.empty:
+            return []
+
+        connection = self._connect()
+        with connection:
+            # Look the keys up in one join; temp tables belong to this thread's connection
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS listing_keys "
+                "(position INTEGER PRIMARY KEY, address_key TEXT NOT NULL, postcode TEXT NOT NULL)"
+            )
+            connection.execute("DELETE FROM listing_keys")
+            connection.executemany(
+                "INSERT INTO listing_keys (position, address_key, postcode) VALUES (?, ?, ?)",
+                ((position, key, postcode) for position, (key, postcode) in enumerate(keys.itertuples(index=False, name=None)))
+            )
+            rows = connection.execute(
+                "SELECT p.street_address, p.postcode, MIN(o.observed_on), MAX(o.observed_on), COUNT(*), "
+                "MAX(CASE WHEN o.latest = 1 THEN o.type END) FROM ("
+                "SELECT k.position, o.address_key, o.postcode, o.observed_on, o.type, ROW_NUMBER() OVER ("
+                "PARTITION BY o.address_key, o.postcode ORDER BY o.observed_on DESC) AS latest "
+                "FROM listing_keys k JOIN observations o ON o.address_key = k.address_key AND o.postcode = k.postcode "
+                "WHERE o.workbook != ?"
+                ") o JOIN properties p ON p.address_key = o.address_key AND p.postcode = o.postcode "
+                "GROUP BY o.address_key, o.postcode ORDER BY MIN(o.position)",
+                (workbook,)
+            ).fetchall()
+            connection.execute("DELETE FROM listing_keys")
+        return [
+            {'street_address': row[0], 'postcode': row[1], 'first_seen': row[2],
+             'last_seen': row[3], 'workbooks': row[4], 'last_type': row[5]}
+            for row in rows
+        ]
+
+    def get_period_deltas(self, suburbs, report_date, period_days=PERIOD_DAYS):
+        """
+        Compare the map page figures for some suburbs with the previous period.
+
+        The current period is the period_days up to the report date and the
+        previous period the period_days before that. Totals count every
+        observed property; averages use properties that were put in a report,
+        like the map page.
+
+        Args:
+            suburbs (iterable): Suburb names
+            report_date (str): Report date from the form
+            period_days (int): Length of each period
+
+        Returns:
+            dict: {type key: {'total', 'avg_price', 'previous_total', 'previous_avg_price'}}
+            (empty per type if there are no suburbs or the report date can't be parsed)
+        """
+        suburbs = sorted({str(suburb).strip().upper() for suburb in suburbs if str(suburb).strip()})
+        end = parse_report_date(report_date)
+        deltas = {key: {} for key in TYPE_KEYS.values()}
+        if not suburbs or end is None:
+            return deltas
+
+        bounds = {
+            '': (end - timedelta(days=period_days), end),
+            'previous_': (end - timedelta(days=2 * period_days), end - timedelta(days=period_days))
+        }
+        connection = self._connect()
+        placeholders = ', '.join('?' * len(suburbs))
+        for prefix, (start, stop) in bounds.items():
+            # Latest observation of each property in the period, so re-listed properties count once
+            rows = connection.execute(
+                f"SELECT type, COUNT(*), AVG(CASE WHEN in_report THEN price_per_sqm END) FROM ("
+                f"SELECT type, in_report, price_per_sqm, ROW_NUMBER() OVER ("
+                f"PARTITION BY address_key, postcode ORDER BY observed_on DESC) AS latest "
+                f"FROM observations WHERE suburb IN ({placeholders}) AND observed_on > ? AND observed_on <= ?"
+                f") WHERE latest = 1 GROUP BY type",
+                (*suburbs, start.isoformat(), stop.isoformat())
+            ).fetchall()
+            figures = {property_type: (total, avg_price) for property_type, total, avg_price in rows}
+            for property_type, key in TYPE_KEYS.items():
+                total, avg_price = figures.get(property_type, (0, None))
+                deltas[key][f'{prefix}total'] = total
+                deltas[key][f'{prefix}avg_price'] = round(avg_price) if avg_price is not None else 0
+        return deltas
+
+# Index shared by every thread in the process
+_index = None
+_index_lock = threading.Lock()
+
+def get_property_index():
+    """
+    Get the shared property index, opening it on first use.
+
+    Returns:
+        PropertyIndex: The index
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PropertyIndex()
+    return _index
@@ -0,0 +1,25 @@
+"""
+Property record module defining the record type shared by data processing and HTML building.
+"""
+
+from collections import namedtuple
+
+class PropertyRecord(namedtuple('PropertyRecord', [
+    'suburb',            # Original suburb text, used for the property header
+    'suburb_formatted',  # Suburb in title case for display
+    'street_address',    # Street address in title case
+    'floor_area',
+    'price',
+    'zoning',
+    'property_type',
+    'car_spaces',
+    'comments',
+    'image'              # Image URL; the bytes are held once in the processed data's 'images'
+])):
+    """
+    Immutable, slotted record for one property in the report.
+    
+    Produced by extract_property_data and rendered directly by HtmlBuilder,
+    so no per-property dictionaries are built or copied along the way.
+    """
+    __slots__ = ()
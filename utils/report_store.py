@@ -0,0 +1,176 @@
+"""
+Report store module for keeping generated PDFs on disk by content.
+
+Each rendered PDF is moved into the store under its SHA-256 digest, so it
+can be downloaded again, resumed with range requests or revalidated with
+its ETag from a stable /reports/<digest> URL without being rendered again.
+Reports are removed once they have not been downloaded for the retention
+period, and the least recently used reports are removed when the store
+grows past its size limit.
+
+When a shared cache backend is configured, reports are also published to it
+together with the render parameters that produced them, so other replicas
+can serve the same download URL and skip rendering an identical request.
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import logging
+from utils.cache_backends import make_key, publish_file, fetch_file, get_cache_backend
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Store location, retention period and size limit
+REPORT_DIR = os.environ.get('REPORT_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'reports'))
+REPORT_RETENTION_SECONDS = float(os.environ.get('REPORT_RETENTION_HOURS', 24)) * 3600
+REPORT_STORE_MAX_BYTES = int(os.environ.get('REPORT_STORE_MAX_MB', 512)) * 1024 * 1024
+
+def get_report_path(digest):
+    """
+    Get the stored path for a report digest.
+
+    Args:
+        digest (str): Hex SHA-256 of the PDF
+
+    Returns:
+        str or None: Path of the report, or None for a malformed digest
+    """
+    if not re.fullmatch(r'[0-9a-f]{64}', digest):
+        return None
+    return os.path.join(REPORT_DIR, f"{digest}.pdf")
+
+def touch_report(path):
+    """
+    Mark a report as recently used so retention and eviction keep it.
+
+    Args:
+        path (str): Path of the stored report
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def store_report(pdf_path):
+    """
+    Move a rendered PDF into the store.
+
+    Args:
+        pdf_path (str): Path of the rendered PDF; the file is moved or removed
+
+    Returns:
+        str: Hex SHA-256 digest the report is stored under
+    """
+    sha256 = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(256 * 1024), b''):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+
+    path = get_report_path(digest)
+    if os.path.exists(path):
+        # Identical report already stored
+        os.remove(pdf_path)
+        touch_report(path)
+    else:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.move(pdf_path, temp_path)
+        os.replace(temp_path, path)
+        logger.debug(f"Stored report {digest} ({os.path.getsize(path)} bytes)")
+        publish_file(make_key('report', digest), path)
+        evict_reports()
+    return digest
+
+def find_report(digest):
+    """
+    Get the local path of a stored report, fetching it from the shared backend if needed.
+
+    Args:
+        digest (str): Hex SHA-256 of the PDF
+
+    Returns:
+        str or None: Path of the report, or None if it is not stored anywhere
+    """
+    path = get_report_path(digest)
+    if path is None:
+        return None
+    if os.path.exists(path) or fetch_file(make_key('report', digest), path):
+        return path
+    return None
+
+def remember_render(render_key, digest):
+    """
+    Record which report a set of render parameters produced.
+
+    Args:
+        render_key (str): Key from make_key('render', ...) over the workbook and render parameters
+        digest (str): Hex SHA-256 of the report
+    """
+    backend = get_cache_backend()
+    if backend is None:
+        return
+    try:
+        backend.set(render_key, digest.encode('ascii'))
+    except Exception as e:
+        logger.warning(f"Could not record render {render_key}: {str(e)}")
+
+def find_render(render_key):
+    """
+    Find a stored report produced by the same workbook and render parameters.
+
+    Args:
+        render_key (str): Key from make_key('render', ...)
+
+    Returns:
+        str or None: Hex SHA-256 of the report, or None if it has to be rendered
+    """
+    backend = get_cache_backend()
+    if backend is None:
+        return None
+    try:
+        value = backend.get(render_key)
+    except Exception as e:
+        logger.warning(f"Could not look up render {render_key}: {str(e)}")
+        return None
+    if value is None:
+        return None
+    digest = value.decode('ascii')
+    return digest if find_report(digest) else None
+
+def evict_reports(max_bytes=REPORT_STORE_MAX_BYTES, retention_seconds=REPORT_RETENTION_SECONDS):
+    """
+    Delete expired reports, then least recently used ones until the store fits its size limit.
+
+    Args:
+        max_bytes (int): Size limit in bytes
+        retention_seconds (float): Reports unused for longer than this are deleted
+    """
+    cutoff = time.time() - retention_seconds
+    entries = []
+    for name in os.listdir(REPORT_DIR):
+        if not name.endswith('.pdf'):
+            continue
+        path = os.path.join(REPORT_DIR, name)
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime < cutoff:
+                os.remove(path)
+                continue
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_bytes -= size
+        except OSError:
+            pass
@@ -0,0 +1,91 @@
+"""
+Single-flight module for coalescing identical in-flight report requests.
+
+When a user double-submits or retries while a render is still running, the
+repeat request waits for the running render and is given the same result
+instead of rendering the report again. Requests are coalesced per process.
+"""
+
+import logging
+import threading
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """An in-flight call and the requests waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Runs a function once per key at a time; concurrent callers share its result.
+    """
+
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Run fn for key, or wait for the call already running for key.
+
+        If the running call raises, every waiting caller gets the same exception.
+
+        Args:
+            key (hashable): Identity of the work
+            fn (callable): Function that does the work, called with no arguments
+
+        Returns:
+            tuple: (result, shared) where shared is True if another request computed it
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._executed += 1
+            else:
+                call.waiters += 1
+                self._coalesced += 1
+
+        if not leader:
+            logger.debug("Waiting for identical request already in flight")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.waiters:
+                logger.info(f"Shared result with {call.waiters} identical request(s)")
+        return call.result, False
+
+    def stats(self):
+        """
+        Get coalescing counters for /status.
+
+        Returns:
+            dict: Calls in flight, calls executed and requests served from another call
+        """
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self._executed,
+                'coalesced': self._coalesced
+            }
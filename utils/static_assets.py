@@ -0,0 +1,136 @@
+"""
+Static asset module for serving the web UI's CSS and JavaScript.
+
+When the app starts, each asset is hashed and given a fingerprinted name
+(e.g. css/styles.3f2a9c1b7d4e.css), and gzip and Brotli variants are written
+to a disk cache once per asset version. Pages link to the fingerprinted
+names, so those responses can be cached by browsers forever and a changed
+file gets a new URL.
+"""
+
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are skipped; gzip is still served
+    brotli = None
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Directories under static/ whose files are fingerprinted
+ASSET_DIRS = ('css', 'js')
+
+# Compressed variants are kept here, named after the fingerprinted asset
+ASSET_CACHE_DIR = os.environ.get('ASSET_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'static'))
+
+# File types worth compressing
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+
+# Fingerprinted responses never change, so browsers may keep them for a year
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Hex digits of the content hash put in asset names
+FINGERPRINT_LENGTH = 12
+
+def _write_variant(path, data):
+    """Write a compressed variant unless this version is already cached."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+class StaticAssets:
+    """
+    Manifest of fingerprinted assets and their precompressed variants.
+    """
+
+    def __init__(self, static_dir, cache_dir=ASSET_CACHE_DIR):
+        """
+        Initialize an empty manifest.
+
+        Args:
+            static_dir (str): The app's static folder
+            cache_dir (str): Directory for compressed variants
+        """
+        self.static_dir = static_dir
+        self.cache_dir = cache_dir
+        self.names = {}  # Source path -> fingerprinted name
+        self.files = {}  # Fingerprinted name -> {'mimetype', encoding: file path}
+
+    def build(self, asset_dirs=ASSET_DIRS):
+        """
+        Fingerprint every asset and write any missing compressed variants.
+
+        Args:
+            asset_dirs (tuple): Directories under the static folder to include
+
+        Returns:
+            int: Number of assets in the manifest
+        """
+        for asset_dir in asset_dirs:
+            for root, _, filenames in os.walk(os.path.join(self.static_dir, asset_dir)):
+                for filename in sorted(filenames):
+                    path = os.path.join(root, filename)
+                    self._add(os.path.relpath(path, self.static_dir).replace(os.sep, '/'), path)
+        logger.info(f"Built {len(self.files)} fingerprinted static assets")
+        return len(self.files)
+
+    def _add(self, name, path):
+        """Fingerprint one asset and precompress it if it is compressible."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        stem, extension = os.path.splitext(name)
+        fingerprinted = f"{stem}.{hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]}{extension}"
+
+        entry = {'mimetype': mimetypes.guess_type(name)[0] or 'application/octet-stream', 'identity': path}
+        if extension.lower() in COMPRESSIBLE_EXTENSIONS:
+            cached = os.path.join(self.cache_dir, fingerprinted)
+            # mtime=0 keeps the gzip bytes identical across workers and restarts
+            _write_variant(f"{cached}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+            entry['gzip'] = f"{cached}.gz"
+            if brotli is not None:
+                _write_variant(f"{cached}.br", brotli.compress(data, quality=11))
+                entry['br'] = f"{cached}.br"
+
+        self.names[name] = fingerprinted
+        self.files[fingerprinted] = entry
+
+    def get_name(self, name):
+        """
+        Get the fingerprinted name of an asset.
+
+        Args:
+            name (str): Path under the static folder, e.g. 'css/styles.css'
+
+        Returns:
+            str or None: Fingerprinted name, or None if the asset is not in the manifest
+        """
+        return self.names.get(name)
+
+    def select(self, fingerprinted, accept_encodings):
+        """
+        Choose the best variant of an asset for a client.
+
+        Args:
+            fingerprinted (str): Fingerprinted asset name
+            accept_encodings (werkzeug.datastructures.Accept): The request's Accept-Encoding
+
+        Returns:
+            tuple or None: (file path, content encoding or None, mimetype), or None if unknown
+        """
+        entry = self.files.get(fingerprinted)
+        if entry is None:
+            return None
+        for encoding in ('br', 'gzip'):
+            # Variants deleted from the cache since startup fall back to the original
+            if encoding in entry and accept_encodings[encoding] > 0 and os.path.exists(entry[encoding]):
+                return entry[encoding], encoding, entry['mimetype']
+        return entry['identity'], None, entry['mimetype']
@@ -0,0 +1,141 @@
+"""
+Table cache module for persisting normalized property tables.
+
+After a workbook sheet has been parsed and normalized once, the table is
+written as an Arrow IPC (Feather v2) file keyed by the workbook's SHA-256
+and the sheet name. Later requests for the same sheet memory-map that file
+instead of parsing the workbook with openpyxl again. Numeric columns
+without nulls stay views of the mapped file; text and categorical columns
+are converted into pandas objects on the heap, with each Arrow column
+released as soon as it has been converted.
+"""
+
+import os
+import hashlib
+import logging
+import pyarrow as pa
+from utils.uploads import get_upload_digest
+from utils.cache_backends import make_key, publish_file, fetch_file
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Bump whenever normalize_property_table changes the table layout so old entries are ignored
+SCHEMA_VERSION = 2
+
+# Cache location and size limit
+CACHE_DIR = os.environ.get('TABLE_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'tables'))
+CACHE_MAX_BYTES = int(os.environ.get('TABLE_CACHE_MAX_MB', 256)) * 1024 * 1024
+
+# Schema metadata key holding the version stamp
+VERSION_KEY = b'property_table_schema_version'
+
+def _cache_path(file_path, sheet_name):
+    """Get the cache file path for a workbook sheet."""
+    sheet_key = hashlib.sha256(str(sheet_name).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{get_upload_digest(file_path)}-{sheet_key}-v{SCHEMA_VERSION}.arrow")
+
+def load_table(file_path, sheet_name):
+    """
+    Load a cached normalized table for a workbook sheet.
+
+    Args:
+        file_path (str): Path to the uploaded Excel/CSV file
+        sheet_name (str): Sheet name (None for CSV files)
+
+    Returns:
+        pandas.DataFrame or None: The cached table, or None on a miss
+    """
+    cache_path = _cache_path(file_path, sheet_name)
+    # Another process or replica may have cached this sheet in the shared backend
+    if not os.path.exists(cache_path) and not fetch_file(make_key('table', os.path.basename(cache_path)), cache_path):
+        return None
+
+    try:
+        with pa.memory_map(cache_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            metadata = reader.schema.metadata or {}
+            if metadata.get(VERSION_KEY) != str(SCHEMA_VERSION).encode():
+                stale = True
+            else:
+                stale = False
+                table = reader.read_all()
+                # Zero-copy where the column type allows it; the table can't be used afterwards
+                df = table.to_pandas(split_blocks=True, self_destruct=True)
+                del table
+
+        if stale:
+            logger.info(f"Discarding table cache entry with old schema: {cache_path}")
+            os.remove(cache_path)
+            return None
+
+        # Mark as recently used for eviction
+        os.utime(cache_path)
+        logger.debug(f"Table cache hit: {cache_path} ({len(df)} rows)")
+        return df
+    except Exception as e:
+        # Corrupt or truncated: remove it so the sheet is parsed and cached again
+        logger.warning(f"Discarding unreadable table cache entry {cache_path}: {str(e)}")
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+        return None
+
+def store_table(file_path, sheet_name, df):
+    """
+    Write a normalized table to the cache and evict old entries if needed.
+
+    Args:
+        file_path (str): Path to the uploaded Excel/CSV file
+        sheet_name (str): Sheet name (None for CSV files)
+        df (pandas.DataFrame): Table produced by normalize_property_table
+    """
+    cache_path = _cache_path(file_path, sheet_name)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[VERSION_KEY] = str(SCHEMA_VERSION).encode()
+        table = table.replace_schema_metadata(metadata)
+
+        with pa.OSFile(temp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp_path, cache_path)
+        logger.debug(f"Stored normalized table in cache: {cache_path}")
+        publish_file(make_key('table', os.path.basename(cache_path)), cache_path)
+    except Exception as e:
+        logger.warning(f"Could not cache normalized table: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+
+    evict_tables()
+
+def evict_tables(max_bytes=CACHE_MAX_BYTES):
+    """
+    Delete least recently used cache entries until the cache fits its size limit.
+
+    Args:
+        max_bytes (int): Size limit in bytes
+    """
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        if name.endswith('.arrow'):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_bytes -= size
+            logger.debug(f"Evicted table cache entry {path}")
+        except OSError:
+            pass
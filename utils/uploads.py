@@ -0,0 +1,251 @@
+"""
+Upload handling module for streaming uploaded files straight to disk.
+
+Uploaded file parts are written chunk by chunk into the upload folder while
+a SHA-256 digest is computed, and the first bytes are checked against the
+file extension so that bad uploads are rejected before the rest of the body
+is received.
+"""
+
+import os
+import io
+import re
+import hashlib
+import logging
+import tempfile
+from werkzeug.exceptions import BadRequest
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+
+# Leading bytes expected for each file type
+FILE_SIGNATURES = {
+    'xlsx': [b'PK\x03\x04'],                        # ZIP container
+    'xls': [b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'],   # OLE2 compound document
+}
+
+# Number of leading bytes needed to identify a file
+SNIFF_LENGTH = 8
+
+class UploadRejected(BadRequest):
+    """Raised while an upload is streaming in when it cannot be accepted."""
+
+def get_extension(filename):
+    """Get the lower-case extension of a filename, or '' if it has none."""
+    return filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+
+def check_signature(extension, head):
+    """
+    Check that the first bytes of a file match its extension.
+
+    Args:
+        extension (str): File extension without the dot
+        head (bytes): Leading bytes of the file
+
+    Returns:
+        str or None: An error message, or None if the bytes look right
+    """
+    if extension == 'csv':
+        # CSV has no magic number; reject anything that is clearly binary
+        if b'\x00' in head or head.startswith(b'PK\x03\x04'):
+            return "File has a .csv extension but is not a text file"
+        return None
+
+    signatures = FILE_SIGNATURES.get(extension, [])
+    if not any(head.startswith(signature) for signature in signatures):
+        return f"File has a .{extension} extension but its contents are not a valid .{extension} file"
+    return None
+
+class UploadStream(io.FileIO):
+    """
+    Writable upload target that hashes and sniffs data as it arrives.
+
+    The data goes to a temporary file inside the upload folder, which
+    commit() renames into place without copying.
+    """
+
+    def __init__(self, upload_dir, filename):
+        """
+        Create the temporary file for an incoming upload.
+
+        Args:
+            upload_dir (str): Directory uploads are stored in
+            filename (str): Client-supplied filename, used for type checks
+        """
+        os.makedirs(upload_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=upload_dir, prefix='.upload-', suffix='.part')
+        super().__init__(fd, 'w+b', closefd=True)
+        self.temp_path = temp_path
+        self.upload_dir = upload_dir
+        self.extension = get_extension(filename)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.committed_path = None
+        self._head = b''
+
+    def write(self, data):
+        """Write a chunk, updating the digest and checking the file signature."""
+        if len(self._head) < SNIFF_LENGTH:
+            self._head += bytes(data[:SNIFF_LENGTH - len(self._head)])
+            if len(self._head) >= SNIFF_LENGTH:
+                error = check_signature(self.extension, self._head)
+                if error:
+                    logger.warning(f"Rejecting upload after {self.size + len(data)} bytes: {error}")
+                    self.discard()
+                    raise UploadRejected(error)
+
+        self.sha256.update(data)
+        self.size += len(data)
+
+        # Raw writes may be partial, so loop until the whole chunk is written
+        view = memoryview(data)
+        written = 0
+        while written < len(view):
+            written += super().write(view[written:])
+        return written
+
+    @property
+    def digest(self):
+        """Hex SHA-256 of everything written so far."""
+        return self.sha256.hexdigest()
+
+    def commit(self):
+        """
+        Move the upload to its content-addressed path in the upload folder.
+
+        Returns:
+            str: Path of the stored file, named by its SHA-256 digest
+        """
+        if self.committed_path:
+            return self.committed_path
+
+        if len(self._head) < SNIFF_LENGTH:
+            # Short file: the signature was never checked during streaming
+            error = check_signature(self.extension, self._head)
+            if error:
+                self.discard()
+                raise UploadRejected(error)
+
+        final_path = os.path.join(self.upload_dir, f"{self.digest}.{self.extension}")
+        os.replace(self.temp_path, final_path)
+        self.committed_path = final_path
+        logger.debug(f"Stored upload {final_path} ({self.size} bytes)")
+        return final_path
+
+    def discard(self):
+        """Close the stream and delete the temporary file."""
+        if not self.closed:
+            super().close()
+        if not self.committed_path and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def close(self):
+        """Close the stream, deleting the temporary file if it was never committed."""
+        self.discard()
+
+def create_upload_stream(upload_dir, filename):
+    """
+    Create the stream an uploaded file part is written into.
+
+    Rejects disallowed extensions before any of the file's bytes are read.
+
+    Args:
+        upload_dir (str): Directory uploads are stored in
+        filename (str): Client-supplied filename
+
+    Returns:
+        UploadStream: The stream to write the upload into
+    """
+    extension = get_extension(filename)
+    if extension not in ALLOWED_EXTENSIONS:
+        logger.warning(f"Rejecting upload with invalid file type: {filename}")
+        raise UploadRejected('File type not allowed. Please upload an Excel (.xlsx, .xls) or CSV file.')
+    return UploadStream(upload_dir, filename)
+
+class StoredUpload:
+    """
+    A file stored by an earlier request, referred to by its digest instead of being uploaded again.
+
+    It can be passed wherever the request's FileStorage is (save_upload, .filename).
+    """
+
+    def __init__(self, filename, path):
+        self.filename = filename
+        self.path = path
+
+def find_upload(upload_dir, digest, filename):
+    """
+    Find a file stored by save_upload from its digest.
+
+    Args:
+        upload_dir (str): Directory uploads are stored in
+        digest (str): Hex SHA-256 returned when the file was uploaded
+        filename (str): Client-supplied filename of the original upload
+
+    Returns:
+        StoredUpload or None: The upload, or None if it is unknown or was cleaned up
+    """
+    extension = get_extension(filename)
+    if extension not in ALLOWED_EXTENSIONS or not re.fullmatch(r'[0-9a-f]{64}', digest or ''):
+        return None
+    path = os.path.join(upload_dir, f"{digest}.{extension}")
+    if not os.path.isfile(path):
+        return None
+    return StoredUpload(filename, path)
+
+def save_upload(file_storage, upload_dir):
+    """
+    Store an uploaded file and return its path.
+
+    Streamed uploads are renamed into place; a StoredUpload is already in
+    place and is only marked as recently used; anything else (e.g. uploads
+    created outside a request) is copied while hashing.
+
+    Args:
+        file_storage (werkzeug.datastructures.FileStorage or StoredUpload): The uploaded file
+        upload_dir (str): Directory uploads are stored in
+
+    Returns:
+        str: Path of the stored file, named by its SHA-256 digest
+    """
+    if isinstance(file_storage, StoredUpload):
+        # Refresh the modification time so the janitor treats it as in use
+        os.utime(file_storage.path)
+        return file_storage.path
+
+    stream = file_storage.stream
+    if isinstance(stream, UploadStream):
+        return stream.commit()
+
+    upload = create_upload_stream(upload_dir, file_storage.filename)
+    try:
+        for chunk in iter(lambda: stream.read(64 * 1024), b''):
+            upload.write(chunk)
+        return upload.commit()
+    finally:
+        upload.close()
+
+def get_upload_digest(file_path):
+    """
+    Get the SHA-256 digest of a stored file.
+    
+    Uploads stored by save_upload are named by their digest, so it is read
+    from the filename; any other file is hashed.
+    
+    Args:
+        file_path (str): Path to the file
+        
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    stem = os.path.basename(file_path).rsplit('.', 1)[0]
+    if re.fullmatch(r'[0-9a-f]{64}', stem):
+        return stem
+    
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
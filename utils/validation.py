@@ -0,0 +1,132 @@
+"""
+Validation module for checking property rows before a report is rendered.
+
+Each check is a vectorized mask over the normalized property table, so every
+row is checked in one pass without decoding images or rendering anything.
+Problems are returned as per-cell diagnostics that the UI can show right
+after a sheet is selected.
+"""
+
+import logging
+import pandas as pd
+from utils.data_processor import IMAGE_FILE_COLUMN, PRICE_PER_SQM_RAW_COLUMN
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# Values the report understands
+PROPERTY_TYPES = ('For Lease', 'Already Leased', 'For Sale', 'Sold')
+REPORTED_TYPES = ('For Lease', 'For Sale')  # Types that get a property page
+REPORT_FLAGS = ('T', 'F')
+
+# Text columns shown on a property page that should not be blank
+REQUIRED_DETAILS = ('Street Address', 'Suburb')
+
+# Most diagnostics returned in one response; the counts always cover every row
+MAX_ISSUES = 500
+
+# Header occupies row 1, so DataFrame position 0 is worksheet row 2
+FIRST_DATA_ROW = 2
+
+def column_letter(position):
+    """Convert a 0-based column position to a worksheet column letter."""
+    letters = ''
+    position += 1
+    while position:
+        position, remainder = divmod(position - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def _is_blank(values):
+    """Mask of null or whitespace-only cells."""
+    return values.isna() | (values.astype(str).str.strip() == '')
+
+def validate_property_table(df):
+    """
+    Check every row of a normalized property table.
+
+    Args:
+        df (pandas.DataFrame): Table produced by normalize_property_table
+
+    Returns:
+        dict: {'valid': bool, 'rows': int, 'selected': int, 'reported': int,
+        'errors': int, 'warnings': int, 'counts': {code: int},
+        'issues': [diagnostic, ...], 'truncated': bool}. Each diagnostic has
+        row, cell, column, value, severity, code and message. 'valid' is
+        False only when there are errors.
+    """
+    missing = [col for col in ('Type', 'PUT IN REPORT (T/F)') if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    types = df['Type'].astype(object)
+    flags = df['PUT IN REPORT (T/F)'].astype(object)
+    selected = flags == 'T'
+    reported = selected & types.isin(REPORTED_TYPES)
+
+    # (code, severity, column, mask, message) for every check
+    checks = [
+        ('unknown_type', 'error', 'Type', types.notna() & ~types.isin(PROPERTY_TYPES),
+         f"Type must be one of: {', '.join(PROPERTY_TYPES)}"),
+        ('missing_type', 'warning', 'Type', types.isna() & selected,
+         "Row is marked for the report but has no Type, so it will be left out"),
+        ('invalid_flag', 'error', 'PUT IN REPORT (T/F)', flags.notna() & ~flags.isin(REPORT_FLAGS),
+         "PUT IN REPORT (T/F) must be T or F"),
+    ]
+
+    if PRICE_PER_SQM_RAW_COLUMN in df.columns:
+        unparsed = df[PRICE_PER_SQM_RAW_COLUMN].notna()
+        checks.append(('non_numeric_price_per_sqm', 'error', '$/m²', unparsed & selected,
+                       "$/m² is not a number, so it is left out of the average"))
+        checks.append(('non_numeric_price_per_sqm', 'warning', '$/m²', unparsed & ~selected,
+                       "$/m² is not a number"))
+
+    if IMAGE_FILE_COLUMN in df.columns and 'Property Photo' in df.columns:
+        checks.append(('missing_photo', 'warning', 'Property Photo', reported & df[IMAGE_FILE_COLUMN].isna(),
+                       "No photo is available for this property; the page will have an empty photo"))
+
+    for col in REQUIRED_DETAILS:
+        if col in df.columns:
+            checks.append((f"missing_{col.lower().replace(' ', '_')}", 'warning', col, reported & _is_blank(df[col]),
+                           f"{col} is blank"))
+
+    issues = []
+    counts = {}
+    totals = {'error': 0, 'warning': 0}
+    for code, severity, col, mask, message in checks:
+        positions = mask.to_numpy().nonzero()[0]
+        if not len(positions):
+            continue
+        counts[code] = counts.get(code, 0) + len(positions)
+        totals[severity] += len(positions)
+
+        # Only the capped number of rows are turned into diagnostics
+        letter = column_letter(df.columns.get_loc(col))
+        # Report the original text for prices, which were parsed to NaN
+        source = df[PRICE_PER_SQM_RAW_COLUMN] if code == 'non_numeric_price_per_sqm' else df[col]
+        for position in positions[:max(0, MAX_ISSUES - len(issues))]:
+            row = int(position) + FIRST_DATA_ROW
+            value = source.iat[position]
+            issues.append({
+                'row': row,
+                'cell': f"{letter}{row}",
+                'column': col,
+                'value': None if pd.isna(value) else str(value),
+                'severity': severity,
+                'code': code,
+                'message': message
+            })
+
+    issues.sort(key=lambda issue: (issue['row'], issue['severity'] != 'error'))
+    logger.debug(f"Validated {len(df)} rows: {totals['error']} errors, {totals['warning']} warnings")
+    return {
+        'valid': totals['error'] == 0,
+        'rows': len(df),
+        'selected': int(selected.sum()),
+        'reported': int(reported.sum()),
+        'errors': totals['error'],
+        'warnings': totals['warning'],
+        'counts': counts,
+        'issues': issues,
+        'truncated': totals['error'] + totals['warning'] > len(issues)
+    }